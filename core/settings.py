@@ -42,12 +42,16 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'trans_maint.middleware.PerfMiddleware',
+    'trans_maint.db_router.ReplicaPinMiddleware',
+    'trans_maint.middleware.RequestCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'trans_maint.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -62,6 +66,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'trans_maint.context_processors.live_feed',
             ],
         },
     },
@@ -80,6 +85,18 @@ DATABASES = {
     )
 }
 
+# Read replica - نسخة قراءة اختيارية لخدمات التقارير ولوحات المعلومات (trans_maint.db_router)
+# للتجربة محلياً: انسخ ملف SQLite الحالي واستخدمه كنسخة، مثلاً REPLICA_DATABASE_URL=sqlite:////tmp/replica.sqlite3
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=600)
+    # الاختبارات تقرأ من قاعدة الاختبار نفسها بدلاً من إنشاء نسخة ثانية
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['trans_maint.db_router.ReplicaRouter']
+# بعد أي كتابة تُقرأ طلبات نفس المتصفح من الأساسية لهذه المدة بالثواني (تأخر النسخ)
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -127,3 +144,69 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+
+
+# Background report jobs - مهام التقارير الخلفية (manage.py run_report_worker)
+REPORT_JOBS_DIR = os.getenv('REPORT_JOBS_DIR', os.path.join(MEDIA_ROOT, 'report_jobs'))
+# مدة إعادة استخدام نتيجة تقرير بنفس المعايير بدلاً من إعادة توليده
+REPORT_JOB_TTL_MINUTES = int(os.getenv('REPORT_JOB_TTL_MINUTES', '30'))
+
+# Shared data-version counters - عدادات إصدار الجداول المشتركة بين العمال (mmap)
+DATA_VERSION_FILE = os.getenv('DATA_VERSION_FILE', os.path.join(BASE_DIR, 'var', 'data_versions.bin'))
+# الحد الأقصى لعدد نتائج التقارير المحفوظة في ذاكرة كل عامل
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv('REPORT_CACHE_MAX_ENTRIES', '256'))
+
+# Estimated-count pagination - الترقيم بعدد تقديري للقوائم الكبيرة
+# فوق هذا الحد يُعرض العدد كـ "10,000+" (أو تقدير المخطط في PostgreSQL) بدلاً من COUNT(*) كامل
+PAGINATION_COUNT_CAP = int(os.getenv('PAGINATION_COUNT_CAP', '10000'))
+
+# Per-request performance instrumentation - قياس الاستعلامات والزمن لكل View (manage.py perf_report)
+PERF_INSTRUMENTATION = os.getenv('PERF_INSTRUMENTATION', 'True') == 'True'
+PERF_LOG_FILE = os.getenv('PERF_LOG_FILE', os.path.join(BASE_DIR, 'var', 'perf.jsonl'))
+PERF_LOG_MAX_BYTES = int(os.getenv('PERF_LOG_MAX_BYTES', str(20 * 1024 * 1024)))
+# ميزانيات إضافية أو بديلة لما يُعلن على الـ View (query_budget): {'RankListView': 3}
+PERF_QUERY_BUDGETS = {}
+
+# Memory instrumentation - ذاكرة التقارير والتصدير (MemoryService، تظهر في manage.py perf_report)
+MEMORY_INSTRUMENTATION = os.getenv('MEMORY_INSTRUMENTATION', 'True') == 'True'
+# نسبة التنفيذات التي تُتبع بـ tracemalloc لمعرفة مواقع التخصيص (يبطئ التنفيذ المتتبع؛ 0 = RSS فقط)
+MEMORY_TRACE_SAMPLE_RATE = float(os.getenv('MEMORY_TRACE_SAMPLE_RATE', '0.02'))
+# تحذير في logger 'trans_maint.memory' بمعايير التقرير عند تجاوز هذه الزيادة
+MEMORY_LARGE_ALLOCATION_MB = int(os.getenv('MEMORY_LARGE_ALLOCATION_MB', '200'))
+
+# On-demand request profiling - تعريف أداء طلب واحد للموظفين (?_profile=1 أو ترويسة X-Profile: 1)
+# الملفات (.prof و .collapsed) في PROFILE_DIR، والقائمة في لوحة الإدارة (Request profiles)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'var', 'profiles'))
+# عدد الملفات المحفوظة؛ الأقدم يُحذف تلقائياً
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '200'))
+
+# Service metrics - زمن دوال الخدمات واستدعاؤها وأخطاؤها بصيغة Prometheus (GET /metrics، MetricsService)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# ملف mmap لكل عامل؛ /metrics يجمعها. يُمسح عند بدء التشغيل (قبل gunicorn) حتى لا تتراكم ملفات العمال القديمة
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(BASE_DIR, 'var', 'metrics'))
+# رموز Prometheus المسموح لها بالقراءة، مفصولة بفواصل (Authorization: Token <رمز>). بدونها /metrics مفتوح للشبكة الداخلية
+METRICS_TOKENS = [t for t in os.getenv('METRICS_TOKENS', '').split(',') if t]
+
+# Offline fuel terminals - مزامنة محطات الوقود (POST /api/fuel/sync/)
+# رموز الأجهزة المسموح لها بالمزامنة، مفصولة بفواصل (Authorization: Token <رمز>). بدونها تُرفض المزامنة
+FUEL_SYNC_TOKENS = [t for t in os.getenv('FUEL_SYNC_TOKENS', '').split(',') if t]
+
+# Change feed (outbox) - التغييرات للأنظمة الخارجية (GET /api/changes/، manage.py outbox_changes)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_MAX_BATCH_SIZE = int(os.getenv('OUTBOX_MAX_BATCH_SIZE', '5000'))
+# الأحداث الأحدث من هذه المهلة لا تُعرض بعد (transaction أقدم قد لم يُثبت أحداثه ذات المؤشر الأصغر)
+OUTBOX_SETTLE_SECONDS = int(os.getenv('OUTBOX_SETTLE_SECONDS', '5'))
+# الأنظمة المستهلكة ورموزها: "finance=<رمز>,hr=<رمز>" (Authorization: Token <رمز>)
+OUTBOX_CONSUMER_TOKENS = dict(
+    item.split('=', 1) for item in os.getenv('OUTBOX_CONSUMER_TOKENS', '').split(',') if '=' in item
+)
+
+# Live feed (SSE) - بث أحداث التشغيل الحية (GET /live/events/، LiveFeedService)
+# البث اتصال لا ينتهي: يعمل على خدمة ASGI فقط (web-asgi)، وتحت WSGI يُرفض بـ 503 بدلاً من حجز عامل للأبد
+# رابط البث كما يراه المتصفح، مثل http://localhost:8001/live/events/ ؛ فارغ = نفس الخادم (الموقع كله على ASGI)
+LIVE_FEED_URL = os.getenv('LIVE_FEED_URL', '')
+# أصول الصفحات المسموح لها بفتح البث من خادم آخر (CORS)، مفصولة بفواصل، مثل http://localhost:8000
+LIVE_FEED_ALLOWED_ORIGINS = [o for o in os.getenv('LIVE_FEED_ALLOWED_ORIGINS', '').split(',') if o]
+# كل عامل ASGI عليه مشتركون يقرأ صندوق الصادر كل هذه المدة، فيرى كتابات كل العمليات
+LIVE_FEED_POLL_SECONDS = float(os.getenv('LIVE_FEED_POLL_SECONDS', '1'))
@@ -0,0 +1,129 @@
+/*
+ * قوائم اختيار تُحمّل عند الطلب بدلاً من إرسال كل الموظفين/المركبات في الصفحة.
+ * الاستخدام:
+ *   <select name="employee" data-autocomplete="{% url 'autocomplete_employees' %}">
+ *       <option value="">-- اختر --</option>
+ *   </select>
+ * - يُضاف حقل بحث قبل القائمة؛ أول تركيز يجلب الصفحة الأولى، والكتابة تبحث ببداية النص.
+ * - قيمة مختارة مسبقاً (فلتر في الرابط) تُرسل كـ <option value="5" selected> ويُجلب عنوانها بـ ?id=.
+ * - Autocomplete.setValue(select, id, label) لتعبئة القيمة من JavaScript (مودالات التعديل).
+ */
+(function () {
+    'use strict';
+
+    var DEBOUNCE_MS = 250;
+
+    function endpoint(select, params) {
+        var url = new URL(select.dataset.autocomplete, window.location.origin);
+        Object.keys(params).forEach(function (key) { url.searchParams.set(key, params[key]); });
+        return url;
+    }
+
+    function setOptions(select, results, more) {
+        // نبقي الخيار الفارغ والقيمة المختارة حالياً، ونستبدل الباقي بالنتائج
+        var current = select.value;
+        Array.prototype.slice.call(select.options).forEach(function (option) {
+            if (option.value !== '' && option.value !== current) {
+                option.remove();
+            }
+        });
+        results.forEach(function (row) {
+            if (String(row.id) === current) {
+                return;
+            }
+            select.add(new Option(row.text, row.id));
+        });
+        if (more) {
+            var hint = new Option('… اكتب للبحث عن المزيد', '');
+            hint.disabled = true;
+            select.add(hint);
+        }
+    }
+
+    function load(select, term) {
+        var request = ++select._autocompleteRequest;
+        return fetch(endpoint(select, { q: term }), { headers: { 'Accept': 'application/json' } })
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                // تجاهل الردود المتأخرة لكتابة سابقة
+                if (request === select._autocompleteRequest) {
+                    setOptions(select, data.results, data.more);
+                }
+            });
+    }
+
+    function resolveSelected(select) {
+        var option = select.options[select.selectedIndex];
+        if (!option || option.value === '' || option.dataset.resolved) {
+            return;
+        }
+        fetch(endpoint(select, { id: option.value }))
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                if (data.results.length) {
+                    option.text = data.results[0].text;
+                }
+                option.dataset.resolved = '1';
+            });
+    }
+
+    function attach(select) {
+        var search = document.createElement('input');
+        search.type = 'search';
+        search.className = 'autocomplete-search';
+        search.placeholder = select.dataset.autocompletePlaceholder || 'ابحث بالاسم أو الرقم...';
+        select.parentNode.insertBefore(search, select);
+        select._autocompleteRequest = 0;
+
+        var loaded = false;
+        var timer = null;
+        function ensureLoaded() {
+            if (!loaded) {
+                loaded = true;
+                load(select, '');
+            }
+        }
+
+        select.addEventListener('focus', ensureLoaded);
+        search.addEventListener('focus', ensureLoaded);
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                loaded = true;
+                load(select, search.value.trim()).then(function () {
+                    // نتيجة واحدة مطابقة: نختارها مباشرة
+                    var choices = Array.prototype.filter.call(select.options, function (o) { return o.value !== '' && !o.disabled; });
+                    if (choices.length === 1 && !select.value) {
+                        select.value = choices[0].value;
+                        select.dispatchEvent(new Event('change'));
+                    }
+                });
+            }, DEBOUNCE_MS);
+        });
+
+        resolveSelected(select);
+    }
+
+    window.Autocomplete = {
+        setValue: function (select, id, label) {
+            if (!id) {
+                select.value = '';
+                return;
+            }
+            var exists = Array.prototype.some.call(select.options, function (o) { return o.value === String(id); });
+            if (!exists) {
+                var option = new Option(label || id, id);
+                option.dataset.resolved = label ? '1' : '';
+                select.add(option);
+            }
+            select.value = String(id);
+            if (!label) {
+                resolveSelected(select);
+            }
+        }
+    };
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete]').forEach(attach);
+    });
+})();
@@ -0,0 +1,69 @@
+/*
+ * تبويبات السجل في صفحات التفاصيل: محتوى التبويب يُجلب عند أول فتح بدلاً من إرساله مع الصفحة.
+ * الاستخدام:
+ *   <tbody data-history-tab="{% url 'employee_trips_tab' employee.id %}">
+ *       <tr><td colspan="5">جاري التحميل...</td></tr>
+ *   </tbody>
+ *   HistoryTabs.open(pane)   // عند فتح التبويب: الصفحة الأولى لكل سجل داخله (مرة واحدة فقط)
+ * - الرد صفوف <tr> جاهزة، وآخرها زر "عرض المزيد" برابط الصفحة التالية (المؤشر) يُستبدل بصفوفها.
+ * - data-history-autoload: سجل خارج التبويبات يُجلب بعد اكتمال تحميل الصفحة.
+ */
+(function () {
+    'use strict';
+
+    function columns(tbody) {
+        var head = tbody.closest('table').tHead;
+        return head ? head.rows[0].cells.length : 1;
+    }
+
+    function fetchRows(tbody, url, replace) {
+        return fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                if (replace) {
+                    tbody.innerHTML = '';
+                }
+                tbody.insertAdjacentHTML('beforeend', html);
+            });
+    }
+
+    function load(tbody) {
+        if (!tbody._historyLoad) {
+            tbody._historyLoad = fetchRows(tbody, tbody.dataset.historyTab, true).catch(function () {
+                // فشل الجلب: نسمح بإعادة المحاولة عند فتح التبويب مرة أخرى
+                tbody._historyLoad = null;
+                tbody.innerHTML = '<tr><td colspan="' + columns(tbody) + '" style="text-align:center;">تعذر تحميل السجل، أعد فتح التبويب للمحاولة مجدداً.</td></tr>';
+            });
+        }
+        return tbody._historyLoad;
+    }
+
+    document.addEventListener('click', function (event) {
+        var button = event.target.closest('[data-history-more]');
+        if (!button) {
+            return;
+        }
+        var row = button.closest('tr');
+        button.disabled = true;
+        fetchRows(row.parentNode, button.dataset.historyMore, false).then(
+            function () { row.remove(); },
+            function () { button.disabled = false; }
+        );
+    });
+
+    window.HistoryTabs = {
+        open: function (container) {
+            var tables = container.matches('[data-history-tab]') ? [container] : container.querySelectorAll('[data-history-tab]');
+            return Promise.all(Array.prototype.map.call(tables, load));
+        }
+    };
+
+    window.addEventListener('load', function () {
+        document.querySelectorAll('[data-history-tab][data-history-autoload]').forEach(load);
+    });
+})();
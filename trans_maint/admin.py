@@ -1,8 +1,21 @@
+import datetime
+
 from django.contrib import admin
-from django.utils.html import format_html
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.exceptions import PermissionDenied
+from django.db import models
+from django.db.models import Min, Max
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from .services.data_version_service import DataVersionService
+from .services.profiler_service import ProfilerService
+from .paginator import EstimatedCountPaginator
 from .models import (
     MilitaryRank, Employee, Vehicle, Workshop, 
-    Trip, FuelTransaction, Accident, MaintenanceRequest
+    Trip, FuelTransaction, Accident, MaintenanceRequest, ReportJob, RequestProfile
 )
 
 # تخصيص عنوان لوحة التحكم
@@ -10,17 +23,105 @@ admin.site.site_header = "نظام إدارة وقود وأسطول المركب
 admin.site.site_title = "الإدارة الفنية"
 admin.site.index_title = "لوحة التحكم الرئيسية"
 
+class EstimatedCountAdminMixin:
+    """
+    قوائم كبيرة (سجل الوقود والرحلات): عدد تقديري بدلاً من COUNT(*) كامل مرتين في كل صفحة
+    (عدد النتائج المفلترة + العدد الكلي). العدد الدقيق عند الطلب بإضافة ?exact_count=1 للرابط.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    EXACT_COUNT_VAR = 'exact_count'
+
+    def changelist_view(self, request, extra_context=None):
+        # نزيل المعيار قبل أن تعامله قائمة الإدارة كفلتر على حقل غير موجود
+        request.exact_count = request.GET.get(self.EXACT_COUNT_VAR) == '1'
+        if self.EXACT_COUNT_VAR in request.GET:
+            request.GET = request.GET.copy()
+            del request.GET[self.EXACT_COUNT_VAR]
+        return super().changelist_view(request, extra_context)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            exact=getattr(request, 'exact_count', False),
+        )
+
+
+class MonthRangeFilter(admin.SimpleListFilter):
+    """
+    بديل date_hierarchy للجداول الكبيرة: date_hierarchy يحسب السنوات/الأشهر بـ DISTINCT على الجدول كله،
+    وهنا الأشهر تُولد من أقدم وأحدث تاريخ فقط (MIN/MAX على عمود مفهرس = قراءة طرفي الفهرس)،
+    والاختيار يصبح شرط نطاق (>= بداية الشهر و < بداية التالي) يستخدم نفس الفهرس.
+    """
+    field_name = None
+    max_months = 24
+
+    def __init__(self, request, params, model, model_admin):
+        self.is_datetime = isinstance(model._meta.get_field(self.field_name), models.DateTimeField)
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        bounds = model_admin.model._default_manager.aggregate(first=Min(self.field_name), last=Max(self.field_name))
+        if not bounds['last']:
+            return []
+        first, last = (timezone.localtime(v) if self.is_datetime else v for v in (bounds['first'], bounds['last']))
+        year, month = last.year, last.month
+        choices = []
+        while (year, month) >= (first.year, first.month) and len(choices) < self.max_months:
+            choices.append((f"{year}-{month:02d}", f"{year}-{month:02d}"))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return choices
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            year, month = (int(part) for part in self.value().split('-'))
+            start = datetime.date(year, month, 1)
+        except ValueError as e:
+            raise IncorrectLookupParameters(e)
+        end = datetime.date(year + month // 12, month % 12 + 1, 1)
+        if self.is_datetime:
+            start, end = (timezone.make_aware(datetime.datetime.combine(d, datetime.time())) for d in (start, end))
+        return queryset.filter(**{f"{self.field_name}__gte": start, f"{self.field_name}__lt": end})
+
+
+class TripStartMonthFilter(MonthRangeFilter):
+    title = "شهر البدء"
+    parameter_name = 'start_month'
+    field_name = 'start_date'
+
+
+class FuelMonthFilter(MonthRangeFilter):
+    title = "الشهر"
+    parameter_name = 'month'
+    field_name = 'date'
+
+
+class AccidentMonthFilter(MonthRangeFilter):
+    title = "شهر الحادث"
+    parameter_name = 'month'
+    field_name = 'date_occurred'
+
+# وضع الأداء لكل القوائم (اختبار ميزانية الاستعلامات لكل قائمة في tests.py):
+# - list_select_related لكل عمود FK في القائمة، بما فيها ما يقرأه __str__ (الموظف يعرض رتبته، الرحلة لوحتها).
+# - كل حقل FK في النماذج autocomplete_fields (بحث عند الطلب) أو raw_id_fields (جداول ضخمة)
+#   بدلاً من <select> يحمل كل الموظفين والمركبات.
+# - show_full_result_count = False: لا COUNT(*) ثانٍ للجدول كله بجانب عدد النتائج المفلترة.
+
 @admin.register(MilitaryRank)
 class MilitaryRankAdmin(admin.ModelAdmin):
     list_display = ('name', 'default_weekly_quota', 'default_monthly_quota')
     search_fields = ('name',)
+    show_full_result_count = False
 
 @admin.register(Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('military_number', 'rank', 'name', 'is_active', 'display_quota_status')
     list_filter = ('rank', 'is_active')
     search_fields = ('name', 'military_number')
     list_editable = ('is_active',)
+    autocomplete_fields = ('rank',)
     
     fieldsets = (
         ("البيانات الأساسية", {
@@ -38,11 +139,18 @@ class EmployeeAdmin(admin.ModelAdmin):
         return format_html('<span style="color: green;">حصة الرتبة</span>')
     display_quota_status.short_description = "نوع الحصة"
 
+    def get_queryset(self, request):
+        # __str__ يعرض الرتبة: للقائمة ولنتائج البحث التلقائي (autocomplete) في نماذج الرحلات والوقود.
+        # (ChangeList يتجاهل list_select_related إذا كان الـ queryset فيه select_related مسبقاً)
+        return super().get_queryset(request).select_related('rank')
+
 @admin.register(Vehicle)
-class VehicleAdmin(admin.ModelAdmin):
+class VehicleAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('plate_number', 'model', 'vehicle_type', 'owner', 'status_colored')
     list_filter = ('vehicle_type', 'status')
     search_fields = ('plate_number', 'model')
+    list_select_related = ('owner__rank',)
+    autocomplete_fields = ('owner',)
     
     def status_colored(self, obj):
         colors = {
@@ -61,21 +169,28 @@ class FuelTransactionInline(admin.TabularInline):
     model = FuelTransaction
     extra = 0
     readonly_fields = ('date',)
+    # بدون هذا يبني كل صف في الـ inline قائمتي <select> بكل الموظفين والمركبات
+    autocomplete_fields = ('employee', 'vehicle')
 
 @admin.register(Trip)
-class TripAdmin(admin.ModelAdmin):
+class TripAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('vehicle', 'employee', 'area', 'trip_type', 'start_date', 'end_date', 'fuel_quota_granted')
-    list_filter = ('trip_type', 'start_date', 'vehicle')
+    # فلتر المركبة أُزيل (يحمل كل المركبات في الشريط الجانبي)؛ البحث باللوحة يغني عنه
+    list_filter = ('trip_type', TripStartMonthFilter)
     search_fields = ('area', 'employee__name', 'vehicle__plate_number')
     inlines = [FuelTransactionInline]
-    date_hierarchy = 'start_date'
+    list_select_related = ('vehicle', 'employee__rank')
+    autocomplete_fields = ('vehicle', 'employee')
 
 @admin.register(FuelTransaction)
-class FuelTransactionAdmin(admin.ModelAdmin):
+class FuelTransactionAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('date', 'employee', 'vehicle', 'quantity', 'transaction_type_colored', 'trip')
-    list_filter = ('transaction_type', 'date')
+    list_filter = ('transaction_type', 'date', FuelMonthFilter)
     search_fields = ('employee__name', 'vehicle__plate_number')
     readonly_fields = ('date',)
+    list_select_related = ('employee__rank', 'vehicle', 'trip__vehicle')
+    autocomplete_fields = ('employee', 'vehicle')
+    raw_id_fields = ('trip',)
 
     def transaction_type_colored(self, obj):
         color = 'green' if obj.transaction_type == 'addition' else 'red'
@@ -83,25 +198,103 @@ class FuelTransactionAdmin(admin.ModelAdmin):
     transaction_type_colored.short_description = "نوع العملية"
 
 @admin.register(Accident)
-class AccidentAdmin(admin.ModelAdmin):
+class AccidentAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('vehicle', 'date_occurred', 'damage_cost', 'status')
-    list_filter = ('status', 'date_occurred')
+    list_filter = ('status', 'date_occurred', AccidentMonthFilter)
     search_fields = ('vehicle__plate_number', 'description')
+    list_select_related = ('vehicle',)
+    autocomplete_fields = ('vehicle',)
+    raw_id_fields = ('trip',)
     
     # إجراء سريع لتغيير حالة الحادث
     actions = ['mark_as_closed']
 
     def mark_as_closed(self, request, queryset):
         queryset.update(status='closed')
+        # update() لا يطلق إشارات الحفظ، لذا نبطل النتائج المحفوظة يدوياً
+        DataVersionService.bump(Accident)
     mark_as_closed.short_description = "إغلاق الحوادث المختارة"
 
 @admin.register(MaintenanceRequest)
-class MaintenanceRequestAdmin(admin.ModelAdmin):
+class MaintenanceRequestAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('vehicle', 'workshop', 'date_reported', 'cost', 'status')
     list_filter = ('status', 'workshop')
     search_fields = ('vehicle__plate_number', 'reason')
+    list_select_related = ('vehicle', 'workshop')
+    autocomplete_fields = ('vehicle', 'workshop')
+    raw_id_fields = ('accident_ref',)
 
 @admin.register(Workshop)
 class WorkshopAdmin(admin.ModelAdmin):
     list_display = ('name', 'phone', 'address')
-    search_fields = ('name',)
\ No newline at end of file
+    search_fields = ('name',)
+    show_full_result_count = False
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'report_type', 'status', 'progress', 'row_count', 'created_at', 'finished_at')
+    list_filter = ('status', 'report_type')
+    readonly_fields = ('params_hash', 'created_at', 'started_at', 'finished_at')
+    show_full_result_count = False
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """ملفات تعريف الأداء (?_profile=1): الأحدث أولاً، بالتصفية حسب الـ View، والملفات للتنزيل والتحليل"""
+    list_display = ('created_at', 'view', 'method', 'path', 'status_code', 'wall_ms', 'cpu_ms', 'queries', 'db_ms', 'username', 'downloads')
+    list_filter = ('view',)
+    search_fields = ('path',)
+    ordering = ('-created_at',)
+    fields = (
+        'view', 'method', 'path', 'query_string', 'status_code', 'wall_ms', 'cpu_ms',
+        'queries', 'db_ms', 'username', 'created_at', 'downloads', 'sql_timings',
+    )
+    readonly_fields = ('downloads', 'sql_timings')
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="الملفات")
+    def downloads(self, obj):
+        links = [
+            (reverse('admin:trans_maint_requestprofile_download', args=[obj.pk, kind]), f".{kind}")
+            for kind in ProfilerService.KINDS
+        ]
+        return format_html_join(' | ', '<a href="{}">{}</a>', links)
+
+    @admin.display(description="أثقل استعلامات SQL")
+    def sql_timings(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((row['ms'], row['count'], row['sql']) for row in obj.sql),
+        )
+        return format_html('<table><tr><th>ms</th><th>العدد</th><th>الاستعلام</th></tr>{}</table>', rows)
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:kind>/', self.admin_site.admin_view(self.download_view),
+                 name='trans_maint_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk, kind):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if kind not in ProfilerService.KINDS:
+            raise Http404
+        try:
+            return FileResponse(open(ProfilerService.path(profile, kind), 'rb'), as_attachment=True,
+                                filename=f"{profile.file_name}.{kind}")
+        except FileNotFoundError:
+            raise Http404("ملف التعريف لم يعد موجوداً على القرص")
+
+    # الحذف من لوحة الإدارة يحذف الملفات من القرص أيضاً
+    def delete_model(self, request, obj):
+        ProfilerService.delete([obj])
+
+    def delete_queryset(self, request, queryset):
+        ProfilerService.delete(queryset)
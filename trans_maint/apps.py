@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class TransMaintConfig(AppConfig):
     name = 'trans_maint'
+
+    def ready(self):
+        # تسجيل مستقبلات الإشارات (زيادة إصدارات الجداول عند الكتابة)
+        from . import signals  # noqa: F401
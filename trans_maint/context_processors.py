@@ -0,0 +1,7 @@
+from django.conf import settings
+from django.urls import reverse
+
+
+def live_feed(request):
+    """رابط البث الحي للقوالب: خدمة ASGI المنفصلة (LIVE_FEED_URL) أو نفس الخادم"""
+    return {'live_feed_url': settings.LIVE_FEED_URL or reverse('live_feed')}
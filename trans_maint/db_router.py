@@ -0,0 +1,153 @@
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import QuerySet
+
+REPLICA_ALIAS = 'replica'
+
+# حالة التوجيه للطلب الحالي (contextvar: تعمل مع الخيوط والـ async، وتنتقل إلى run_db_call)
+_state = contextvars.ContextVar('db_routing_state', default=None)
+_analytics = contextvars.ContextVar('db_routing_analytics', default=False)
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def routing_scope(pinned=False):
+    """
+    نطاق مستقل لحالة التثبيت على الأساسية (طلب HTTP، أو مهمة تقرير في العامل).
+    خارج أي نطاق (أوامر manage.py، الـ shell) أول كتابة تثبت بقية التنفيذ على الأساسية.
+    """
+    state = RoutingState(pinned)
+    token = _state.set(state)
+    try:
+        yield state
+    finally:
+        _state.reset(token)
+
+
+def current_read_alias():
+    """القاعدة التي ستذهب إليها قراءات الخدمة التحليلية الآن"""
+    return ReplicaRouter().db_for_read(None) or DEFAULT_DB_ALIAS
+
+
+def _bind_to(result, alias):
+    """الـ QuerySets الكسولة تُقيَّم لاحقاً (في القالب) خارج النطاق، فنثبت قاعدتها الآن"""
+    if isinstance(result, QuerySet) and result._db is None:
+        return result.using(alias)
+    if isinstance(result, dict):
+        return {key: _bind_to(value, alias) for key, value in result.items()}
+    return result
+
+
+def reads_from_replica(obj):
+    """
+    مزخرف لخدمات القراءة التحليلية (تقارير، لوحات معلومات): استعلاماتها تذهب للنسخة المقروءة
+    إن وُجدت REPLICA_DATABASE_URL ولم يكتب الطلب الحالي شيئاً بعد.
+    على صنف: يُطبق على كل دواله الثابتة وأصنافه الداخلية (ReportService.FuelReports ...).
+    الدوال غير المتزامنة تُترك كما هي لأنها تستدعي النسخ المتزامنة المزخرفة عبر run_db_call.
+    """
+    if isinstance(obj, type):
+        for name, member in list(vars(obj).items()):
+            if isinstance(member, staticmethod) and not iscoroutinefunction(member.__func__):
+                setattr(obj, name, staticmethod(reads_from_replica(member.__func__)))
+            elif isinstance(member, type) and member.__qualname__.startswith(obj.__qualname__ + '.'):
+                reads_from_replica(member)
+        return obj
+
+    @functools.wraps(obj)
+    def wrapper(*args, **kwargs):
+        if _analytics.get():
+            return obj(*args, **kwargs)
+        token = _analytics.set(True)
+        try:
+            result = obj(*args, **kwargs)
+            return _bind_to(result, current_read_alias())
+        finally:
+            _analytics.reset(token)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    توجيه قراءات الخدمات التحليلية (reads_from_replica) إلى DATABASES['replica'] وكل ما عداها إلى الأساسية.
+    قراءة ما كتبته (read-your-writes): أي كتابة في الطلب تثبته على الأساسية حتى نهايته،
+    و ReplicaPinMiddleware يمد التثبيت لطلبات نفس المتصفح التالية لمدة REPLICA_PIN_SECONDS.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not (_analytics.get() and replica_configured()):
+            return None
+        state = _state.get()
+        if state is not None and state.pinned:
+            return None
+        # داخل transaction على الأساسية يجب أن نرى نفس البيانات غير المثبتة بعد
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            state = RoutingState()
+            _state.set(state)
+        state.pinned = state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # الأساسية والنسخة تحملان نفس البيانات
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaPinMiddleware:
+    """
+    نطاق توجيه لكل طلب. الطلبات غير الآمنة (POST ...) تبدأ مثبتة على الأساسية،
+    وبعد أي كتابة يُضاف كوكي قصير العمر حتى تُقرأ الصفحة التالية (مثل redirect بعد الحفظ)
+    من الأساسية بدلاً من نسخة قد تكون متأخرة.
+    """
+
+    COOKIE_NAME = 'db_primary_pin'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with routing_scope(self.starts_pinned(request)) as state:
+            response = self.get_response(request)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        with routing_scope(self.starts_pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.finish(response, state)
+
+    def starts_pinned(self, request):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') or self.COOKIE_NAME in request.COOKIES
+
+    def finish(self, response, state):
+        if state.wrote and replica_configured() and settings.REPLICA_PIN_SECONDS:
+            response.set_cookie(self.COOKIE_NAME, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
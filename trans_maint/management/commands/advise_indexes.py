@@ -0,0 +1,347 @@
+import json
+import os
+import re
+import time
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.test.utils import setup_databases, teardown_databases
+
+from trans_maint.middleware import query_fingerprint
+from trans_maint.services.employee_service import EmployeeService
+from trans_maint.services.fuel_service import FuelService
+from trans_maint.services.maintenance_service import MaintenanceService
+from trans_maint.services.trip_service import TripService
+from trans_maint.services.vehicle_service import VehicleService
+
+from .run_benchmarks import BENCHMARKS, DATASET_END_DATE, SCALES, benchmark_context
+
+
+# استدعاءات إضافية لمسارات البحث اليومية (الرصيد، الجاهزية، الرحلات المفتوحة، الصيانة المعلقة)
+WORKLOAD = BENCHMARKS + (
+    ('fuel.employee_balance', lambda ctx: FuelService.calculate_employee_balance(ctx['employee_id']), False),
+    ('vehicle.availability', lambda ctx: VehicleService.check_vehicle_availability(ctx['vehicle_id']), False),
+    ('vehicle.recent_maintenance', lambda ctx: list(VehicleService.get_vehicle_recent_maintenance(ctx['vehicle_id'])), False),
+    ('maintenance.pending', lambda ctx: list(MaintenanceService.list_maintenance_requests({'status': 'pending'})[:15]), False),
+    ('trip.active_trips', lambda ctx: list(TripService.list_trips({'end_date__isnull': True})[:15]), False),
+    ('employee.quota_usage', lambda ctx: list(EmployeeService.list_employees_with_quota_usage()[:15]), False),
+)
+
+# مراجع الأعمدة في SQL الذي يولده Django: "الجدول"."العمود" أو U0."العمود" داخل الاستعلامات الفرعية
+_COLUMN_REF = r'(?:"(?P<table>\w+)"|(?P<alias>[A-Z]\d+))\."(?P<column>\w+)"'
+# شروط الربط (عمود = عمود) تغطيها فهارس المفاتيح الأجنبية، لذلك تُستثنى
+_PREDICATE = re.compile(
+    _COLUMN_REF + r'\s*(?P<op>IS NOT NULL|IS NULL|IN \(|BETWEEN|<=|>=|<|>|=)(?!\s*(?:"\w+"|[A-Z]\d+)\.")'
+)
+_ORDER_BY = re.compile(_COLUMN_REF + r'\s*(?P<direction>ASC|DESC)')
+_ALIAS = re.compile(r'"(\w+)"\s+([A-Z]\d+)\b')
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?$')
+
+
+class CapturedQuery:
+    def __init__(self, sql, params, step):
+        self.sql = sql
+        self.params = params
+        self.steps = {step}
+        self.executions = 0
+        self.duration = 0.0
+
+
+class WorkloadRecorder:
+    """execute_wrapper يجمع استعلامات القراءة (SELECT) بالبصمة مع عدد مرات التنفيذ والزمن"""
+
+    def __init__(self):
+        self.step = None
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not many and sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                fingerprint = query_fingerprint(sql)
+                query = self.queries.setdefault(fingerprint, CapturedQuery(sql, params, self.step))
+                query.steps.add(self.step)
+                query.executions += 1
+                query.duration += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "تشغيل حمل تمثيلي من طبقة الخدمات، وقراءة خطة تنفيذ كل استعلام (EXPLAIN ANALYZE على PostgreSQL، "
+        "EXPLAIN QUERY PLAN على SQLite)، ثم اقتراح فهارس للمسح الكامل والترتيب على الجداول الكبيرة."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default=None, help="التشغيل على بيانات مولدة في قاعدة اختبار منفصلة بهذا الحجم")
+        parser.add_argument('--keepdb', action='store_true', help="الإبقاء على قاعدة الاختبار (مع --scale)")
+        parser.add_argument('--min-rows', type=int, default=1000, help="الجداول الأصغر من هذا لا يُقترح لها فهرس")
+        parser.add_argument('--show-plans', action='store_true', help="طباعة خطة التنفيذ لكل استعلام مُعلَّم")
+
+    def handle(self, *args, **options):
+        if not options['scale']:
+            return self._advise(options)
+
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"📦 توليد بيانات الحجم {options['scale']} ..."))
+            call_command('generate_fleet', scale=SCALES[options['scale']], reset=True, end_date=DATASET_END_DATE, stdout=open(os.devnull, 'w'))
+            self._advise(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+    def _advise(self, options):
+        queries = self._run_workload()
+        self.row_counts = {}
+        self.stdout.write(f"🔎 {len(queries)} استعلام مختلف ({sum(q.executions for q in queries)} تنفيذ) من {len(WORKLOAD)} خطوة.\n")
+
+        candidates = {}
+        for query in sorted(queries, key=lambda q: -q.duration):
+            plan, findings = self._explain(query)
+            findings = [f for f in findings if self._row_count(f['table']) >= options['min_rows']]
+            if not findings:
+                continue
+
+            self.stdout.write(self.style.WARNING(f"⚠️  {', '.join(sorted(query.steps))} ({query.executions} تنفيذ، {query.duration * 1000:.1f}ms)"))
+            for finding in findings:
+                self.stdout.write(f"    {finding['kind']} على {finding['table']} (≈{self._row_count(finding['table']):,} صف)")
+            if options['show_plans']:
+                self.stdout.write(f"    SQL: {query.sql[:300]}")
+                for line in plan:
+                    self.stdout.write(f"      {line}")
+
+            for finding in findings:
+                candidate = self._candidate(query.sql, finding['table'])
+                if candidate is None:
+                    continue
+                entry = candidates.setdefault(candidate, {'saved_ms': 0.0, 'queries': 0, 'executions': 0, 'sample': query.sql})
+                entry['saved_ms'] += finding['saved_ms']
+                entry['queries'] += 1
+                entry['executions'] += query.executions
+
+        self._report(candidates)
+
+    # --- أولاً: تشغيل الحمل والتقاط الاستعلامات ---
+
+    def _run_workload(self):
+        ctx = benchmark_context()
+        recorder = WorkloadRecorder()
+        with connection.execute_wrapper(recorder):
+            for name, func, writes in WORKLOAD:
+                recorder.step = name
+                if writes:
+                    with transaction.atomic():
+                        func(ctx)
+                        transaction.set_rollback(True)
+                else:
+                    func(ctx)
+        return list(recorder.queries.values())
+
+    # --- ثانياً: خطط التنفيذ (EXPLAIN) ---
+
+    def _explain(self, query):
+        """(أسطر الخطة للعرض، [{'table', 'kind', 'saved_ms'}]) لكل مسح كامل أو ترتيب في الخطة"""
+        if connection.vendor == 'postgresql':
+            return self._explain_postgresql(query)
+        if connection.vendor == 'sqlite':
+            return self._explain_sqlite(query)
+        return [], []
+
+    def _explain_postgresql(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + query.sql, query.params)
+            result = cursor.fetchone()[0]
+        root = (json.loads(result) if isinstance(result, str) else result)[0]['Plan']
+
+        lines, findings = [], []
+
+        def walk(node, depth):
+            loops = node.get('Actual Loops', 1)
+            total_ms = node.get('Actual Total Time', 0) * loops
+            lines.append(f"{'  ' * depth}{node['Node Type']} {node.get('Relation Name', '')} rows={node.get('Actual Rows', 0) * loops} time={total_ms:.2f}ms")
+
+            if node['Node Type'] == 'Seq Scan':
+                returned = node.get('Actual Rows', 0)
+                scanned = returned + node.get('Rows Removed by Filter', 0)
+                # الفائدة التقديرية = زمن المسح × نسبة الصفوف التي قُرئت ثم استُبعدت (ما يتجنبه الفهرس)
+                wasted = 1 - returned / scanned if scanned else 0
+                # إذا كان الاستعلام يحتاج أغلب الجدول فالمسح الكامل هو الخطة الصحيحة ولن يُستخدم الفهرس
+                if wasted >= 0.5:
+                    findings.append({
+                        'table': node['Relation Name'], 'kind': f"مسح كامل ({scanned * loops:,} صف مقروء)",
+                        'saved_ms': total_ms * wasted * query.executions,
+                    })
+            elif node['Node Type'] in ('Sort', 'Incremental Sort'):
+                table = self._first_relation(node)
+                if table:
+                    children_ms = sum(c.get('Actual Total Time', 0) * c.get('Actual Loops', 1) for c in node.get('Plans', ()))
+                    findings.append({
+                        'table': table, 'kind': f"ترتيب ({', '.join(node.get('Sort Key', ()))})",
+                        'saved_ms': max(total_ms - children_ms, 0) * query.executions,
+                    })
+
+            for child in node.get('Plans', ()):
+                walk(child, depth + 1)
+
+        walk(root, 0)
+        return lines, findings
+
+    @classmethod
+    def _first_relation(cls, node):
+        if 'Relation Name' in node:
+            return node['Relation Name']
+        for child in node.get('Plans', ()):
+            relation = cls._first_relation(child)
+            if relation:
+                return relation
+        return None
+
+    def _explain_sqlite(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + query.sql, query.params)
+            details = [row[-1] for row in cursor.fetchall()]
+
+        # SQLite لا يعطي زمناً لكل عقدة: زمن الاستعلام المقاس كله هو الحد الأعلى للفائدة
+        aliases = self._aliases(query.sql)
+        findings, outer_table = [], None
+        for detail in details:
+            match = _SQLITE_SCAN.match(detail)
+            if match:
+                table = aliases.get(match.group(1), match.group(1))
+                outer_table = outer_table or table
+                findings.append({'table': table, 'kind': "مسح كامل", 'saved_ms': query.duration * 1000})
+            elif detail.startswith('SEARCH'):
+                name = detail.split()[1]
+                outer_table = outer_table or aliases.get(name, name)
+            elif 'TEMP B-TREE FOR ORDER BY' in detail and outer_table:
+                findings.append({'table': outer_table, 'kind': "ترتيب مؤقت (TEMP B-TREE)", 'saved_ms': query.duration * 1000})
+
+        # مسح + ترتيب لنفس الجدول = فهرس واحد؛ لا تُحسب الفائدة مرتين
+        unique = {}
+        for finding in findings:
+            unique.setdefault(finding['table'], finding)
+        return details, list(unique.values())
+
+    def _row_count(self, table):
+        if table not in self.row_counts:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+                else:
+                    cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                row = cursor.fetchone()
+            self.row_counts[table] = max(row[0], 0) if row else 0
+        return self.row_counts[table]
+
+    # --- ثالثاً: اشتقاق الفهرس المقترح ---
+
+    @staticmethod
+    def _aliases(sql):
+        return {alias: table for table, alias in _ALIAS.findall(sql)}
+
+    def _candidate(self, sql, table):
+        """
+        أعمدة الفهرس من شروط الاستعلام على الجدول: المساواة أولاً، ثم الترتيب (أو أول شرط نطاق)،
+        و IS NULL يصبح فهرساً جزئياً (condition) مثل الرحلات المفتوحة end_date IS NULL.
+        يعيد None إذا كان فهرس موجود يغطي نفس الأعمدة.
+        """
+        aliases = self._aliases(sql)
+
+        def refs(pattern, text):
+            for match in pattern.finditer(text):
+                ref_table = match.group('table') or aliases.get(match.group('alias'))
+                if ref_table == table:
+                    yield match
+
+        where_part, _, order_part = sql.rpartition(' ORDER BY ')
+        if not where_part:
+            where_part, order_part = sql, ''
+
+        equality, ranges, null_columns = [], [], []
+        for match in refs(_PREDICATE, where_part):
+            column, op = match.group('column'), match.group('op')
+            if op == 'IS NULL':
+                null_columns.append(column)
+            elif op in ('=', 'IN ('):
+                equality.append(column)
+            elif op != 'IS NOT NULL':
+                ranges.append(column)
+        ordering = [(m.group('column'), m.group('direction')) for m in refs(_ORDER_BY, order_part)]
+
+        columns = list(dict.fromkeys(equality))
+        if ordering:
+            columns += [(c, d) for c, d in ordering if c not in columns]
+        elif ranges:
+            columns += [c for c in ranges[:1] if c not in columns]
+        if not columns and null_columns:
+            columns = null_columns[:1]
+        if not columns:
+            return None
+
+        if self._is_covered(table, [c if isinstance(c, str) else c[0] for c in columns]):
+            return None
+        return table, tuple(columns), tuple(dict.fromkeys(null_columns))
+
+    @staticmethod
+    def _is_covered(table, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return any(
+            (constraint['index'] or constraint['primary_key'] or constraint['unique'])
+            and (constraint['columns'] or [])[:len(columns)] == columns
+            for constraint in constraints.values()
+        )
+
+    # --- رابعاً: التقرير ---
+
+    def _report(self, candidates):
+        if not candidates:
+            self.stdout.write(self.style.SUCCESS("\nلا توجد فهارس مقترحة: كل الاستعلامات على الجداول الكبيرة تستخدم فهارس."))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n💡 الفهارس المقترحة (مرتبة حسب الفائدة المقدرة):"))
+        basis = "من EXPLAIN ANALYZE" if connection.vendor == 'postgresql' else "حد أعلى: زمن الاستعلامات المتأثرة"
+        ranked = sorted(candidates.items(), key=lambda item: -item[1]['saved_ms'])
+        for number, ((table, columns, null_columns), entry) in enumerate(ranked, 1):
+            model = next((m for m in apps.get_models() if m._meta.db_table == table), None)
+            if model is None:
+                continue
+            index = self._build_index(model, columns, null_columns)
+            self.stdout.write(f"\n{number}. {model.__name__}: {self._index_repr(index)}")
+            self.stdout.write(f"   {self._index_sql(model, index)}")
+            self.stdout.write(
+                f"   الفائدة المقدرة: ~{entry['saved_ms']:.1f}ms لكل تشغيل للحمل ({basis})، "
+                f"{entry['queries']} استعلام / {entry['executions']} تنفيذ"
+            )
+            self.stdout.write(f"   مثال: {entry['sample'][:200]}")
+
+    @staticmethod
+    def _build_index(model, columns, null_columns):
+        by_column = {f.column: f.name for f in model._meta.concrete_fields}
+        fields = []
+        for column in columns:
+            name, direction = (column, 'ASC') if isinstance(column, str) else column
+            fields.append(('-' if direction == 'DESC' else '') + by_column.get(name, name))
+        condition = None
+        for column in null_columns:
+            q = models.Q(**{f'{by_column.get(column, column)}__isnull': True})
+            condition = q if condition is None else condition & q
+        index = models.Index(fields=fields, condition=condition, name='advised_idx')
+        index.set_name_with_model(model)
+        return index
+
+    @staticmethod
+    def _index_repr(index):
+        condition = ''
+        if index.condition:
+            lookups = ', '.join(f'{lookup}={value!r}' for lookup, value in index.condition.children)
+            condition = f", condition=models.Q({lookups})"
+        return f"models.Index(fields={list(index.fields)!r}{condition}, name={index.name!r})"
+
+    @staticmethod
+    def _index_sql(model, index):
+        with connection.schema_editor(collect_sql=True) as editor:
+            return str(index.create_sql(model, editor)) + ';'
@@ -0,0 +1,74 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from trans_maint.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "مقارنة زمن استجابة صفحات اللوحة وتفاصيل المركبة بين النسخة المتزامنة وغير المتزامنة"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--vehicle', type=int, help="رقم المركبة لصفحة التفاصيل (الافتراضي: أول مركبة)")
+
+    def handle(self, *args, **options):
+        vehicle_id = options['vehicle'] or Vehicle.objects.values_list('id', flat=True).order_by('id').first()
+        if vehicle_id is None:
+            raise CommandError("لا توجد مركبات في القاعدة؛ قم بتوليد بيانات أولاً.")
+
+        pages = [
+            ('dashboard', reverse('admin_dashboard'), reverse('admin_dashboard_async')),
+            ('vehicle_detail', reverse('vehicle_detail', args=[vehicle_id]), reverse('vehicle_detail_async', args=[vehicle_id])),
+        ]
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, sync_url, async_url in pages:
+                sync_times = self._measure_sync(sync_url, options['iterations'], options['warmup'])
+                async_times = asyncio.run(self._measure_async(async_url, options['iterations'], options['warmup']))
+                self._report(name, sync_times, async_times)
+
+    def _measure_sync(self, url, iterations, warmup):
+        client = Client()
+        timings = []
+        for i in range(warmup + iterations):
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            self._check(url, response)
+            if i >= warmup:
+                timings.append(elapsed)
+        return timings
+
+    async def _measure_async(self, url, iterations, warmup):
+        client = AsyncClient()
+        timings = []
+        for i in range(warmup + iterations):
+            started = time.perf_counter()
+            response = await client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            self._check(url, response)
+            if i >= warmup:
+                timings.append(elapsed)
+        return timings
+
+    def _check(self, url, response):
+        if response.status_code != 200:
+            raise CommandError(f"{url} أعاد الحالة {response.status_code}")
+
+    def _report(self, name, sync_times, async_times):
+        def p95(values):
+            return sorted(values)[max(0, int(round(len(values) * 0.95)) - 1)]
+
+        sync_p50, async_p50 = statistics.median(sync_times), statistics.median(async_times)
+        self.stdout.write(
+            f"{name:<16} sync p50={sync_p50:8.2f}ms p95={p95(sync_times):8.2f}ms | "
+            f"async p50={async_p50:8.2f}ms p95={p95(async_times):8.2f}ms | "
+            f"speedup x{sync_p50 / async_p50 if async_p50 else 0:.2f}"
+        )
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trans_maint.services.outbox_service import OutboxService
+
+
+class Command(BaseCommand):
+    help = "حذف أحداث صندوق الصادر التي أكدها كل المستهلكين (على دفعات)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="عدد الصفوف المحذوفة في كل transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        through = OutboxService.compactable_through()
+        deleted = OutboxService.compact(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"تم حذف {deleted} حدث حتى المؤشر {through} في {time.perf_counter() - started:.2f} ثانية."
+        ))
@@ -0,0 +1,374 @@
+import csv
+import datetime
+import io
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from trans_maint.models import (
+    MilitaryRank, Employee, Vehicle, Workshop,
+    Trip, FuelTransaction, Accident, MaintenanceRequest, FleetDailyFact, FactDirtyDay
+)
+from trans_maint.services.data_version_service import DataVersionService
+from trans_maint.services.fleet_analytics_service import FleetAnalyticsService
+
+
+class FleetWriter:
+    """
+    كتابة مجمعة للجداول الكبيرة: COPY على PostgreSQL، و bulk_create على غيرها.
+    الصفوف قواميس بأسماء الحقول (attname)، والمعرفات تُحدد مسبقاً لربط الجداول بدون قراءة عكسية.
+    """
+
+    # ترتيب الكتابة يحترم المفاتيح الأجنبية (الرحلة قبل الحركات والحوادث، والحادث قبل الصيانة)
+    ORDER = (Trip, Accident, MaintenanceRequest, FuelTransaction)
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+        self.buffers = {model: [] for model in self.ORDER}
+        self.counts = {model: 0 for model in self.ORDER}
+
+    def add(self, model, row):
+        self.buffers[model].append(row)
+        if len(self.buffers[model]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        with transaction.atomic():
+            for model in self.ORDER:
+                rows = self.buffers[model]
+                if rows:
+                    self._copy(model, rows) if self.use_copy else self._bulk_create(model, rows)
+                    self.counts[model] += len(rows)
+                    self.buffers[model] = []
+
+    def _bulk_create(self, model, rows):
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=min(self.batch_size, 5000))
+
+    def _copy(self, model, rows):
+        columns = list(rows[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([self._copy_value(row[column]) for column in columns])
+        buffer.seek(0)
+        sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(model._meta.get_field(c).column) for c in columns),
+        )
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):  # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.getvalue())
+
+    @staticmethod
+    def _copy_value(value):
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return value
+
+
+@contextmanager
+def explicit_dates():
+    """
+    حقول auto_now_add تستبدل أي تاريخ نمرره بوقت الإدخال (حتى في bulk_create)،
+    فنعطلها مؤقتاً لتوليد تاريخ تشغيلي حقيقي.
+    """
+    fields = [FuelTransaction._meta.get_field('date'), MaintenanceRequest._meta.get_field('date_reported')]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        "توليد بيانات أسطول صناعية بأحجام واقعية لاختبارات الأداء (حتمية بالـ seed). "
+        "--scale 1 ≈ 10 آلاف حركة وقود، 100 ≈ مليون، 1000 ≈ 10 ملايين."
+    )
+
+    EMPLOYEES_PER_SCALE = 100
+    VEHICLES_PER_SCALE = 50
+    WORKSHOPS_PER_SCALE = 2
+    TRIPS_PER_EMPLOYEE_YEAR = 46
+    ACCIDENT_RATE = 0.02
+    PERIODIC_MAINTENANCE_DAYS = 120
+
+    RANKS = (
+        # (الرتبة، الحصة الأسبوعية، الحصة الشهرية، الوزن في التوزيع)
+        ('ملازم', 60.0, 240.0, 30), ('نقيب', 70.0, 280.0, 25), ('رائد', 80.0, 320.0, 20),
+        ('مقدم', 90.0, 360.0, 12), ('عقيد', 100.0, 400.0, 8), ('عميد', 120.0, 480.0, 5),
+    )
+    TRIP_TYPES = ('دورية', 'مهمة رسمية', 'نقل إمداد', 'تفتيش ميداني')
+    PLATE_LETTERS = 'أبجدرسصطعفقلمنهو'
+    ACCIDENT_DESCRIPTIONS = ('اصطدام خلفي', 'انزلاق على الطريق', 'اصطدام جانبي عند تقاطع', 'تلف إطار وخروج عن المسار')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help="مضاعف الحجم (100 موظف و50 مركبة لكل وحدة)")
+        parser.add_argument('--seed', type=int, default=42, help="بذرة العشوائية (نفس البذرة = نفس البيانات)")
+        parser.add_argument('--days', type=int, default=365, help="طول التاريخ المولد بالأيام")
+        parser.add_argument('--end-date', default=None, help="آخر يوم في التاريخ المولد YYYY-MM-DD (الافتراضي اليوم)")
+        parser.add_argument('--batch-size', type=int, default=20000, help="عدد الصفوف في كل دفعة كتابة")
+        parser.add_argument('--reset', action='store_true', help="حذف كل بيانات التشغيل الحالية قبل التوليد")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker(['ar_SA'])
+        self.fake.seed_instance(options['seed'])
+
+        end_day = datetime.date.fromisoformat(options['end_date']) if options['end_date'] else timezone.localdate()
+        self.end = timezone.make_aware(datetime.datetime.combine(end_day, datetime.time(23, 59)))
+        self.start = self.end - datetime.timedelta(days=options['days'])
+
+        if options['reset']:
+            self.reset()
+        elif Employee.objects.exists() or Vehicle.objects.exists():
+            raise CommandError("قاعدة البيانات تحتوي بيانات بالفعل؛ استخدم --reset للتوليد من الصفر.")
+
+        scale = options['scale']
+        with transaction.atomic():
+            ranks = self.create_ranks()
+            employees = self.create_employees(scale * self.EMPLOYEES_PER_SCALE, ranks)
+            vehicles = self.create_vehicles(scale * self.VEHICLES_PER_SCALE, employees)
+            workshops = self.create_workshops(scale * self.WORKSHOPS_PER_SCALE)
+        self.stdout.write(f"✅ {len(ranks)} رتب، {len(employees)} موظف، {len(vehicles)} مركبة، {len(workshops)} ورشة.")
+
+        writer = FleetWriter(options['batch_size'])
+        self.ids = {model: 0 for model in FleetWriter.ORDER}
+        self.last_activity = {}
+        under_repair = []
+
+        with explicit_dates():
+            # كل موظف يتبع مركبة واحدة: رحلات المركبة متتابعة، فلا تتداخل رحلات المركبة ولا رحلات الموظف
+            groups = {vehicle.id: [] for vehicle in vehicles}
+            for index, employee in enumerate(employees):
+                groups[vehicles[index % len(vehicles)].id].append(employee)
+
+            for position, vehicle in enumerate(vehicles, 1):
+                if self.simulate_vehicle(writer, vehicle, groups[vehicle.id], workshops):
+                    under_repair.append(vehicle.id)
+                if position % 500 == 0:
+                    self.stdout.write(f"   ... {position}/{len(vehicles)} مركبة، {writer.counts[FuelTransaction]:,} حركة وقود")
+            writer.flush()
+
+        self.finalize(employees, under_repair)
+
+        elapsed = time.perf_counter() - started
+        ledger = writer.counts[FuelTransaction]
+        self.stdout.write(self.style.SUCCESS(
+            f"🏁 {writer.counts[Trip]:,} رحلة، {ledger:,} حركة وقود، {writer.counts[Accident]:,} حادث، "
+            f"{writer.counts[MaintenanceRequest]:,} طلب صيانة في {elapsed:.1f} ثانية "
+            f"({ledger / max(elapsed, 0.001):,.0f} حركة/ثانية)."
+        ))
+        self.stdout.write("للتحليلات: python manage.py refresh_fleet_facts --full")
+
+    # --- أولاً: التهيئة والجداول المرجعية ---
+
+    def reset(self):
+        models = [
+            FleetDailyFact, FactDirtyDay, MaintenanceRequest, Accident, FuelTransaction, Trip,
+            Vehicle, Employee, Workshop, MilitaryRank,
+        ]
+        # نفس آلية manage.py flush: TRUNCATE على PostgreSQL و DELETE على غيرها، مع تصفير العدادات
+        sql_list = connection.ops.sql_flush(no_style(), [m._meta.db_table for m in models], reset_sequences=True)
+        connection.ops.execute_sql_flush(sql_list)
+        self.stdout.write("🧹 تم حذف بيانات التشغيل السابقة.")
+
+    def create_ranks(self):
+        return MilitaryRank.objects.bulk_create([
+            MilitaryRank(name=name, default_weekly_quota=weekly, default_monthly_quota=monthly)
+            for name, weekly, monthly, _ in self.RANKS
+        ])
+
+    def create_employees(self, count, ranks):
+        weights = [weight for *_, weight in self.RANKS]
+        employees = [
+            Employee(
+                id=i + 1,
+                name=self.fake.name(),
+                military_number=str(10_000_000 + i),
+                rank_id=self.rng.choices(ranks, weights)[0].id,
+                is_active=self.rng.random() > 0.05,
+            )
+            for i in range(count)
+        ]
+        Employee.objects.bulk_create(employees, batch_size=5000)
+        return employees
+
+    def create_vehicles(self, count, employees):
+        vehicles = []
+        for i in range(count):
+            is_private = self.rng.random() < 0.3
+            letters = ''.join(self.rng.choice(self.PLATE_LETTERS) for _ in range(2))
+            vehicles.append(Vehicle(
+                id=i + 1,
+                plate_number=f"{i + 1:06d} {letters}",
+                model=str(self.rng.randint(2010, 2026)),
+                vehicle_type='private' if is_private else 'company',
+                owner_id=self.rng.choice(employees).id if is_private else None,
+                status='active',
+            ))
+        Vehicle.objects.bulk_create(vehicles, batch_size=5000)
+        return vehicles
+
+    def create_workshops(self, count):
+        return Workshop.objects.bulk_create([
+            Workshop(id=i + 1, name=f"ورشة {self.fake.company()}", address=self.fake.address(), phone=self.fake.phone_number())
+            for i in range(count)
+        ])
+
+    # --- ثانياً: محاكاة التشغيل لكل مركبة (Timeline) ---
+
+    def next_id(self, model):
+        self.ids[model] += 1
+        return self.ids[model]
+
+    def simulate_vehicle(self, writer, vehicle, employees, workshops):
+        """
+        يولد خط زمني متتابع للمركبة: رحلات، إضافات وصرف وقود، حوادث وصيانة.
+        يعيد True إذا انتهى التاريخ والمركبة في الورشة (صيانة مفتوحة).
+        """
+        if not employees:
+            return False
+
+        rng = self.rng
+        balances = {employee.id: 0.0 for employee in employees}
+        trips_per_year = self.TRIPS_PER_EMPLOYEE_YEAR * len(employees)
+        mean_gap_hours = 365 * 24 / trips_per_year
+        monthly_due = {employee.id: self.start for employee in employees}
+        next_service = self.start + datetime.timedelta(days=rng.uniform(0, self.PERIODIC_MAINTENANCE_DAYS))
+        t = self.start + datetime.timedelta(hours=rng.uniform(0, mean_gap_hours))
+
+        while True:
+            # الإضافات الشهرية المستحقة قبل هذا الوقت (حصة الشهر)
+            for employee in employees:
+                while monthly_due[employee.id] <= min(t, self.end):
+                    self.fuel(writer, employee, vehicle, 'addition', rng.uniform(150.0, 400.0), monthly_due[employee.id], balances, notes="حصة شهرية")
+                    monthly_due[employee.id] += datetime.timedelta(days=30)
+
+            if t >= self.end:
+                return False
+
+            # صيانة دورية: المركبة لا تخرج في رحلات حتى الإكمال
+            if t >= next_service:
+                completed = self.maintenance(writer, vehicle, rng.choice(workshops), next_service, rng.uniform(1, 4), "صيانة دورية")
+                if completed is None:
+                    return True
+                t = completed + datetime.timedelta(hours=rng.uniform(1, 12))
+                next_service = completed + datetime.timedelta(days=self.PERIODIC_MAINTENANCE_DAYS)
+                continue
+
+            employee = rng.choice(employees)
+            duration = datetime.timedelta(hours=rng.uniform(1, 12))
+            is_open = t + duration > self.end
+            trip_id = self.next_id(Trip)
+            quota = round(rng.uniform(20.0, 60.0), 2)
+            writer.add(Trip, {
+                'id': trip_id, 'vehicle_id': vehicle.id, 'employee_id': employee.id,
+                'trip_type': rng.choice(self.TRIP_TYPES), 'area': self.area(),
+                'start_date': t, 'end_date': None if is_open else t + duration, 'fuel_quota_granted': quota,
+            })
+            # نفس ما تفعله TripService.create_trip_with_quota: إضافة مرتبطة بالرحلة ثم صرف من الرصيد
+            self.fuel(writer, employee, vehicle, 'addition', quota, t, balances, trip_id=trip_id, notes="دعم وقود تلقائي للرحلة")
+            issue_at = t + datetime.timedelta(minutes=rng.uniform(5, 60))
+            if issue_at <= self.end:
+                self.fuel(writer, employee, vehicle, 'issue', rng.uniform(15.0, 70.0), issue_at, balances)
+            if is_open:
+                return False
+
+            if rng.random() < self.ACCIDENT_RATE:
+                occurred = t + duration * rng.random()
+                cost = Decimal(rng.randint(500, 20000))
+                accident_id = self.next_id(Accident)
+                writer.add(Accident, {
+                    'id': accident_id, 'vehicle_id': vehicle.id, 'trip_id': trip_id, 'date_occurred': occurred,
+                    'description': rng.choice(self.ACCIDENT_DESCRIPTIONS),
+                    'damage_cost': cost, 'status': 'closed' if occurred < self.end - datetime.timedelta(days=30) else 'open',
+                })
+                completed = self.maintenance(writer, vehicle, rng.choice(workshops), occurred, rng.uniform(3, 20),
+                                             "إصلاح أضرار حادث", accident_id=accident_id, cost=cost + 200)
+                if completed is None:
+                    return True
+                t = completed + datetime.timedelta(hours=rng.uniform(1, 12))
+                continue
+
+            t += duration + datetime.timedelta(hours=rng.expovariate(1 / mean_gap_hours))
+
+    def fuel(self, writer, employee, vehicle, transaction_type, quantity, date, balances, trip_id=None, notes=None):
+        """حركة وقود مع الحفاظ على عدم سالبية الرصيد (الصرف لا يتجاوز المتاح)"""
+        if transaction_type == 'issue':
+            quantity = min(quantity, balances[employee.id])
+            if quantity < 1:
+                return
+            balances[employee.id] -= quantity
+        else:
+            balances[employee.id] += quantity
+
+        writer.add(FuelTransaction, {
+            'id': self.next_id(FuelTransaction), 'employee_id': employee.id, 'vehicle_id': vehicle.id,
+            'trip_id': trip_id, 'quantity': round(quantity, 2), 'transaction_type': transaction_type,
+            'date': date, 'notes': notes,
+        })
+        field = 'last_issue_at' if transaction_type == 'issue' else 'last_addition_at'
+        self.last_activity.setdefault(employee.id, {})[field] = date
+
+    def maintenance(self, writer, vehicle, workshop, reported_at, days, reason, accident_id=None, cost=None):
+        """طلب صيانة؛ يعيد وقت الإكمال، أو None إذا بقي مفتوحاً حتى نهاية التاريخ المولد"""
+        completed = reported_at + datetime.timedelta(days=days)
+        is_done = completed <= self.end
+        writer.add(MaintenanceRequest, {
+            'id': self.next_id(MaintenanceRequest), 'vehicle_id': vehicle.id, 'workshop_id': workshop.id,
+            'accident_ref_id': accident_id, 'reason': reason,
+            'cost': cost if cost is not None else Decimal(self.rng.randint(300, 3000)),
+            'date_reported': timezone.localtime(reported_at).date(),
+            'date_completed': timezone.localtime(completed).date() if is_done else None,
+            'status': 'completed' if is_done else 'pending',
+        })
+        return completed if is_done else None
+
+    def area(self):
+        if not hasattr(self, '_areas'):
+            self._areas = [self.fake.city() for _ in range(40)]
+        return self.rng.choice(self._areas)
+
+    # --- ثالثاً: ما تفعله الإشارات عادة (bulk_create/COPY لا تطلقها) ---
+
+    def finalize(self, employees, under_repair):
+        with transaction.atomic():
+            Vehicle.objects.filter(id__in=under_repair).update(status='under_repair')
+
+            for employee in employees:
+                for field, value in self.last_activity.get(employee.id, {}).items():
+                    setattr(employee, field, value)
+            Employee.objects.bulk_update(employees, ['last_issue_at', 'last_addition_at'], batch_size=1000)
+
+            # المعرفات حُددت يدوياً، فنعيد ضبط عدادات PostgreSQL لما بعد أكبر معرف
+            models = [Employee, Vehicle, Workshop, Trip, FuelTransaction, Accident, MaintenanceRequest]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        days, day = [], self.start.date()
+        while day <= self.end.date():
+            days.append(day)
+            day += datetime.timedelta(days=1)
+        FleetAnalyticsService.mark_dirty(*days)
+        DataVersionService.bump_now(*DataVersionService.TABLES)
@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from trans_maint.models import OutboxConsumer
+from trans_maint.services.outbox_service import OutboxService
+
+
+class Command(BaseCommand):
+    help = "طباعة أحداث صندوق الصادر بعد مؤشر معين (سطر JSON لكل حدث) للمزامنة الدفعية مع الأنظمة الخارجية"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after', type=int, default=None, help="المؤشر (آخر id تمت معالجته). الافتراضي: آخر تأكيد للمستهلك أو 0")
+        parser.add_argument('--consumer', help="اسم النظام المستهلك (لقراءة مؤشره وتأكيده)")
+        parser.add_argument('--limit', type=int, default=None, help="حجم الدفعة (OUTBOX_BATCH_SIZE افتراضياً)")
+        parser.add_argument('--max-batches', type=int, default=1, help="عدد الدفعات المتتالية قبل التوقف")
+        parser.add_argument('--types', default='', help="بادئات الأحداث مفصولة بفواصل: fuel,trip,accident")
+        parser.add_argument('--ack', action='store_true', help="تأكيد المستهلك حتى آخر حدث مطبوع (بعد نجاح الطباعة)")
+
+    def handle(self, *args, **options):
+        if options['ack'] and not options['consumer']:
+            raise CommandError("--ack يتطلب --consumer")
+        if options['limit'] is not None and options['limit'] < 1:
+            raise CommandError("--limit يجب أن يكون 1 أو أكثر")
+
+        after = options['after']
+        if after is None and options['consumer']:
+            after = OutboxConsumer.objects.filter(name=options['consumer']).values_list('acked_through', flat=True).first()
+        after = after or 0
+        types = [t for t in options['types'].split(',') if t]
+
+        printed = 0
+        for _ in range(options['max_batches']):
+            events, has_more = OutboxService.changes_since(after, options['limit'], types)
+            for event in events:
+                self.stdout.write(json.dumps(OutboxService.serialize(event), cls=DjangoJSONEncoder, ensure_ascii=False))
+            if events:
+                after = events[-1].id
+                printed += len(events)
+            if not has_more:
+                break
+
+        if options['ack'] and printed:
+            OutboxService.acknowledge(options['consumer'], after)
+        self.stderr.write(f"{printed} حدث، المؤشر التالي: {after}")
@@ -0,0 +1,97 @@
+import time
+from collections import defaultdict, Counter
+
+from django.core.management.base import BaseCommand
+
+from trans_maint.middleware import PerfLog
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(round((len(values) - 1) * fraction)))]
+
+
+class Command(BaseCommand):
+    help = "ملخص أسوأ الـ Views من سجل الأداء (PerfMiddleware): الاستعلامات، زمن القاعدة، التكرار، الزمن الكلي، والذاكرة"
+
+    SORT_KEYS = ('queries', 'db', 'wall', 'duplicates', 'over_budget', 'memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=self.SORT_KEYS, default='queries', help="ترتيب الـ Views حسب")
+        parser.add_argument('--limit', type=int, default=15, help="عدد الـ Views المعروضة")
+        parser.add_argument('--since-minutes', type=int, default=None, help="آخر N دقيقة فقط")
+        parser.add_argument('--view', default=None, help="تصفية باسم الـ View (جزء من الاسم)")
+
+    def handle(self, *args, **options):
+        since = time.time() - options['since_minutes'] * 60 if options['since_minutes'] else None
+        stats = defaultdict(lambda: {
+            'requests': 0, 'queries': [], 'db': [], 'wall': [], 'over_budget': 0, 'duplicates': Counter(), 'samples': {},
+            'memory': [], 'top_allocation': None,
+        })
+
+        for record in PerfLog.read():
+            if since and record.get('ts', 0) < since:
+                continue
+            if options['view'] and options['view'] not in record['view']:
+                continue
+            row = stats[record['view']]
+            row['requests'] += 1
+            row['wall'].append(record['wall_ms'])
+            if 'queries' in record:
+                row['queries'].append(record['queries'])
+                row['db'].append(record['db_ms'])
+            if 'over_budget' in record:
+                row['over_budget'] += 1
+            if 'rss_kb' in record or 'py_peak_kb' in record:
+                # زيادة ذاكرة التنفيذ: الأكبر بين ذروة Python (عينة متتبعة) وتغير RSS ورفع أعلى RSS للعملية
+                growth = max(record.get('py_peak_kb', 0), record.get('rss_delta_kb', 0), record.get('peak_rss_growth_kb', 0))
+                row['memory'].append(growth)
+                if record.get('top_allocations') and (row['top_allocation'] is None or growth >= row['top_allocation'][0]):
+                    row['top_allocation'] = (growth, record['top_allocations'][0])
+            for duplicate in record.get('duplicates', ()):
+                row['duplicates'][duplicate['fingerprint']] += duplicate['count']
+                row['samples'].setdefault(duplicate['fingerprint'], duplicate['sql'])
+
+        if not stats:
+            self.stdout.write("لا توجد سجلات أداء بعد.")
+            return
+
+        summary = []
+        for view, row in stats.items():
+            summary.append({
+                'view': view,
+                'requests': row['requests'],
+                'queries': max(row['queries'], default=0),
+                'avg_queries': sum(row['queries']) / len(row['queries']) if row['queries'] else 0,
+                'db': _percentile(row['db'], 0.95),
+                'wall': _percentile(row['wall'], 0.95),
+                'wall_p50': _percentile(row['wall'], 0.5),
+                'over_budget': row['over_budget'],
+                'duplicates': sum(row['duplicates'].values()),
+                'top_duplicate': row['duplicates'].most_common(1),
+                'samples': row['samples'],
+                'memory': _percentile(row['memory'], 0.95) / 1024,
+                'memory_max': max(row['memory'], default=0) / 1024,
+                'measured_memory': bool(row['memory']),
+                'top_allocation': row['top_allocation'],
+            })
+        summary.sort(key=lambda r: r[options['sort']], reverse=True)
+
+        self.stdout.write(
+            f"{'View':<55} {'طلبات':>6} {'استعلامات(max/avg)':>18} {'DB p95':>9} {'p50':>9} {'p95':>9} {'تكرار':>6} {'تجاوز':>6} {'ذاكرة MB(p95/max)':>18}"
+        )
+        for r in summary[:options['limit']]:
+            line = (
+                f"{r['view'][-55:]:<55} {r['requests']:>6} {r['queries']:>9}/{r['avg_queries']:<8.1f} "
+                f"{r['db']:>7.1f}ms {r['wall_p50']:>7.1f}ms {r['wall']:>7.1f}ms {r['duplicates']:>6} {r['over_budget']:>6} "
+                + (f"{r['memory']:>9.1f}/{r['memory_max']:<8.1f}" if r['measured_memory'] else f"{'-':>18}")
+            )
+            self.stdout.write(self.style.WARNING(line) if r['over_budget'] else line)
+            if r['top_duplicate']:
+                fingerprint, count = r['top_duplicate'][0]
+                self.stdout.write(f"    ↳ أكثر استعلام مكرر ({count} مرة): {r['samples'][fingerprint][:150]}")
+            if r['top_allocation']:
+                _, site = r['top_allocation']
+                self.stdout.write(f"    ↳ أكبر موقع تخصيص ({site['kb']} KB، {site['count']} كائن): {site['site']}")
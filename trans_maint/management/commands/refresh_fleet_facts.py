@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from trans_maint.services.fleet_analytics_service import FleetAnalyticsService
+
+
+class Command(BaseCommand):
+    help = "تحديث جدول الحقائق اليومي (FleetDailyFact) للأيام التي تغيرت بياناتها فقط"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="إعادة بناء كل التاريخ (بعد تغيير رتب أو أنواع مركبات مثلاً)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        days = FleetAnalyticsService.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"تم تحديث {days} يوم في {time.perf_counter() - started:.2f} ثانية."
+        ))
@@ -0,0 +1,212 @@
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+from django.utils import timezone
+
+from trans_maint.models import Employee, Vehicle, Trip, MaintenanceRequest
+from trans_maint.services.async_utils import materialize
+from trans_maint.services.dashboard_service import DashboardService
+from trans_maint.services.fuel_service import FuelService
+from trans_maint.services.report_service import ReportService
+from trans_maint.services.trip_service import TripService
+
+
+# نهاية ثابتة للتاريخ المولد حتى تبقى النتائج قابلة للمقارنة بين التشغيلات
+DATASET_END_DATE = '2026-06-30'
+
+
+def benchmark_context():
+    """عينات ثابتة من البيانات المولدة: موظف برصيد، ومركبة وموظف متاحان لرحلة جديدة"""
+    busy_vehicles = Trip.objects.filter(end_date__isnull=True).values('vehicle_id')
+    in_repair = MaintenanceRequest.objects.filter(status='pending').values('vehicle_id')
+    busy_employees = Trip.objects.filter(end_date__isnull=True).values('employee_id')
+    return {
+        'employee_id': Employee.objects.order_by('id').values_list('id', flat=True).first(),
+        'vehicle_id': Vehicle.objects.order_by('id').values_list('id', flat=True).first(),
+        'free_vehicle': Vehicle.objects.filter(status='active').exclude(id__in=busy_vehicles).exclude(id__in=in_repair).order_by('id').first(),
+        'free_employee': Employee.objects.exclude(id__in=busy_employees).order_by('id').first(),
+    }
+
+
+def _bench_issue_fuel(ctx):
+    FuelService.issue_fuel(ctx['employee_id'], ctx['vehicle_id'], 1.0)
+
+
+def _bench_create_trip(ctx):
+    TripService.create_trip_with_quota({
+        'vehicle': ctx['free_vehicle'], 'employee': ctx['free_employee'],
+        'trip_type': 'دورية', 'area': 'اختبار أداء', 'fuel_quota_granted': 30.0, 'start_date': timezone.now(),
+    })
+
+
+def _bench_general_stats(ctx):
+    DashboardService.get_general_stats()
+
+
+def _bench_consumption_summary(ctx):
+    materialize(ReportService.FuelReports.get_consumption_summary.uncached())
+
+
+def _bench_monthly_summary(ctx):
+    materialize(ReportService.FuelReports.get_monthly_summary.uncached(2026, 5))
+
+
+def _bench_detailed_consumption(ctx):
+    list(ReportService.FuelReports.get_detailed_consumption_report('2026-01-01', '2026-06-30')[:15])
+
+
+def _bench_trip_statistics(ctx):
+    ReportService.TripReports.get_trip_statistics.uncached('2026-01-01', '2026-06-30')
+
+
+def _bench_accident_cost_summary(ctx):
+    ReportService.AssetReports.get_accident_cost_summary.uncached('2026-01-01', '2026-06-30')
+
+
+def _bench_over_consumption(ctx):
+    list(ReportService.QuotaReports.get_over_consumption_report(90)[:15])
+
+
+def _bench_consumption_distribution(ctx):
+    ReportService.QuotaReports.get_consumption_distribution.uncached()
+
+
+def _bench_unused_quota(ctx):
+    list(ReportService.QuotaReports.get_unused_quota_report(30).order_by('-id')[:15])
+
+
+# (الاسم، الدالة، هل تكتب في القاعدة) - الكتابات تُنفذ داخل transaction يُلغى بعد كل تكرار
+# التقارير المحفوظة تُقاس بـ uncached (كلفة الحساب الفعلية لا كلفة الكاش)
+BENCHMARKS = (
+    ('fuel.issue_fuel', _bench_issue_fuel, True),
+    ('trip.create_trip_with_quota', _bench_create_trip, True),
+    ('dashboard.general_stats', _bench_general_stats, False),
+    ('report.consumption_summary', _bench_consumption_summary, False),
+    ('report.monthly_summary', _bench_monthly_summary, False),
+    ('report.detailed_consumption_page', _bench_detailed_consumption, False),
+    ('report.trip_statistics', _bench_trip_statistics, False),
+    ('report.accident_cost_summary', _bench_accident_cost_summary, False),
+    ('report.over_consumption_page', _bench_over_consumption, False),
+    ('report.consumption_distribution', _bench_consumption_distribution, False),
+    ('report.unused_quota_page', _bench_unused_quota, False),
+)
+
+# حجم البيانات -> --scale في generate_fleet (كل وحدة ≈ 10 آلاف حركة وقود)
+SCALES = {'10k': 1, '1m': 100, '10m': 1000}
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس أداء المسارات الساخنة في طبقة الخدمات على بيانات مولدة بأحجام مختلفة، "
+        "ومقارنتها بخط الأساس المحفوظ (يفشل عند التراجع فوق الحد المسموح)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='10k', help="أحجام البيانات مفصولة بفواصل: 10k,1m,10m")
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument('--only', default=None, help="تشغيل المقاييس التي يبدأ اسمها بهذا النص فقط")
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'))
+        parser.add_argument('--threshold', type=float, default=0.25, help="نسبة التراجع المسموحة في الزمن (0.25 = 25%%)")
+        parser.add_argument('--min-delta-ms', type=float, default=5.0, help="تجاهل الفروق الأصغر من هذا (ضوضاء القياس)")
+        parser.add_argument('--update-baseline', action='store_true', help="حفظ النتائج الحالية كخط أساس جديد")
+        parser.add_argument('--keepdb', action='store_true', help="الإبقاء على قاعدة الاختبار بين التشغيلات")
+
+    def handle(self, *args, **options):
+        scales = [s.strip() for s in options['scales'].split(',') if s.strip()]
+        unknown = [s for s in scales if s not in SCALES]
+        if unknown:
+            raise CommandError(f"أحجام غير معروفة: {', '.join(unknown)} (المتاح: {', '.join(SCALES)})")
+
+        baseline = self._load_baseline(options['baseline'])
+        results = {}
+
+        # قاعدة اختبار منفصلة (test_<name>) حتى لا يمس التوليد بيانات التشغيل الحقيقية
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            for scale in scales:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"📦 توليد بيانات الحجم {scale} ..."))
+                call_command('generate_fleet', scale=SCALES[scale], reset=True, end_date=DATASET_END_DATE, stdout=open(os.devnull, 'w'))
+                results[scale] = self._run_scale(options)
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        if options['update_baseline']:
+            for scale, scale_results in results.items():
+                baseline.setdefault(scale, {}).update(scale_results)
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"تم تحديث خط الأساس: {options['baseline']}"))
+            return
+
+        regressions = self._compare(results, baseline, options)
+        if regressions:
+            raise CommandError("تراجع في الأداء:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("لا يوجد تراجع مقارنة بخط الأساس."))
+
+    # --- أولاً: التشغيل والقياس ---
+
+    def _run_scale(self, options):
+        ctx = benchmark_context()
+        results = {}
+        for name, func, writes in BENCHMARKS:
+            if options['only'] and not name.startswith(options['only']):
+                continue
+            timings, queries = [], 0
+            for i in range(options['warmup'] + options['iterations']):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    if writes:
+                        with transaction.atomic():
+                            func(ctx)
+                            transaction.set_rollback(True)
+                    else:
+                        func(ctx)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if i >= options['warmup']:
+                    timings.append(elapsed)
+                    queries = len(captured.captured_queries)
+
+            results[name] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(sorted(timings)[max(0, int(round(len(timings) * 0.95)) - 1)], 3),
+                'queries': queries,
+            }
+            self.stdout.write(f"  {name:<36} p50={results[name]['median_ms']:9.2f}ms  p95={results[name]['p95_ms']:9.2f}ms  queries={queries}")
+        return results
+
+    # --- ثانياً: خط الأساس (Baseline) ---
+
+    @staticmethod
+    def _load_baseline(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _compare(self, results, baseline, options):
+        regressions = []
+        for scale, scale_results in results.items():
+            for name, current in scale_results.items():
+                previous = baseline.get(scale, {}).get(name)
+                if previous is None:
+                    self.stdout.write(self.style.WARNING(f"  [{scale}] {name}: لا يوجد خط أساس (استخدم --update-baseline)"))
+                    continue
+                if current['queries'] > previous['queries']:
+                    regressions.append(f"  [{scale}] {name}: الاستعلامات {previous['queries']} ← {current['queries']}")
+                limit = previous['median_ms'] * (1 + options['threshold'])
+                if current['median_ms'] > limit and current['median_ms'] - previous['median_ms'] > options['min_delta_ms']:
+                    regressions.append(
+                        f"  [{scale}] {name}: الزمن {previous['median_ms']:.2f}ms ← {current['median_ms']:.2f}ms "
+                        f"(+{(current['median_ms'] / previous['median_ms'] - 1) * 100:.0f}%)"
+                    )
+        return regressions
@@ -0,0 +1,73 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from trans_maint.db_router import routing_scope
+from trans_maint.services.report_job_service import ReportJobService
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker_process():
+    # الاتصالات الموروثة من العملية الأم لا تُشارك بين العمليات؛ كل عملية تفتح اتصالها
+    connections.close_all()
+
+
+def _run_job(job_id):
+    try:
+        # كل مهمة نطاق مستقل: كتابة حالة مهمة سابقة لا تمنع المهمة التالية من القراءة من النسخة
+        with routing_scope():
+            ReportJobService.run_job(job_id)
+    finally:
+        connections.close_all()
+    return job_id
+
+
+class Command(BaseCommand):
+    help = "عامل تنفيذ مهام التقارير الخلفية (ReportJob) بمجموعة عمليات متوازية"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="عدد العمليات المتوازية")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="ثوانٍ بين كل فحص للمهام الجديدة")
+        parser.add_argument('--stale-minutes', type=int, default=60, help="إعادة المهام العالقة في التنفيذ أطول من هذه المدة")
+        parser.add_argument('--once', action='store_true', help="تنفيذ المهام المنتظرة الحالية ثم الخروج")
+
+    def handle(self, *args, **options):
+        requeued = ReportJobService.requeue_stale_jobs(options['stale_minutes'])
+        if requeued:
+            self.stdout.write(f"أُعيدت {requeued} مهمة عالقة إلى الانتظار.")
+
+        max_workers = options['processes']
+        connections.close_all()
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=_init_worker_process) as pool:
+            running = {}
+            while True:
+                # تعبئة الأماكن الفارغة في المجموعة بمهام جديدة
+                while len(running) < max_workers:
+                    job_id = ReportJobService.claim_next_job()
+                    if job_id is None:
+                        break
+                    running[pool.submit(_run_job, job_id)] = job_id
+                    self.stdout.write(f"بدء تنفيذ المهمة #{job_id}")
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        future.result()
+                        self.stdout.write(self.style.SUCCESS(f"اكتملت المهمة #{job_id}"))
+                    except Exception:
+                        logger.exception("فشل تنفيذ مهمة التقرير #%s", job_id)
+                        self.stdout.write(self.style.ERROR(f"فشلت المهمة #{job_id}"))
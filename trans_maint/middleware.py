@@ -0,0 +1,311 @@
+import cProfile
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .services.profiler_service import ProfilerService
+from .services.request_cache import RequestCache
+
+try:
+    import fcntl
+except ImportError:  # Windows (بيئة التطوير): القفل على مستوى العملية فقط
+    fcntl = None
+
+logger = logging.getLogger('trans_maint.perf')
+
+# توحيد نص الاستعلام قبل البصمة: الأرقام والنصوص الحرفية وقوائم IN (...) بأطوال مختلفة تُعامل كاستعلام واحد
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)", re.IGNORECASE)
+
+
+def query_fingerprint(sql):
+    normalized = _IN_LISTS.sub('IN (...)', _LITERALS.sub('?', sql))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """يُركّب على كل اتصالات القاعدة (execute_wrapper) ويسجل عدد ومدة وبصمة كل استعلام"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.durations = Counter()
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.duration += elapsed
+            self.count += 1
+            fingerprint = query_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            self.durations[fingerprint] += elapsed
+            self.samples.setdefault(fingerprint, sql[:300])
+
+    def duplicates(self):
+        """البصمات المتكررة في نفس الطلب (علامة N+1): [(البصمة، العدد، مثال)]"""
+        return [
+            (fingerprint, count, self.samples[fingerprint])
+            for fingerprint, count in self.fingerprints.most_common() if count > 1
+        ]
+
+    def slowest(self):
+        """البصمات حسب الزمن الكلي في الطلب: [(البصمة، العدد، الزمن بالثواني، مثال)]"""
+        return [
+            (fingerprint, self.fingerprints[fingerprint], duration, self.samples[fingerprint])
+            for fingerprint, duration in self.durations.most_common()
+        ]
+
+
+class PerfLog:
+    """سجل JSONL دوّار على القرص (ملف حالي + نسخة سابقة واحدة) يقرؤه manage.py perf_report"""
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def paths():
+        return [settings.PERF_LOG_FILE + '.1', settings.PERF_LOG_FILE]
+
+    @staticmethod
+    def write(record):
+        path = settings.PERF_LOG_FILE
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with PerfLog._lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # كتابة سطر واحد بـ O_APPEND: العمال المتعددون لا يقطعون أسطر بعضهم
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    if os.fstat(fd).st_size > settings.PERF_LOG_MAX_BYTES:
+                        PerfLog._rotate(fd, path)
+                        os.close(fd)
+                        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    os.write(fd, line.encode('utf-8'))
+                finally:
+                    os.close(fd)
+            except OSError:
+                logger.exception("تعذرت كتابة سجل الأداء")
+
+    @staticmethod
+    def _rotate(fd, path):
+        """
+        تدوير تحت قفل flock على الملف نفسه (بين عمال gunicorn). عاملان رأيا الحجم الكبير معاً:
+        الثاني يجد بعد القفل أن ملفه لم يعد هو الحالي فلا يدوّر مرة أخرى (وإلا استبدل النسخة السابقة بملف شبه فارغ).
+        """
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                return
+            if os.path.samestat(os.fstat(fd), current):
+                os.replace(path, path + '.1')
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def read():
+        for path in PerfLog.paths():
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+class PerfMiddleware:
+    """
+    قياس كل طلب حسب صنف الـ View: عدد استعلامات SQL، زمن القاعدة، البصمات المكررة، والزمن الكلي.
+    - يضيف ترويسة Server-Timing (تظهر في تبويب Network بأدوات المطور).
+    - ميزانية الاستعلامات تُعلن على الـ View كـ query_budget = 8 (أو في PERF_QUERY_BUDGETS)،
+      وتجاوزها يُسجل كتحذير في logger 'trans_maint.perf'.
+    - كل طلب يُكتب في سجل دوّار على القرص لتلخيصه بـ manage.py perf_report.
+    ملاحظة: الـ Views غير المتزامنة تنفذ استعلاماتها في خيوط أخرى، لذلك يُقاس لها الزمن الكلي فقط.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.PERF_INSTRUMENTATION
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all(initialized_only=False):
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started, None)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        request.perf_view = view_class or view_func
+        return None
+
+    @staticmethod
+    def view_name(view):
+        return f"{view.__module__}.{view.__qualname__}"
+
+    @staticmethod
+    def query_budget(view):
+        budgets = settings.PERF_QUERY_BUDGETS
+        return budgets.get(view.__qualname__, budgets.get(PerfMiddleware.view_name(view), getattr(view, 'query_budget', None)))
+
+    def finish(self, request, response, wall, recorder):
+        view = getattr(request, 'perf_view', None)
+        if view is None:  # 404 قبل الوصول لأي View، أو ملفات ثابتة
+            return response
+        if getattr(request, 'profiled', False):
+            # cProfile يضاعف الزمن وحفظ الملف يضيف استعلامات: الطلب المُعرَّف لا يدخل الإحصاءات ولا الميزانيات
+            return response
+
+        timing = [f'app;dur={wall * 1000:.1f}']
+        record = {
+            'ts': round(time.time(), 3),
+            'view': self.view_name(view),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 2),
+        }
+
+        # ذاكرة المسارات المقاسة بـ MemoryService.track (التقارير وسجل الوقود)
+        memory = getattr(request, 'perf_memory', None)
+        if memory:
+            record.update(memory)
+            if 'py_peak_kb' in memory:
+                timing.append(f'mem;desc="python peak {memory["py_peak_kb"] / 1024:.1f} MB"')
+
+        if recorder is not None:
+            duplicates = recorder.duplicates()
+            timing.append(f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"')
+            record.update({
+                'queries': recorder.count,
+                'db_ms': round(recorder.duration * 1000, 2),
+                'duplicates': [{'fingerprint': f, 'count': c, 'sql': sql} for f, c, sql in duplicates[:5]],
+            })
+
+            budget = self.query_budget(view)
+            if budget is not None and recorder.count > budget:
+                record['over_budget'] = budget
+                logger.warning(
+                    "%s تجاوز ميزانية الاستعلامات: %s استعلام (الميزانية %s) - %s",
+                    record['view'], recorder.count, budget, request.path,
+                )
+                if duplicates:
+                    logger.warning("أكثر استعلام مكرر (%s مرة): %s", duplicates[0][1], duplicates[0][2])
+
+        response['Server-Timing'] = ', '.join(timing)
+        PerfLog.write(record)
+        return response
+
+
+class RequestCacheMiddleware:
+    """نطاق RequestCache لكل طلب: نتائج get_* والأرصدة تُشارك داخل الطلب وتُمسح بنهايته"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with RequestCache.scope():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with RequestCache.scope():
+            return await self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """
+    تعريف أداء الطلب عند الطلب (ProfilerService): ?_profile=1 أو ترويسة X-Profile: 1 من موظف is_staff.
+    يوضع بعد AuthenticationMiddleware (يحتاج request.user)، والطلبات بدون العلامة تمر بلا أي تكلفة.
+    الرد يحمل X-Profile-Id لفتح الملف في لوحة الإدارة. الـ Views غير المتزامنة لا تُعرّف (تنفذ في خيوط أخرى).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not ProfilerService.is_requested(request):
+            return self.get_response(request)
+
+        request.profiled = True
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        started, cpu_started = time.perf_counter(), time.process_time()
+        with ExitStack() as stack:
+            for connection in connections.all(initialized_only=False):
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        wall, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+
+        view = getattr(request, 'perf_view', None)
+        if view is not None:
+            try:
+                profile = ProfilerService.save(request, response, PerfMiddleware.view_name(view), profiler, recorder, wall, cpu)
+            except OSError:
+                logger.exception("تعذر حفظ ملف تعريف الأداء")
+            else:
+                response['X-Profile-Id'] = str(profile.id)
+        return response
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # نفس تسمية PerfMiddleware (قد يكون معطلاً أو غير مركب)
+        request.perf_view = getattr(view_func, 'view_class', None) or view_func
+        return None
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0004_maintenancerequest_date_completed_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(max_length=50, verbose_name='نوع التقرير')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='معايير التقرير')),
+                ('params_hash', models.CharField(max_length=64, verbose_name='بصمة المعايير')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')], db_index=True, default='queued', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='نسبة الإنجاز')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='عدد الصفوف')),
+                ('result_file', models.CharField(blank=True, default='', max_length=255, verbose_name='ملف النتيجة')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الطلب')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['params_hash', 'status', '-created_at'], name='reportjob_reuse_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0005_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactDirtyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FleetDailyFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, verbose_name='اليوم')),
+                ('vehicle_type', models.CharField(blank=True, default='', max_length=20)),
+                ('area', models.CharField(blank=True, default='', max_length=255)),
+                ('trip_type', models.CharField(blank=True, default='', max_length=100)),
+                ('liters_issued', models.FloatField(default=0.0)),
+                ('liters_added', models.FloatField(default=0.0)),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('trip_hours', models.FloatField(default=0.0)),
+                ('accident_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trans_maint.employee')),
+                ('rank', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trans_maint.militaryrank')),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='trans_maint.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rank', 'date'], name='fact_rank_date_idx'), models.Index(fields=['vehicle', 'date'], name='fact_vehicle_date_idx'), models.Index(fields=['employee', 'date'], name='fact_employee_date_idx')],
+            },
+        ),
+    ]
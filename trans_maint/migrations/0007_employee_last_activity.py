@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:26
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_last_activity(apps, schema_editor):
+    """تعبئة آخر صرف/إضافة للموظفين الحاليين من سجل الحركات"""
+    Employee = apps.get_model('trans_maint', 'Employee')
+    FuelTransaction = apps.get_model('trans_maint', 'FuelTransaction')
+
+    def latest(transaction_type):
+        return Subquery(
+            FuelTransaction.objects.filter(employee_id=OuterRef('pk'), transaction_type=transaction_type)
+            .order_by().values('employee_id').annotate(last=Max('date')).values('last')
+        )
+
+    Employee.objects.update(last_issue_at=latest('issue'), last_addition_at=latest('addition'))
+
+    # update() لا يطلق signals: نتائج محفوظة تقرأ جدول الموظفين تُبطل يدوياً (بعد الـ commit)
+    from trans_maint.services.data_version_service import DataVersionService
+    DataVersionService.bump(Employee._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0006_fleetdailyfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='last_addition_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='آخر إضافة'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='last_issue_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='آخر صرف'),
+        ),
+        migrations.RunPython(backfill_last_activity, migrations.RunPython.noop),
+    ]
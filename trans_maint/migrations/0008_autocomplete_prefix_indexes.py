@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0007_employee_last_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='employee',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='الاسم'),
+        ),
+        migrations.AlterField(
+            model_name='workshop',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='اسم الورشة'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0008_autocomplete_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fueltransaction',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='مفتاح عدم التكرار'),
+        ),
+    ]
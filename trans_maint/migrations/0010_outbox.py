@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:54
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0009_fuel_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxConsumer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='النظام المستهلك')),
+                ('acked_through', models.BigIntegerField(default=0, verbose_name='آخر حدث مؤكد')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_type', models.CharField(max_length=50, verbose_name='نوع الحدث')),
+                ('object_id', models.BigIntegerField(verbose_name='معرف السجل')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت الحدث')),
+            ],
+        ),
+    ]
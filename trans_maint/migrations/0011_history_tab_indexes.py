@@ -0,0 +1,37 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0010_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accident',
+            index=models.Index(fields=['vehicle', '-date_occurred', '-id'], name='accident_vehicle_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fueltransaction',
+            index=models.Index(fields=['employee', '-date', '-id'], name='fuel_employee_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fueltransaction',
+            index=models.Index(fields=['vehicle', '-date', '-id'], name='fuel_vehicle_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='maintenancerequest',
+            index=models.Index(fields=['vehicle', '-date_reported', '-id'], name='maint_vehicle_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['employee', '-start_date', '-id'], name='trip_employee_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['vehicle', '-start_date', '-id'], name='trip_vehicle_start_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0011_history_tab_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(db_index=True, max_length=200, verbose_name='الـ View')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500, verbose_name='الرابط')),
+                ('query_string', models.TextField(blank=True)),
+                ('status_code', models.PositiveSmallIntegerField(verbose_name='الحالة')),
+                ('wall_ms', models.FloatField(verbose_name='الزمن الكلي (ms)')),
+                ('cpu_ms', models.FloatField(verbose_name='زمن المعالج (ms)')),
+                ('queries', models.PositiveIntegerField(default=0, verbose_name='الاستعلامات')),
+                ('db_ms', models.FloatField(default=0.0, verbose_name='زمن القاعدة (ms)')),
+                ('sql', models.JSONField(blank=True, default=list, verbose_name='أزمنة SQL')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='بطلب من')),
+                ('file_name', models.CharField(editable=False, max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='الوقت')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trans_maint', '0012_request_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factdirtyday',
+            name='marked_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
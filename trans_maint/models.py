@@ -1,4 +1,6 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 
 # 1️⃣ الرتب العسكرية
 class MilitaryRank(models.Model):
@@ -11,7 +13,7 @@ class MilitaryRank(models.Model):
 
 # 2️⃣ الموظف (العسكري)
 class Employee(models.Model):
-    name = models.CharField(max_length=255, verbose_name="الاسم")
+    name = models.CharField(max_length=255, db_index=True, verbose_name="الاسم")
     military_number = models.CharField(max_length=50, unique=True, verbose_name="الرقم العسكري")
     rank = models.ForeignKey(MilitaryRank, on_delete=models.PROTECT, related_name="employees", verbose_name="الرتبة")
     
@@ -21,6 +23,10 @@ class Employee(models.Model):
     
     is_active = models.BooleanField(default=True, verbose_name="نشط")
 
+    # آخر نشاط في سجل الوقود (نسخة مختصرة تُحدَّث مع كل حركة) لتقارير عدم النشاط بدون مسح السجل كاملاً
+    last_issue_at = models.DateTimeField(null=True, blank=True, db_index=True, editable=False, verbose_name="آخر صرف")
+    last_addition_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="آخر إضافة")
+
     def __str__(self):
         return f"{self.rank.name} / {self.name}"
 
@@ -42,7 +48,7 @@ class Vehicle(models.Model):
 
 # 4️⃣ الورشة
 class Workshop(models.Model):
-    name = models.CharField(max_length=255, verbose_name="اسم الورشة")
+    name = models.CharField(max_length=255, db_index=True, verbose_name="اسم الورشة")
     address = models.TextField(blank=True, null=True, verbose_name="العنوان")
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="الهاتف")
 
@@ -62,6 +68,13 @@ class Trip(models.Model):
     def __str__(self):
         return f"رحلة {self.vehicle.plate_number} - {self.area}"
 
+    class Meta:
+        # تبويبات السجل في صفحات التفاصيل: صفحة بالمفتاح لموظف/مركبة واحدة = قراءة نطاق من الفهرس
+        indexes = [
+            models.Index(fields=['employee', '-start_date', '-id'], name='trip_employee_start_idx'),
+            models.Index(fields=['vehicle', '-start_date', '-id'], name='trip_vehicle_start_idx'),
+        ]
+
 # 6️⃣ حركات الوقود (نظام المعاملات)
 class FuelTransaction(models.Model):
     TYPE_CHOICES = [('issue', 'صرف'), ('addition', 'إضافة')]
@@ -75,6 +88,14 @@ class FuelTransaction(models.Model):
     transaction_type = models.CharField(max_length=20, choices=TYPE_CHOICES, default='issue')
     date = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ العملية", db_index=True)
     notes = models.TextField(blank=True, null=True)
+    # مفتاح يولده جهاز المحطة لكل عملية: إعادة إرسال نفس العملية بعد انقطاع لا تُسجل مرتين (FuelSyncService)
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="مفتاح عدم التكرار")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', '-date', '-id'], name='fuel_employee_date_idx'),
+            models.Index(fields=['vehicle', '-date', '-id'], name='fuel_vehicle_date_idx'),
+        ]
 
 
 
@@ -89,6 +110,9 @@ class Accident(models.Model):
     damage_cost = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, verbose_name="تكلفة الإصلاح")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open' , db_index=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['vehicle', '-date_occurred', '-id'], name='accident_vehicle_date_idx')]
+
 # 8️⃣ طلب الصيانة
 class MaintenanceRequest(models.Model):
     STATUS_CHOICES = [('pending', 'قيد المعالجة'), ('completed', 'مكتمل')]
@@ -101,4 +125,114 @@ class MaintenanceRequest(models.Model):
     cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     date_reported = models.DateField(auto_now_add=True ,db_index=True, verbose_name="تاريخ الإبلاغ")
     date_completed = models.DateField(null=True, blank=True, verbose_name="تاريخ الإكمال")
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending' , db_index=True)
\ No newline at end of file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending' , db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['vehicle', '-date_reported', '-id'], name='maint_vehicle_date_idx')]
+
+# 9️⃣ مهام التقارير الخلفية (Background Report Jobs)
+class ReportJob(models.Model):
+    STATUS_CHOICES = [('queued', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('done', 'مكتمل'), ('failed', 'فشل')]
+
+    report_type = models.CharField(max_length=50, verbose_name="نوع التقرير")
+    params = models.JSONField(default=dict, blank=True, verbose_name="معايير التقرير")
+    # بصمة (نوع التقرير + المعايير الموحدة) لإعادة استخدام النتائج المتطابقة
+    params_hash = models.CharField(max_length=64, verbose_name="بصمة المعايير")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name="نسبة الإنجاز")
+    row_count = models.PositiveIntegerField(default=0, verbose_name="عدد الصفوف")
+    result_file = models.CharField(max_length=255, blank=True, default='', verbose_name="ملف النتيجة")
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الطلب")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['params_hash', 'status', '-created_at'], name='reportjob_reuse_idx')]
+
+    def __str__(self):
+        return f"{self.report_type} #{self.id} ({self.status})"
+
+
+# 🔟 جدول الحقائق اليومي (Star Schema) للتحليلات متعددة الأبعاد
+class FleetDailyFact(models.Model):
+    """
+    صف لكل (يوم × موظف × رتبة × مركبة × نوع ملكية × منطقة × نوع رحلة) مع المقاييس المجمعة.
+    يُبنى من جداول العمليات عبر manage.py refresh_fleet_facts ولا يُعدّل يدوياً.
+    """
+    date = models.DateField(db_index=True, verbose_name="اليوم")
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    rank = models.ForeignKey(MilitaryRank, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    vehicle_type = models.CharField(max_length=20, blank=True, default='')
+    area = models.CharField(max_length=255, blank=True, default='')
+    trip_type = models.CharField(max_length=100, blank=True, default='')
+
+    liters_issued = models.FloatField(default=0.0)
+    liters_added = models.FloatField(default=0.0)
+    trips = models.PositiveIntegerField(default=0)
+    trip_hours = models.FloatField(default=0.0)
+    accident_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    maintenance_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['rank', 'date'], name='fact_rank_date_idx'),
+            models.Index(fields=['vehicle', 'date'], name='fact_vehicle_date_idx'),
+            models.Index(fields=['employee', 'date'], name='fact_employee_date_idx'),
+        ]
+
+
+# الأيام التي تغيرت بياناتها منذ آخر تحديث لجدول الحقائق (تحديث تزايدي)
+class FactDirtyDay(models.Model):
+    date = models.DateField(unique=True)
+    # يتجدد مع كل تعليم: التحديث يحذف العلامة فقط إذا لم تتغير منذ بدأ (كتابة أثناء البناء تبقيها)
+    marked_at = models.DateTimeField(default=timezone.now)
+
+
+# 1️⃣1️⃣ صندوق الصادر (Transactional Outbox) للأنظمة الخارجية (المالية، الموارد البشرية)
+class OutboxEvent(models.Model):
+    """
+    حدث لكل تغيير حالة، يُكتب في نفس الـ transaction مع التغيير نفسه (OutboxService.append):
+    إما أن يُحفظ الاثنان أو لا شيء. الـ id التصاعدي هو مؤشر المزامنة (changes since cursor).
+    """
+    id = models.BigAutoField(primary_key=True)
+    event_type = models.CharField(max_length=50, verbose_name="نوع الحدث")
+    object_id = models.BigIntegerField(verbose_name="معرف السجل")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت الحدث")
+
+    def __str__(self):
+        return f"#{self.id} {self.event_type} ({self.object_id})"
+
+
+# مستهلكو صندوق الصادر وآخر مؤشر أكدوا معالجته (الضغط يحذف ما أكده الجميع فقط)
+class OutboxConsumer(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name="النظام المستهلك")
+    acked_through = models.BigIntegerField(default=0, verbose_name="آخر حدث مؤكد")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.acked_through}"
+
+
+# 1️⃣2️⃣ تعريف أداء طلب واحد عند الطلب (?_profile=1) - الملفات نفسها على القرص في PROFILE_DIR
+class RequestProfile(models.Model):
+    view = models.CharField(max_length=200, db_index=True, verbose_name="الـ View")
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500, verbose_name="الرابط")
+    query_string = models.TextField(blank=True)
+    status_code = models.PositiveSmallIntegerField(verbose_name="الحالة")
+    wall_ms = models.FloatField(verbose_name="الزمن الكلي (ms)")
+    cpu_ms = models.FloatField(verbose_name="زمن المعالج (ms)")
+    queries = models.PositiveIntegerField(default=0, verbose_name="الاستعلامات")
+    db_ms = models.FloatField(default=0.0, verbose_name="زمن القاعدة (ms)")
+    # أثقل الاستعلامات حسب البصمة: [{'fingerprint', 'count', 'ms', 'sql'}]
+    sql = models.JSONField(default=list, blank=True, verbose_name="أزمنة SQL")
+    username = models.CharField(max_length=150, blank=True, verbose_name="بطلب من")
+    # اسم الملف بدون امتداد: <file_name>.prof (pstats/snakeviz) و <file_name>.collapsed (flamegraph.pl/speedscope)
+    file_name = models.CharField(max_length=100, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="الوقت")
+
+    def __str__(self):
+        return f"{self.view} {self.wall_ms:.0f}ms"
@@ -0,0 +1,160 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator, Page, EmptyPage, PageNotAnInteger
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator لا ينفذ COUNT(*) كاملاً على القوائم الكبيرة:
+    - PostgreSQL: تقدير المخطط (EXPLAIN) لعدد الصفوف، ويُحسب العدد الدقيق فقط إذا كان التقدير صغيراً.
+    - باقي القواعد: عدّ محدود بسقف (SELECT COUNT(*) FROM (... LIMIT cap + 1))، ويُعرض كـ "10,000+".
+    exact=True يعيد السلوك الأصلي (عدد دقيق) عند الطلب.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, exact=False, cap=None, **kwargs):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page, **kwargs)
+        self.exact = exact
+        self.cap = cap or settings.PAGINATION_COUNT_CAP
+        self.is_estimated = False
+
+    @cached_property
+    def count(self):
+        if self.exact or not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        if connections[self.object_list.db].vendor == 'postgresql':
+            estimate = self._planner_estimate()
+            if estimate is not None and estimate > self.cap:
+                self.is_estimated = True
+                return estimate
+
+        capped = self.object_list.order_by()[:self.cap + 1].count()
+        if capped > self.cap:
+            self.is_estimated = True
+            return self.cap
+        return capped
+
+    def _planner_estimate(self):
+        try:
+            plan = json.loads(self.object_list.order_by().explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+        except (ValueError, KeyError, IndexError, TypeError):
+            return None
+
+    @property
+    def count_display(self):
+        """العدد كما يُعرض للمستخدم: دقيق، أو "10,000+"، أو "~ 1,234,567" (تقدير)"""
+        if not self.is_estimated:
+            return f"{self.count:,}"
+        if self.count == self.cap:
+            return f"{self.cap:,}+"
+        return f"~ {self.count:,}"
+
+    def validate_number(self, number):
+        """مع العدد التقديري لا نعرف آخر صفحة بدقة، فنسمح بالتنقل بعدها حتى تنتهي الصفوف فعلياً"""
+        if not self.count or not self.is_estimated:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.is_estimated:
+            return super().page(number)
+        # بدون قص آخر صفحة على العدد التقديري (Paginator الأصلي يقص top إلى count)
+        bottom = (number - 1) * self.per_page
+        page = self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+        if number > 1 and not page.object_list:
+            raise EmptyPage(self.error_messages['no_results'])
+        return page
+
+    def get_page(self, number):
+        try:
+            return super().get_page(number)
+        except EmptyPage:
+            # صفحة بعد آخر الصفوف الفعلية (آخر صفحة غير معروفة مع العدد التقديري)
+            return self.page(1)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        if self.paginator.is_estimated:
+            # صفحة ممتلئة تعني غالباً وجود صفوف بعدها (قد تكون الصفحة التالية فارغة في حالة نادرة)
+            return len(self.object_list) == self.paginator.per_page
+        return super().has_next()
+
+    def end_index(self):
+        if self.paginator.is_estimated:
+            return self.start_index() + len(self.object_list) - 1
+        return super().end_index()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class CursorPaginator:
+    """
+    ترقيم بالمفتاح (keyset) لصفوف values() أو كائنات الموديل: الصفحة التالية = WHERE (date, id) < (آخر صف) بدلاً من OFFSET،
+    فتكلفة أي صفحة ثابتة مهما تقدمنا، ولا تتكرر/تُفقد صفوف إذا أُضيفت سجلات أثناء التصفح.
+    ordering: حقول الترتيب (بـ - للتنازلي)، آخرها فريد (id)، ويجب أن تكون موجودة في الصفوف.
+    المؤشر (cursor) قيم الترتيب لآخر صف كـ JSON بترميز base64 للروابط؛ التواريخ بـ str() وليس
+    DjangoJSONEncoder لأنه يقص الوقت إلى الملي ثانية فتتكرر/تُفقد صفوف عند حدود الصفحة.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+
+    @staticmethod
+    def _name(field):
+        return field.lstrip('-')
+
+    def encode(self, row):
+        if isinstance(row, dict):
+            values = [row[self._name(field)] for field in self.ordering]
+        else:
+            values = [getattr(row, self._name(field)) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except (binascii.Error, ValueError) as e:
+            raise InvalidCursor("مؤشر الصفحة (cursor) غير صالح") from e
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor("مؤشر الصفحة (cursor) غير صالح")
+        return values
+
+    def _after(self, values):
+        # (a, b) > (x, y)  =  a > x  OR  (a = x AND b > y)  - بالاتجاه المناسب لكل حقل
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {self._name(previous): values[j] for j, previous in enumerate(self.ordering[:i])}
+            condition |= Q(**equal, **{f'{self._name(field)}__{lookup}': values[i]})
+        return condition
+
+    def page(self, cursor=None):
+        """(الصفوف، مؤشر الصفحة التالية أو None) - صف زائد واحد لمعرفة وجود صفحة تالية بدون COUNT"""
+        queryset = self.queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode(cursor)))
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = self.encode(rows[self.per_page - 1]) if len(rows) > self.per_page else None
+        return rows[:self.per_page], next_cursor
@@ -2,9 +2,24 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Sum
 from django.db import transaction
 from ..models import Accident, Vehicle
+from .metrics_service import instrumented
+from .outbox_service import OutboxService
+from .request_cache import request_memoized
 
+@instrumented
 class AccidentService:
 
+    @staticmethod
+    def outbox_payload(accident):
+        """بيانات الحادث وتكلفته كما تراها الأنظمة الخارجية (صندوق الصادر)"""
+        return {
+            'vehicle_id': accident.vehicle_id,
+            'trip_id': accident.trip_id,
+            'date_occurred': accident.date_occurred,
+            'damage_cost': accident.damage_cost,
+            'status': accident.status,
+        }
+
     # --- أولاً: دورة حياة الحادث (Lifecycle) ---
 
     @staticmethod
@@ -17,12 +32,12 @@ class AccidentService:
         with transaction.atomic():
             # 1. إنشاء سجل الحادث
             accident = Accident.objects.create(**data)
+            OutboxService.append('accident.reported', accident.id, AccidentService.outbox_payload(accident))
             
             # 2. تغيير حالة المركبة إلى (غير نشطة) لضمان السلامة
             # سيؤدي هذا لجعل دالة check_vehicle_availability تعيد False تلقائياً
             vehicle.status = 'under_repair'
             vehicle.save()
-            
             return accident
 
     @staticmethod
@@ -34,10 +49,13 @@ class AccidentService:
         accident.status = 'closed'
         if final_cost is not None:
             accident.damage_cost = final_cost
-        accident.save()
+        with transaction.atomic(savepoint=False):
+            accident.save()
+            OutboxService.append('accident.closed', accident.id, AccidentService.outbox_payload(accident))
         return accident
 
     @staticmethod
+    @request_memoized(Accident, Vehicle)
     def get_accident(accident_id):
         return get_object_or_404(Accident.objects.select_related('vehicle'), id=accident_id)
 
@@ -63,7 +81,7 @@ class AccidentService:
 
     @staticmethod
     def list_accidents(filters=None):
-        queryset = Accident.objects.select_related('vehicle').all()
+        queryset = Accident.objects.select_related('vehicle', 'trip__employee').all()
         if filters:
             queryset = queryset.filter(**filters)
         return queryset
\ No newline at end of file
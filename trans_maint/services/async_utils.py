@@ -0,0 +1,41 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import QuerySet
+
+
+def materialize(result):
+    """تقييم الـ QuerySets داخل خيط قاعدة البيانات حتى لا يلمس القالب القاعدة لاحقاً"""
+    if isinstance(result, QuerySet):
+        return list(result)
+    if isinstance(result, dict):
+        return {key: materialize(value) for key, value in result.items()}
+    return result
+
+
+def _run_in_db_thread(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return materialize(func(*args, **kwargs))
+    finally:
+        close_old_connections()
+
+
+async def run_db_call(func, *args, **kwargs):
+    """
+    تشغيل دالة خدمة متزامنة (sync) في خيط مستقل له اتصاله الخاص بالقاعدة.
+    thread_sensitive=False هو ما يسمح بتنفيذ عدة استعلامات في نفس الوقت فعلياً
+    (دوال الـ ORM غير المتزامنة في Django تمر كلها عبر خيط واحد).
+    """
+    return await sync_to_async(_run_in_db_thread, thread_sensitive=False)(func, *args, **kwargs)
+
+
+async def gather_widgets(**widgets):
+    """
+    تنفيذ الودجات المستقلة بالتوازي وإرجاعها كقاموس بنفس الأسماء:
+    await gather_widgets(stats=DashboardService.aget_general_stats(), ...)
+    """
+    names = list(widgets)
+    results = await asyncio.gather(*(widgets[name] for name in names))
+    return dict(zip(names, results))
@@ -1,7 +1,12 @@
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from ..models import Employee, Vehicle, Trip, Accident, MaintenanceRequest, FuelTransaction
+from ..db_router import reads_from_replica
+from .async_utils import run_db_call
+from .metrics_service import instrumented
 
+@instrumented
+@reads_from_replica
 class DashboardService:
 
     # --- أولاً: المؤشرات التشغيلية (Real-time Operations) ---
@@ -173,4 +178,34 @@ class DashboardService:
     def get_last_sync_time():
         """4️⃣ وقت آخر تحديث: لإعطاء طابع لحظي للنظام"""
         # يمكن ببساطة إرجاع الوقت الحالي، أو وقت آخر عملية تسجيل (Trip/Fuel)
-        return timezone.now()
\ No newline at end of file
+        return timezone.now()
+
+    # --- خامساً: النسخ غير المتزامنة (Async Variants) للعرض المتوازي ---
+
+    @staticmethod
+    async def aget_general_stats():
+        return await run_db_call(DashboardService.get_general_stats)
+
+    @staticmethod
+    async def aget_fuel_analytics():
+        return await run_db_call(DashboardService.get_fuel_analytics)
+
+    @staticmethod
+    async def aget_financial_metrics():
+        return await run_db_call(DashboardService.get_financial_metrics)
+
+    @staticmethod
+    async def aget_low_balance_employees(threshold=10.0):
+        return await run_db_call(DashboardService.get_low_balance_employees, threshold=threshold)
+
+    @staticmethod
+    async def aget_pending_maintenance_count():
+        return await run_db_call(DashboardService.get_pending_maintenance_count)
+
+    @staticmethod
+    async def aget_open_accidents_count():
+        return await run_db_call(DashboardService.get_open_accidents_count)
+
+    @staticmethod
+    async def aget_active_trips_count():
+        return await run_db_call(DashboardService.get_active_trips_count)
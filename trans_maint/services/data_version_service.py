@@ -0,0 +1,123 @@
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows (بيئة التطوير): القفل على مستوى العملية فقط
+    fcntl = None
+
+
+class DataVersionService:
+    """
+    عدّاد إصدار لكل جدول، يزيد بعد كل عملية كتابة ناجحة على ذلك الجدول.
+    أي نتيجة محفوظة (Cache) تُوسم بإصدارات الجداول التي قرأتها، وتُرفض إذا تغير أحدها.
+
+    العدادات محفوظة في ملف مشترك مربوط بالذاكرة (mmap)، لذلك:
+    - القراءة لا تلمس قاعدة البيانات (بضع ميكروثوانٍ).
+    - كل عمال gunicorn على نفس الخادم يرون نفس العدادات.
+    يبدأ الملف بـ "حقبة" (epoch) عشوائية حتى لا تتطابق الإصدارات إذا أُعيد إنشاء الملف.
+    """
+
+    # ترتيب ثابت: موضع كل جدول في الملف (لا تغيّر الترتيب، أضف في النهاية فقط)
+    TABLES = (
+        'trans_maint_militaryrank',
+        'trans_maint_employee',
+        'trans_maint_vehicle',
+        'trans_maint_workshop',
+        'trans_maint_trip',
+        'trans_maint_fueltransaction',
+        'trans_maint_accident',
+        'trans_maint_maintenancerequest',
+        'trans_maint_fleetdailyfact',
+    )
+    SLOT = struct.Struct('<Q')
+    FILE_SIZE = SLOT.size * 64
+
+    _lock = threading.Lock()
+    _path = None  # مسار الملف المفتوح: يتغير مع override_settings في الاختبارات فيُعاد الفتح
+    _map = None
+    _fd = None
+
+    # --- أولاً: الملف المشترك (Shared Memory File) ---
+
+    @staticmethod
+    def _get_map():
+        path = settings.DATA_VERSION_FILE
+        if DataVersionService._path != path:
+            with DataVersionService._lock:
+                if DataVersionService._path != path:
+                    DataVersionService._open_map(path)
+        return DataVersionService._map
+
+    @staticmethod
+    def _open_map(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        DataVersionService._flock(fd, True)
+        try:
+            if os.fstat(fd).st_size < DataVersionService.FILE_SIZE:
+                # ملف جديد: حقبة عشوائية في الخانة 0 ثم أصفار للعدادات
+                epoch = struct.unpack('<Q', os.urandom(8))[0]
+                os.ftruncate(fd, DataVersionService.FILE_SIZE)
+                os.pwrite(fd, DataVersionService.SLOT.pack(epoch), 0)
+        finally:
+            DataVersionService._flock(fd, False)
+        if DataVersionService._fd is not None:
+            os.close(DataVersionService._fd)
+        DataVersionService._fd = fd
+        DataVersionService._map = mmap.mmap(fd, DataVersionService.FILE_SIZE)
+        DataVersionService._path = path
+
+    @staticmethod
+    def _flock(fd, acquire):
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if acquire else fcntl.LOCK_UN)
+
+    @staticmethod
+    def _slot_offset(table):
+        return DataVersionService.SLOT.size * (DataVersionService.TABLES.index(table) + 1)
+
+    @staticmethod
+    def _table_name(model_or_table):
+        return model_or_table if isinstance(model_or_table, str) else model_or_table._meta.db_table
+
+    # --- ثانياً: القراءة والزيادة (Read & Bump) ---
+
+    @staticmethod
+    def get_versions(*models):
+        """إرجاع (الحقبة، إصدار كل جدول) كـ tuple قابل للمقارنة والاستخدام كجزء من مفتاح"""
+        data = DataVersionService._get_map()
+        unpack = DataVersionService.SLOT.unpack_from
+        return (unpack(data, 0)[0],) + tuple(
+            unpack(data, DataVersionService._slot_offset(DataVersionService._table_name(m)))[0] for m in models
+        )
+
+    @staticmethod
+    def is_tracked(model_or_table):
+        return DataVersionService._table_name(model_or_table) in DataVersionService.TABLES
+
+    @staticmethod
+    def bump_now(*models):
+        data = DataVersionService._get_map()
+        with DataVersionService._lock:
+            DataVersionService._flock(DataVersionService._fd, True)
+            try:
+                for model in models:
+                    offset = DataVersionService._slot_offset(DataVersionService._table_name(model))
+                    current = DataVersionService.SLOT.unpack_from(data, offset)[0]
+                    DataVersionService.SLOT.pack_into(data, offset, current + 1)
+            finally:
+                DataVersionService._flock(DataVersionService._fd, False)
+
+    @staticmethod
+    def bump(*models):
+        """
+        الزيادة تتم بعد نجاح الـ commit فقط: لو زدنا قبله، قد يقرأ طلب آخر الإصدار الجديد
+        مع البيانات القديمة ويحفظها في الكاش تحت الإصدار الجديد (نتيجة قديمة لا تُكتشف).
+        """
+        transaction.on_commit(lambda: DataVersionService.bump_now(*models))
@@ -1,8 +1,12 @@
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, F, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from ..models import Employee, FuelTransaction, MilitaryRank
+from ..models import Employee, FuelTransaction, MilitaryRank, Trip
+from .metrics_service import instrumented
+from .request_cache import request_memoized
 
+@instrumented
 class EmployeeService:
 
     # --- أولاً: العمليات الأساسية (CRUD) ---
@@ -31,6 +35,7 @@ class EmployeeService:
         return employee
 
     @staticmethod
+    @request_memoized(Employee, MilitaryRank)
     def get_employee(employee_id):
         """جلب موظف معين مع رتبته"""
         return get_object_or_404(Employee.objects.select_related('rank'), id=employee_id)
@@ -43,6 +48,20 @@ class EmployeeService:
             queryset = queryset.filter(**filters)
         return queryset
 
+    @staticmethod
+    def search_employees(term='', active_only=True):
+        """
+        بحث الإكمال التلقائي: بداية الاسم أو الرقم العسكري.
+        startswith (وليس icontains) حتى يستخدم الفهرس؛ على PostgreSQL ينشئ Django فهرس _like (varchar_pattern_ops)
+        لكل حقل نصي مفهرس، فيكون البحث بالبادئة مسحاً لجزء من الفهرس بدلاً من الجدول كله.
+        """
+        queryset = Employee.objects.all()
+        if active_only:
+            queryset = queryset.filter(is_active=True)
+        if term:
+            queryset = queryset.filter(Q(name__startswith=term) | Q(military_number__startswith=term))
+        return queryset.order_by('name', 'id').values('id', 'name', 'military_number', 'rank__name')
+
     # --- ثانياً: منطق الحصص (Quota Logic) ---
 
     @staticmethod
@@ -61,9 +80,36 @@ class EmployeeService:
             return employee.monthly_quota_override
         return employee.rank.default_monthly_quota
 
+    @staticmethod
+    def list_employees_with_quota_usage(filters=None):
+        """
+        نفس list_employees مع إجمالي الإضافات والصرف والحصة الشهرية الفعلية محسوبة في استعلام واحد،
+        بدلاً من استدعاء دوال الرصيد والحصة لكل موظف (N+1).
+        """
+        def ledger_total(transaction_type):
+            return Coalesce(Subquery(
+                FuelTransaction.objects.filter(employee_id=OuterRef('pk'), transaction_type=transaction_type)
+                .order_by().values('employee_id').annotate(total=Sum('quantity')).values('total'),
+                output_field=FloatField(),
+            ), Value(0.0))
+
+        return EmployeeService.list_employees(filters).annotate(
+            total_added=ledger_total('addition'),
+            total_issued=ledger_total('issue'),
+            effective_monthly_quota=Coalesce(F('monthly_quota_override'), F('rank__default_monthly_quota')),
+        )
+
+    @staticmethod
+    def list_employee_balances(filters=None):
+        """الرصيد الحالي لكل موظف (الإضافات - الصرف) محسوباً في نفس الاستعلام"""
+        return EmployeeService.list_employees_with_quota_usage(filters).annotate(
+            balance=F('total_added') - F('total_issued'),
+        )
+
     # --- ثالثاً: الدوال التحليلية (Analytics) ---
 
     @staticmethod
+    @request_memoized(FuelTransaction)
     def get_employee_total_additions(employee_id, start_date=None, end_date=None):
         """حساب إجمالي الحصص المضافة للموظف (Periodic + Trip Support)"""
         filters = Q(employee_id=employee_id, transaction_type='addition')
@@ -74,6 +120,7 @@ class EmployeeService:
         return result['total'] or 0.0
 
     @staticmethod
+    @request_memoized(FuelTransaction)
     def get_employee_total_consumption(employee_id, start_date=None, end_date=None):
         """حساب إجمالي ما استهلكه (صرفه) الموظف فعلياً"""
         filters = Q(employee_id=employee_id, transaction_type='issue')
@@ -83,6 +130,12 @@ class EmployeeService:
         result = FuelTransaction.objects.filter(filters).aggregate(total=Sum('quantity'))
         return result['total'] or 0.0
 
+    @staticmethod
+    @request_memoized(Trip)
+    def get_employee_trip_count(employee_id):
+        """عدد رحلات الموظف (بدلاً من جلب السجل كاملاً لعدّه)"""
+        return Trip.objects.filter(employee_id=employee_id).count()
+
     @staticmethod
     def get_employee_current_balance(employee_id):
         """كشف حساب لحظي: (الإضافات - المصروفات)"""
@@ -0,0 +1,248 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, Count, Q, F, Min, DurationField, ExpressionWrapper
+from django.db.models.functions import Trunc, ExtractIsoWeekDay
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from ..models import (
+    FleetDailyFact, FactDirtyDay, Trip, FuelTransaction, Accident, MaintenanceRequest
+)
+from ..db_router import reads_from_replica
+from .data_version_service import DataVersionService
+from .metrics_service import instrumented
+from .report_cache import cached_report
+
+
+@instrumented
+class FleetAnalyticsService:
+    """
+    طبقة التحليلات (Star Schema): جدول حقائق يومي + خدمة Pivot عامة فوقه.
+    بدلاً من كتابة تقرير جديد يمسح الجداول كاملة لكل سؤال، يُجاب أي تقاطع
+    (أبعاد × مقاييس × فلاتر × دقة زمنية) بتجميع صفوف الحقائق المختصرة.
+    """
+
+    # البعد -> الحقل المعروض في النتيجة
+    DIMENSIONS = {
+        'employee': 'employee__name',
+        'rank': 'rank__name',
+        'vehicle': 'vehicle__plate_number',
+        'vehicle_type': 'vehicle_type',
+        'area': 'area',
+        'trip_type': 'trip_type',
+        'weekday': None,  # يُحسب من التاريخ (1 = الاثنين ... 7 = الأحد)
+    }
+    MEASURES = ('liters_issued', 'liters_added', 'trips', 'trip_hours', 'accident_cost', 'maintenance_cost')
+    GRAINS = ('day', 'week', 'month', 'quarter', 'year')
+    # فلاتر المساواة المسموحة (بالمعرّف للأبعاد المرتبطة بجداول)
+    FILTERS = {
+        'employee': 'employee_id',
+        'rank': 'rank_id',
+        'vehicle': 'vehicle_id',
+        'vehicle_type': 'vehicle_type',
+        'area': 'area',
+        'trip_type': 'trip_type',
+    }
+    MAX_ROWS = 5000
+
+    # --- أولاً: تتبع الأيام المتغيرة (Change Tracking) ---
+
+    @staticmethod
+    def mark_dirty(*dates):
+        """تسجيل الأيام التي تحتاج إعادة بناء (INSERT واحد؛ اليوم المعلَّم مسبقاً يتجدد وقت تعليمه)"""
+        days = {d.date() if isinstance(d, datetime.datetime) else d for d in dates if d}
+        if days:
+            now = timezone.now()
+            FactDirtyDay.objects.bulk_create(
+                [FactDirtyDay(date=d, marked_at=now) for d in days],
+                update_conflicts=True, unique_fields=['date'], update_fields=['marked_at'],
+            )
+
+    @staticmethod
+    def local_date(value):
+        if isinstance(value, datetime.datetime):
+            return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+        return value
+
+    # --- ثانياً: التحديث التزايدي (Incremental Refresh) ---
+
+    @staticmethod
+    def refresh(full=False):
+        """
+        إعادة بناء الأيام المتغيرة فقط (أو كل التاريخ مع full=True). يعيد عدد الأيام المعاد بناؤها.
+        علامة اليوم تُحذف مع بنائه في نفس الـ transaction، وفقط إذا لم يُعَد تعليمه منذ بدء التحديث:
+        فشل البناء أو توقف العملية يترك الأيام الباقية معلَّمة، وأي كتابة أثناء البناء تُبقي اليوم للمرة القادمة.
+        """
+        marks = dict(FactDirtyDay.objects.values_list('date', 'marked_at'))
+        days = sorted(set(FleetAnalyticsService._all_source_days()) | set(marks)) if full else sorted(marks)
+
+        rebuilt = 0
+        try:
+            for day in days:
+                with transaction.atomic():
+                    FleetAnalyticsService.rebuild_day(day)
+                    if day in marks:
+                        FactDirtyDay.objects.filter(date=day, marked_at=marks[day]).delete()
+                rebuilt += 1
+        finally:
+            if rebuilt:
+                DataVersionService.bump(FleetDailyFact)
+        return rebuilt
+
+    @staticmethod
+    def _all_source_days():
+        first_dates = [
+            FuelTransaction.objects.aggregate(d=Min('date'))['d'],
+            Trip.objects.aggregate(d=Min('start_date'))['d'],
+            Accident.objects.aggregate(d=Min('date_occurred'))['d'],
+            MaintenanceRequest.objects.aggregate(d=Min('date_completed'))['d'],
+        ]
+        first_dates = [FleetAnalyticsService.local_date(d) for d in first_dates if d]
+        if not first_dates:
+            return []
+        day, today = min(first_dates), timezone.localdate()
+        days = []
+        while day <= today:
+            days.append(day)
+            day += datetime.timedelta(days=1)
+        return days
+
+    @staticmethod
+    def _day_bounds(day):
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        return start, start + datetime.timedelta(days=1)
+
+    @staticmethod
+    def rebuild_day(day):
+        start, end = FleetAnalyticsService._day_bounds(day)
+        facts = defaultdict(lambda: {
+            'liters_issued': 0.0, 'liters_added': 0.0, 'trips': 0, 'trip_hours': 0.0,
+            'accident_cost': Decimal('0'), 'maintenance_cost': Decimal('0'),
+        })
+
+        # 1. حركات الوقود (المنطقة ونوع الرحلة من الرحلة المرتبطة إن وجدت)
+        fuel_rows = FuelTransaction.objects.filter(date__gte=start, date__lt=end).values(
+            'employee_id', 'employee__rank_id', 'vehicle_id', 'vehicle__vehicle_type', 'trip__area', 'trip__trip_type'
+        ).annotate(
+            issued=Sum('quantity', filter=Q(transaction_type='issue')),
+            added=Sum('quantity', filter=Q(transaction_type='addition')),
+        ).order_by()
+        for r in fuel_rows:
+            key = (r['employee_id'], r['employee__rank_id'], r['vehicle_id'],
+                   r['vehicle__vehicle_type'], r['trip__area'], r['trip__trip_type'])
+            facts[key]['liters_issued'] += r['issued'] or 0.0
+            facts[key]['liters_added'] += r['added'] or 0.0
+
+        # 2. الرحلات (تُنسب ليوم البدء، والساعات للرحلات المنتهية فقط)
+        trip_rows = Trip.objects.filter(start_date__gte=start, start_date__lt=end).values(
+            'employee_id', 'employee__rank_id', 'vehicle_id', 'vehicle__vehicle_type', 'area', 'trip_type'
+        ).annotate(
+            count=Count('id'),
+            duration=Sum(
+                ExpressionWrapper(F('end_date') - F('start_date'), output_field=DurationField()),
+                filter=Q(end_date__isnull=False),
+            ),
+        ).order_by()
+        for r in trip_rows:
+            key = (r['employee_id'], r['employee__rank_id'], r['vehicle_id'],
+                   r['vehicle__vehicle_type'], r['area'], r['trip_type'])
+            facts[key]['trips'] += r['count']
+            if r['duration']:
+                facts[key]['trip_hours'] += r['duration'].total_seconds() / 3600
+
+        # 3. الحوادث (الموظف والمنطقة من الرحلة المرتبطة إن وجدت)
+        accident_rows = Accident.objects.filter(date_occurred__gte=start, date_occurred__lt=end).values(
+            'trip__employee_id', 'trip__employee__rank_id', 'vehicle_id', 'vehicle__vehicle_type', 'trip__area', 'trip__trip_type'
+        ).annotate(cost=Sum('damage_cost')).order_by()
+        for r in accident_rows:
+            key = (r['trip__employee_id'], r['trip__employee__rank_id'], r['vehicle_id'],
+                   r['vehicle__vehicle_type'], r['trip__area'], r['trip__trip_type'])
+            facts[key]['accident_cost'] += r['cost'] or 0
+
+        # 4. الصيانة المكتملة (تُنسب ليوم الإكمال مثل باقي تقارير التكلفة)
+        maintenance_rows = MaintenanceRequest.objects.filter(status='completed', date_completed=day).values(
+            'vehicle_id', 'vehicle__vehicle_type'
+        ).annotate(cost=Sum('cost')).order_by()
+        for r in maintenance_rows:
+            key = (None, None, r['vehicle_id'], r['vehicle__vehicle_type'], None, None)
+            facts[key]['maintenance_cost'] += r['cost'] or 0
+
+        with transaction.atomic():
+            FleetDailyFact.objects.filter(date=day).delete()
+            FleetDailyFact.objects.bulk_create([
+                FleetDailyFact(
+                    date=day, employee_id=employee_id, rank_id=rank_id, vehicle_id=vehicle_id,
+                    vehicle_type=vehicle_type or '', area=area or '', trip_type=trip_type or '',
+                    **measures
+                )
+                for (employee_id, rank_id, vehicle_id, vehicle_type, area, trip_type), measures in facts.items()
+            ], batch_size=1000)
+        return len(facts)
+
+    # --- ثالثاً: الاستعلام متعدد الأبعاد (Pivot) ---
+
+    @staticmethod
+    @reads_from_replica
+    @cached_report(FleetDailyFact)
+    def pivot(dimensions=(), measures=(), filters=None, grain=None, date_from=None, date_to=None):
+        """
+        مثال: pivot(['rank'], ['liters_issued'], grain='month')
+        يعيد قائمة صفوف: {'period': ..., 'rank': ..., 'liters_issued': ...}
+        """
+        dimensions, measures = list(dimensions), list(measures or FleetAnalyticsService.MEASURES)
+        unknown = [d for d in dimensions if d not in FleetAnalyticsService.DIMENSIONS]
+        unknown += [m for m in measures if m not in FleetAnalyticsService.MEASURES]
+        unknown += [f for f in (filters or {}) if f not in FleetAnalyticsService.FILTERS]
+        if grain and grain not in FleetAnalyticsService.GRAINS:
+            unknown.append(grain)
+        if unknown:
+            raise ValueError(f"معايير غير معروفة: {', '.join(unknown)}")
+
+        date_from = FleetAnalyticsService._parse_day(date_from, 'date_from')
+        date_to = FleetAnalyticsService._parse_day(date_to, 'date_to')
+
+        queryset = FleetDailyFact.objects.all()
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        for name, value in (filters or {}).items():
+            queryset = queryset.filter(**{FleetAnalyticsService.FILTERS[name]: value})
+
+        # أسماء الأبعاد والمقاييس تطابق أسماء حقول في الجدول، لذا نجمع بأسماء داخلية ثم نعيد التسمية
+        if grain:
+            queryset = queryset.annotate(period=Trunc('date', grain))
+        if 'weekday' in dimensions:
+            queryset = queryset.annotate(weekday=ExtractIsoWeekDay('date'))
+        columns = (['period'] if grain else []) + [
+            'weekday' if d == 'weekday' else FleetAnalyticsService.DIMENSIONS[d] for d in dimensions
+        ]
+        names = (['period'] if grain else []) + dimensions
+
+        rows = queryset.values(*columns).annotate(
+            **{f"total_{measure}": Sum(measure) for measure in measures}
+        ).order_by(*columns)[:FleetAnalyticsService.MAX_ROWS]
+
+        return [
+            dict(
+                [(name, row[column]) for name, column in zip(names, columns)]
+                + [(measure, row[f"total_{measure}"]) for measure in measures]
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def _parse_day(value, name):
+        """'YYYY-MM-DD' أو date؛ القيم غير الصالحة (abc، 2026-13-01) ترفع ValueError (400) بدلاً من خطأ في الاستعلام"""
+        if not value or isinstance(value, datetime.date):
+            return value or None
+        try:
+            day = parse_date(str(value))
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValueError(f"{name} يجب أن يكون تاريخاً بصيغة YYYY-MM-DD")
+        return day
@@ -1,9 +1,14 @@
 
-from django.db.models import Sum, Q
+from django.db.models import Sum, Q, Max
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from ..models import FuelTransaction, Employee, Vehicle
+from .data_version_service import DataVersionService
+from .metrics_service import instrumented
+from .request_cache import RequestCache, request_memoized
+from .outbox_service import OutboxService
 
+@instrumented
 class FuelService:
 
     # --- أولاً: إنشاء المعاملات (The Ledger) ---
@@ -12,7 +17,53 @@ class FuelService:
     def create_transaction(data):
         """الدالة المركزية لتوحيد تسجيل المعاملات وضمان تكامل البيانات"""
         # يمكن إضافة منطق تدقيق إضافي هنا قبل الحفظ
-        return FuelTransaction.objects.create(**data)
+        # savepoint=False: داخل transaction قائم (صرف رحلة، مزامنة) ننضم إليه بدلاً من SAVEPOINT/RELEASE إضافيين،
+        # فأي خطأ هنا يُلغي العملية الخارجية كاملة، وهو المطلوب أصلاً
+        with transaction.atomic(savepoint=False):
+            fuel_tx = FuelTransaction.objects.create(**data)
+            event_type = 'fuel.issued' if fuel_tx.transaction_type == 'issue' else 'fuel.added'
+            # في نفس الـ transaction: الحدث يُحفظ مع الحركة أو لا يُحفظ أي منهما
+            OutboxService.append(event_type, fuel_tx.id, FuelService.outbox_payload(fuel_tx))
+        return fuel_tx
+
+    @staticmethod
+    def outbox_payload(fuel_tx):
+        """بيانات الحركة كما تراها الأنظمة الخارجية (صندوق الصادر)"""
+        return {
+            'employee_id': fuel_tx.employee_id,
+            'vehicle_id': fuel_tx.vehicle_id,
+            'trip_id': fuel_tx.trip_id,
+            'quantity': fuel_tx.quantity,
+            'transaction_type': fuel_tx.transaction_type,
+            'date': fuel_tx.date,
+        }
+
+    # حقل آخر نشاط في جدول الموظفين المقابل لكل نوع حركة
+    LAST_ACTIVITY_FIELDS = {'issue': 'last_issue_at', 'addition': 'last_addition_at'}
+
+    @staticmethod
+    def record_last_activity(fuel_tx):
+        """تحديث آخر نشاط للموظف بعد حركة جديدة (تحديث مشروط: الحركات بتاريخ قديم لا تُرجع التاريخ للخلف)"""
+        field = FuelService.LAST_ACTIVITY_FIELDS.get(fuel_tx.transaction_type)
+        if field and fuel_tx.date:
+            updated = Employee.objects.filter(id=fuel_tx.employee_id).filter(
+                Q(**{f"{field}__isnull": True}) | Q(**{f"{field}__lt": fuel_tx.date})
+            ).update(**{field: fuel_tx.date})
+            # التحديث المباشر لا يطلق signals: نُبطل نسخة الموظف المحفوظة في الطلب والنتائج المحفوظة يدوياً
+            RequestCache.invalidate(Employee)
+            if updated:
+                DataVersionService.bump(Employee)
+
+    @staticmethod
+    def recompute_last_activity(employee_id):
+        """إعادة حساب آخر نشاط من السجل (بعد حذف أو تعديل حركة)"""
+        latest = FuelTransaction.objects.filter(employee_id=employee_id).aggregate(
+            last_issue_at=Max('date', filter=Q(transaction_type='issue')),
+            last_addition_at=Max('date', filter=Q(transaction_type='addition')),
+        )
+        Employee.objects.filter(id=employee_id).update(**latest)
+        RequestCache.invalidate(Employee)
+        DataVersionService.bump(Employee)
 
     @staticmethod
     def add_fuel(employee_id, vehicle_id, quantity, trip=None, notes=None):
@@ -46,6 +97,7 @@ class FuelService:
     # --- ثانياً: الحسابات (Balance & Analytics) ---
 
     @staticmethod
+    @request_memoized(FuelTransaction)
     def calculate_employee_balance(employee_id):
         """
         الخوارزمية الحسابية للرصيد المتاح:
@@ -62,6 +114,7 @@ class FuelService:
         return added - issued
 
     @staticmethod
+    @request_memoized(FuelTransaction)
     def calculate_vehicle_total_fuel(vehicle_id):
         """إجمالي الوقود الذي استهلكته مركبة معينة (لأغراض مراقبة التكلفة)"""
         result = FuelTransaction.objects.filter(
@@ -0,0 +1,192 @@
+import math
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Q
+
+from ..models import FuelTransaction, Employee, Vehicle
+from .data_version_service import DataVersionService
+from .fleet_analytics_service import FleetAnalyticsService
+from .fuel_service import FuelService
+from .metrics_service import instrumented
+from .outbox_service import OutboxService
+from .request_cache import RequestCache
+
+
+@instrumented
+class FuelSyncService:
+    """
+    مزامنة دفعية لعمليات محطات الوقود التي سُجلت أثناء انقطاع الاتصال.
+    كل عملية تحمل مفتاحاً يولده الجهاز (idempotency key، عمود فريد في FuelTransaction):
+    إعادة إرسال الدفعة كلها أو جزء منها بعد انتهاء المهلة تعيد نفس النتيجة ولا تصرف مرتين.
+    الدفعة كاملة = استعلامات ثابتة العدد: المفاتيح الموجودة، الموظفين (مع قفل)، المركبات، الأرصدة، ثم إدخال مجمع.
+    ملاحظة: تاريخ العملية هو وقت المزامنة (auto_now_add)، ووقت الجهاز يُحفظ في الملاحظات إن أُرسل.
+    """
+
+    MAX_BATCH = 1000
+    # محاولات الإدخال عند التعارض مع مزامنة متزامنة؛ بعدها يرتفع IntegrityError ويعيد الجهاز الإرسال لاحقاً
+    CONFLICT_ATTEMPTS = 3
+    KEY_MAX_LENGTH = FuelTransaction._meta.get_field('idempotency_key').max_length
+
+    # حالات كل صف في الرد
+    CREATED = 'created'
+    DUPLICATE = 'duplicate'
+    REJECTED = 'rejected'
+    INVALID = 'invalid'
+
+    @staticmethod
+    def sync_batch(items):
+        """
+        items: [{'key', 'transaction_type': 'issue'|'addition', 'employee_id', 'vehicle_id', 'quantity', 'notes', 'occurred_at'}]
+        يعيد نتيجة لكل صف بنفس الترتيب: {'key', 'status', 'transaction_id', 'error'}.
+        """
+        if len(items) > FuelSyncService.MAX_BATCH:
+            raise ValueError(f"الحد الأقصى للدفعة {FuelSyncService.MAX_BATCH} عملية")
+
+        rows, results = FuelSyncService._parse(items)
+        for attempt in range(1, FuelSyncService.CONFLICT_ATTEMPTS + 1):
+            try:
+                FuelSyncService._apply(rows, results)
+                return results
+            except IntegrityError:
+                # نفس المفتاح أُدخل من مزامنة متزامنة أخرى بين الفحص والإدخال: إعادة المحاولة تكتشفه كمكرر
+                if attempt == FuelSyncService.CONFLICT_ATTEMPTS:
+                    raise
+                # الـ transaction أُلغي: نتائج الصفوف الصالحة تُحسب من جديد (التحقق من الشكل لا يتغير)
+                for index, _ in rows:
+                    results[index].update(status=None, transaction_id=None, error=None)
+
+    @staticmethod
+    def _parse(items):
+        """تحقق من شكل كل صف (بدون قاعدة البيانات). الصفوف الصالحة: (الموضع، البيانات)"""
+        rows, results, seen = [], [], {}
+        for index, item in enumerate(items):
+            key = str(item.get('key') or '') if isinstance(item, dict) else ''
+            result = {'key': key, 'status': None, 'transaction_id': None, 'error': None}
+            results.append(result)
+            try:
+                row = FuelSyncService._clean(item, key)
+            except (TypeError, ValueError) as e:
+                result.update(status=FuelSyncService.INVALID, error=str(e))
+                continue
+            if key in seen:
+                # نفس المفتاح مكرر داخل الدفعة: يأخذ نتيجة أول ظهور
+                result['status'] = FuelSyncService.DUPLICATE
+                result['duplicate_of'] = seen[key]
+                continue
+            seen[key] = index
+            rows.append((index, row))
+        return rows, results
+
+    @staticmethod
+    def _clean(item, key):
+        if not isinstance(item, dict):
+            raise TypeError("كل عملية يجب أن تكون كائن JSON")
+        if not key or len(key) > FuelSyncService.KEY_MAX_LENGTH:
+            raise ValueError(f"key مطلوب وبحد أقصى {FuelSyncService.KEY_MAX_LENGTH} حرفاً")
+        transaction_type = item.get('transaction_type', 'issue')
+        if transaction_type not in dict(FuelTransaction.TYPE_CHOICES):
+            raise ValueError("transaction_type يجب أن يكون issue أو addition")
+        quantity = float(item.get('quantity'))
+        if not (math.isfinite(quantity) and quantity > 0):
+            raise ValueError("quantity يجب أن تكون أكبر من صفر")
+
+        notes = item.get('notes') or ("عملية صرف وقود فعلية" if transaction_type == 'issue' else "إضافة رصيد وقود للنظام")
+        if item.get('occurred_at'):
+            notes = f"{notes} (وقت الجهاز: {item['occurred_at']})"
+        return {
+            'idempotency_key': key,
+            'transaction_type': transaction_type,
+            'employee_id': int(item.get('employee_id')),
+            'vehicle_id': int(item.get('vehicle_id')),
+            'quantity': quantity,
+            'notes': notes,
+        }
+
+    @staticmethod
+    def _apply(rows, results):
+        with transaction.atomic():
+            existing = dict(FuelTransaction.objects.filter(
+                idempotency_key__in=[row['idempotency_key'] for _, row in rows]
+            ).values_list('idempotency_key', 'id'))
+
+            pending = []
+            for index, row in rows:
+                if row['idempotency_key'] in existing:
+                    results[index].update(status=FuelSyncService.DUPLICATE, transaction_id=existing[row['idempotency_key']])
+                else:
+                    pending.append((index, row))
+
+            employee_ids = sorted({row['employee_id'] for _, row in pending})
+            # قفل الموظفين (بترتيب ثابت) حتى لا تصرف مزامنتان متزامنتان من نفس الرصيد
+            active_employees = set(
+                Employee.objects.select_for_update().filter(id__in=employee_ids, is_active=True)
+                .order_by('id').values_list('id', flat=True)
+            )
+            vehicles = set(Vehicle.objects.filter(id__in={row['vehicle_id'] for _, row in pending}).values_list('id', flat=True))
+            balances = FuelSyncService._balances(active_employees)
+
+            accepted = []
+            for index, row in pending:
+                error = None
+                if row['employee_id'] not in active_employees:
+                    error = "الموظف غير موجود أو غير نشط."
+                elif row['vehicle_id'] not in vehicles:
+                    error = "المركبة غير موجودة."
+                elif row['transaction_type'] == 'issue' and balances[row['employee_id']] < row['quantity']:
+                    error = f"عذراً، الرصيد غير كافٍ. الرصيد الحالي: {balances[row['employee_id']]} لتر."
+                if error:
+                    results[index].update(status=FuelSyncService.REJECTED, error=error)
+                    continue
+
+                # الرصيد الجاري داخل الدفعة: الصرف التالي لنفس الموظف يرى خصم ما قبله
+                sign = -1 if row['transaction_type'] == 'issue' else 1
+                balances[row['employee_id']] += sign * row['quantity']
+                accepted.append((index, FuelTransaction(**row)))
+
+            created = FuelTransaction.objects.bulk_create([tx for _, tx in accepted])
+            for (index, _), fuel_tx in zip(accepted, created):
+                results[index].update(status=FuelSyncService.CREATED, transaction_id=fuel_tx.id)
+
+            if created:
+                OutboxService.append_many(
+                    ('fuel.issued' if tx.transaction_type == 'issue' else 'fuel.added', tx.id, FuelService.outbox_payload(tx))
+                    for tx in created
+                )
+                FuelSyncService._after_bulk_create(created)
+
+        # نتائج الصفوف المكررة داخل الدفعة = نتيجة أول ظهور
+        for result in results:
+            if 'duplicate_of' in result:
+                first = results[result.pop('duplicate_of')]
+                status = FuelSyncService.DUPLICATE if first['transaction_id'] else first['status']
+                result.update(status=status, transaction_id=first['transaction_id'], error=first['error'])
+
+    @staticmethod
+    def _balances(employee_ids):
+        """رصيد كل موظف في الدفعة باستعلام تجميعي واحد"""
+        balances = defaultdict(float)
+        totals = FuelTransaction.objects.filter(employee_id__in=employee_ids).values('employee_id').annotate(
+            added=Sum('quantity', filter=Q(transaction_type='addition')),
+            issued=Sum('quantity', filter=Q(transaction_type='issue')),
+        ).order_by()
+        for row in totals:
+            balances[row['employee_id']] = (row['added'] or 0.0) - (row['issued'] or 0.0)
+        return balances
+
+    @staticmethod
+    def _after_bulk_create(created):
+        """ما تفعله signals لكل save() عادة (bulk_create لا يطلقها)، مجمعاً للدفعة"""
+        # Employee أيضاً: أعمدة آخر نشاط تُكتب أدناه بـ update()
+        DataVersionService.bump(FuelTransaction, Employee)
+        RequestCache.invalidate(FuelTransaction, Employee)
+        FleetAnalyticsService.mark_dirty(*{FleetAnalyticsService.local_date(tx.date) for tx in created})
+
+        # آخر صرف/إضافة: تحديث واحد لكل نوع بدلاً من تحديث لكل عملية
+        for transaction_type, field in FuelService.LAST_ACTIVITY_FIELDS.items():
+            batch = [tx for tx in created if tx.transaction_type == transaction_type]
+            if batch:
+                latest = max(tx.date for tx in batch)
+                Employee.objects.filter(id__in={tx.employee_id for tx in batch}).filter(
+                    Q(**{f"{field}__isnull": True}) | Q(**{f"{field}__lt": latest})
+                ).update(**{field: latest})
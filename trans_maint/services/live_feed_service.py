@@ -0,0 +1,243 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max, Q
+
+from ..models import OutboxEvent, Vehicle
+from .metrics_service import instrumented
+
+logger = logging.getLogger('trans_maint.live_feed')
+
+
+class LiveFeedSubscriber:
+    """شاشة مفتوحة واحدة: طابور محدود الحجم يعيش على حلقة الأحداث (event loop) الخاصة بها"""
+
+    def __init__(self, loop, topics=None, max_queue=None):
+        self.loop = loop
+        self.topics = set(topics) if topics else None
+        self.queue = asyncio.Queue(maxsize=max_queue or getattr(settings, 'LIVE_FEED_QUEUE_SIZE', 100))
+        self.overflowed = False
+
+    def wants(self, event):
+        return self.topics is None or event['type'].split('.')[0] in self.topics
+
+    def offer(self, event):
+        """يُستدعى داخل حلقة المشترك فقط. عند امتلاء الطابور نغلق البث ليعيد العميل الاتصال بالمؤشر"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            # تفريغ عنصر واحد لإفساح مكان لعلامة الإغلاق (None)
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+@instrumented
+class LiveFeedService:
+    """
+    وسيط بث داخل العملية (in-process fan-out) لأحداث التشغيل الحية (SSE).
+    - مصدر الأحداث صندوق الصادر (OutboxEvent) وليس الخدمات مباشرة: خيط ناقل (relay) يقرأ الأحداث الجديدة
+      كل LIVE_FEED_POLL_SECONDS، فيرى كل عامل ASGI كتابات كل العمليات (WSGI و ASGI والعامل الخلفي)،
+      ولا يظهر حدث تم التراجع عنه لأن صف الصادر يُثبت مع التغيير نفسه.
+    - كل حدث يحصل على مؤشر (cursor) تصاعدي ويُحفظ في سجل دائري صغير لإعادة الإرسال عند إعادة الاتصال.
+    - كل مشترك له طابور محدود؛ المشترك البطيء يُفصل بدلاً من أن يستهلك الذاكرة.
+    """
+
+    # أحداث الصادر التي تظهر على الشاشات (trip.updated و trip.deleted للأنظمة الخارجية فقط)
+    FEED_TYPES = (
+        'trip.started', 'trip.ended', 'fuel.issued', 'fuel.added',
+        'accident.reported', 'accident.closed', 'maintenance.opened', 'maintenance.completed',
+    )
+    # أكثر من هذا العدد من حركات الوقود في قراءة واحدة (مزامنة محطة) = حدث fuel.synced واحد بدلاً من ملء الطوابير
+    COALESCE_FUEL_EVENTS = 20
+    # الناقل يتوقف بعد هذه المدة بلا مشتركين (أطول من مهلة إعادة اتصال المتصفح)
+    RELAY_IDLE_SECONDS = 30
+
+    # معرّف تشغيل الناقل: مؤشر من تشغيل سابق (أو عامل آخر) لا معنى له بعده
+    BOOT_ID = uuid.uuid4().hex[:8]
+
+    _lock = threading.Lock()
+    _sequence = itertools.count(1)
+    _history = deque(maxlen=getattr(settings, 'LIVE_FEED_HISTORY', 1000))
+    _subscribers = set()
+
+    # حالة الناقل: آخر id مقروء من الصادر، والـ ids المحجوزة التي لم تظهر بعد (transaction لم يُثبت) ووقت رؤيتها
+    _relay_thread = None
+    _position = 0
+    _gaps = {}
+
+    # --- أولاً: النشر (Publishing) ---
+
+    @staticmethod
+    def publish(event_type, payload):
+        """نشر حدث لكل المشتركين؛ آمن للاستدعاء من أي خيط"""
+        with LiveFeedService._lock:
+            event = {
+                'id': f"{LiveFeedService.BOOT_ID}:{next(LiveFeedService._sequence)}",
+                'type': event_type,
+                'ts': round(time.time(), 3),
+                'data': payload,
+            }
+            LiveFeedService._history.append(event)
+            subscribers = [s for s in LiveFeedService._subscribers if s.wants(event)]
+
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, event)
+            except RuntimeError:
+                # حلقة المشترك أُغلقت (انقطع الاتصال) قبل أن يلغي اشتراكه
+                LiveFeedService.unsubscribe(subscriber)
+        return event
+
+    # --- ثانياً: الناقل من صندوق الصادر (Outbox Relay) ---
+
+    @staticmethod
+    def _ensure_relay():
+        """
+        تشغيل خيط الناقل إن لم يكن يعمل؛ يُستدعى من subscribe والقفل _lock محجوز، فلا يمكن للناقل أن يتوقف
+        (لعدم وجود مشتركين) بين التأكد من تشغيله وتسجيل المشترك. يبدأ من آخر حدث في الصادر الآن،
+        ومع كل تشغيل جديد يتغير BOOT_ID فيُعاد ضبط العملاء الذين فاتتهم أحداث أثناء التوقف.
+        """
+        if LiveFeedService._relay_thread is not None:
+            return
+        LiveFeedService._position = OutboxEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        LiveFeedService._gaps = {}
+        LiveFeedService._history.clear()
+        LiveFeedService.BOOT_ID = uuid.uuid4().hex[:8]
+        LiveFeedService._relay_thread = threading.Thread(target=LiveFeedService._relay_loop, name='live-feed-relay', daemon=True)
+        LiveFeedService._relay_thread.start()
+
+    @staticmethod
+    def _relay_loop():
+        idle_since = None
+        try:
+            while True:
+                time.sleep(settings.LIVE_FEED_POLL_SECONDS)
+                try:
+                    LiveFeedService.poll()
+                except Exception:
+                    logger.exception("فشل قراءة صندوق الصادر للبث الحي")
+                    connection.close()  # اتصال جديد في المحاولة التالية
+
+                with LiveFeedService._lock:
+                    if LiveFeedService._subscribers:
+                        idle_since = None
+                    elif idle_since is None:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since > LiveFeedService.RELAY_IDLE_SECONDS:
+                        LiveFeedService._relay_thread = None
+                        return
+        finally:
+            connection.close()
+
+    @staticmethod
+    def poll():
+        """
+        قراءة واحدة: الأحداث بعد آخر id مقروء، والـ ids الناقصة بينها. الـ id يُحجز عند الإدخال ويظهر عند الـ commit،
+        فقد يظهر 101 بعد 102؛ نعيد السؤال عن الناقص لمدة OUTBOX_SETTLE_SECONDS ثم نعتبره مُلغى (rollback).
+        """
+        now = time.monotonic()
+        gaps = {
+            event_id: seen for event_id, seen in LiveFeedService._gaps.items()
+            if now - seen <= settings.OUTBOX_SETTLE_SECONDS
+        }
+        position = LiveFeedService._position
+        condition = Q(id__gt=position)
+        if gaps:
+            condition |= Q(id__in=list(gaps))
+        events = list(OutboxEvent.objects.filter(condition).order_by('id')[:settings.OUTBOX_MAX_BATCH_SIZE])
+
+        expected = position + 1
+        for event in events:
+            gaps.pop(event.id, None)
+            if event.id > position:
+                gaps.update((missing, now) for missing in range(expected, event.id))
+                expected = event.id + 1
+        LiveFeedService._gaps = gaps
+        LiveFeedService._position = max(position, expected - 1)
+
+        for event_type, payload in LiveFeedService.to_feed_events(events):
+            LiveFeedService.publish(event_type, payload)
+        return len(events)
+
+    @staticmethod
+    def to_feed_events(events):
+        """أحداث الصادر -> (النوع، البيانات) للشاشات، مع رقم اللوحة باستعلام واحد للدفعة"""
+        events = [e for e in events if e.event_type in LiveFeedService.FEED_TYPES]
+        fuel = [e for e in events if e.event_type.startswith('fuel.')]
+        if len(fuel) > LiveFeedService.COALESCE_FUEL_EVENTS:
+            events = [e for e in events if not e.event_type.startswith('fuel.')]
+
+        vehicle_ids = {e.payload.get('vehicle_id') for e in events} - {None}
+        plates = dict(Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', 'plate_number')) if vehicle_ids else {}
+
+        feed = [
+            (e.event_type, dict(e.payload, object_id=e.object_id, plate_number=plates.get(e.payload.get('vehicle_id'))))
+            for e in events
+        ]
+        if len(fuel) > LiveFeedService.COALESCE_FUEL_EVENTS:
+            feed.append(('fuel.synced', {
+                'count': len(fuel),
+                'issued': sum(e.payload.get('quantity') or 0 for e in fuel if e.event_type == 'fuel.issued'),
+                'employee_ids': sorted({e.payload.get('employee_id') for e in fuel} - {None}),
+            }))
+        return feed
+
+    # --- ثالثاً: الاشتراك وإعادة الإرسال (Subscribe & Replay) ---
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """تحويل 'boot:seq' إلى رقم تسلسلي؛ None إذا كان المؤشر من تشغيل آخر أو غير صالح"""
+        if not cursor:
+            return None
+        boot_id, _, sequence = cursor.partition(':')
+        if boot_id != LiveFeedService.BOOT_ID or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    @staticmethod
+    def subscribe(loop, cursor=None, topics=None):
+        """
+        تسجيل مشترك جديد وإرجاع (المشترك، الأحداث الفائتة، هل يلزم إعادة تحميل الصفحة).
+        تشغيل الناقل واللقطة والتسجيل تتم تحت نفس القفل لضمان عدم ضياع أي حدث بينها.
+        قد يقرأ من قاعدة البيانات عند تشغيل الناقل، فيُستدعى من الـ async عبر run_db_call.
+        """
+        subscriber = LiveFeedSubscriber(loop, topics)
+
+        with LiveFeedService._lock:
+            LiveFeedService._ensure_relay()
+            # بعد تشغيل الناقل: BOOT_ID قد يكون تغير
+            sequence = LiveFeedService.parse_cursor(cursor)
+            backlog, reset = [], bool(cursor) and sequence is None
+            if sequence is not None:
+                history = LiveFeedService._history
+                oldest = LiveFeedService.parse_cursor(history[0]['id']) if history else None
+                if oldest is not None and sequence < oldest - 1:
+                    # العميل غاب أطول من السجل المحفوظ: عليه إعادة تحميل الصفحة
+                    reset = True
+                else:
+                    backlog = [
+                        e for e in history
+                        if LiveFeedService.parse_cursor(e['id']) > sequence and subscriber.wants(e)
+                    ]
+            LiveFeedService._subscribers.add(subscriber)
+
+        return subscriber, backlog, reset
+
+    @staticmethod
+    def unsubscribe(subscriber):
+        with LiveFeedService._lock:
+            LiveFeedService._subscribers.discard(subscriber)
+
+    @staticmethod
+    def subscriber_count():
+        return len(LiveFeedService._subscribers)
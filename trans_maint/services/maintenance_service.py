@@ -1,11 +1,27 @@
 from django.shortcuts import get_object_or_404
 from django.db.models import Sum
 from django.db import transaction
-from ..models import MaintenanceRequest, Vehicle
+from ..models import MaintenanceRequest, Vehicle, Workshop
+from .outbox_service import OutboxService
+from .metrics_service import instrumented
+from .request_cache import request_memoized
 from django.utils import timezone
 
+@instrumented
 class MaintenanceService:
 
+    @staticmethod
+    def outbox_payload(request):
+        """بيانات طلب الصيانة وتكلفته كما تراها الأنظمة الخارجية (صندوق الصادر)"""
+        return {
+            'vehicle_id': request.vehicle_id,
+            'workshop_id': request.workshop_id,
+            'accident_id': request.accident_ref_id,
+            'cost': request.cost,
+            'status': request.status,
+            'date_completed': request.date_completed,
+        }
+
     # --- أولاً: العمليات الأساسية (Operational Flow) ---
 
     @staticmethod
@@ -19,12 +35,12 @@ class MaintenanceService:
         with transaction.atomic():
             # 1. إنشاء سجل الصيانة (يربط بـ accident_ref إذا وجد)
             request = MaintenanceRequest.objects.create(**data)
+            OutboxService.append('maintenance.opened', request.id, MaintenanceService.outbox_payload(request))
             
             # 2. تغيير حالة المركبة لضمان عدم استخدامها (Safety Lock)
             # حتى لو كانت active، نحولها لـ inactive أو نعتمد على وجود طلب pending
             vehicle.status = 'under_repair'
             vehicle.save()
-            
             return request
 
     @staticmethod
@@ -39,12 +55,12 @@ class MaintenanceService:
             request.cost = actual_cost
             request.date_completed = timezone.now().date()
             request.save()
+            OutboxService.append('maintenance.completed', request.id, MaintenanceService.outbox_payload(request))
             
             # إعادة تفعيل المركبة (فتح القفل) لتصبح متاحة للـ Trip Service
             vehicle = request.vehicle
             vehicle.status = 'active'
             vehicle.save()
-            
         return request
 
     @staticmethod
@@ -56,6 +72,7 @@ class MaintenanceService:
         return request
 
     @staticmethod
+    @request_memoized(MaintenanceRequest, Vehicle, Workshop)
     def get_maintenance_request(request_id):
         return get_object_or_404(MaintenanceRequest.objects.select_related('vehicle', 'workshop'), id=request_id)
 
@@ -71,7 +88,7 @@ class MaintenanceService:
     @staticmethod
     def get_vehicle_maintenance_history(vehicle_id):
         """تحليل السجل الفني للمركبة لاكتشاف الأعطال المتكررة"""
-        return MaintenanceRequest.objects.filter(vehicle_id=vehicle_id).order_by('-date_reported')
+        return MaintenanceRequest.objects.filter(vehicle_id=vehicle_id).select_related('workshop').order_by('-date_reported')
 
     @staticmethod
     def get_total_maintenance_cost(vehicle_id=None):
@@ -0,0 +1,177 @@
+import contextvars
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from ..middleware import PerfLog
+
+try:
+    import resource
+except ImportError:  # Windows: لا يوجد ru_maxrss
+    resource = None
+
+logger = logging.getLogger('trans_maint.memory')
+
+
+class MemoryProbe:
+    def __init__(self, traced):
+        self.traced = traced
+        self.snapshot = None
+        self.snapshot_size = -1
+
+
+_probe = contextvars.ContextVar('memory_probe', default=None)
+
+
+class MemoryService:
+    """
+    قياس الذاكرة لمسارات التقارير والتصدير (أكثر ما يدفع عمال gunicorn لنفاد الذاكرة):
+    - كل تنفيذ: RSS العملية قبل/بعد، وأعلى RSS بلغته العملية (ru_maxrss) وكم رفعه هذا التنفيذ.
+    - عينة (MEMORY_TRACE_SAMPLE_RATE) تُتبع بـ tracemalloc: أعلى ذاكرة Python خلال التنفيذ وأكبر مواقع التخصيص.
+      اللقطة تؤخذ في checkpoint() حيث تكون النتائج ما زالت حية (بعد بناء الصفحة، أو كل دفعة صفوف في التصدير).
+    - تجاوز MEMORY_LARGE_ALLOCATION_MB يُسجل تحذيراً في logger 'trans_maint.memory' بمعايير التقرير وأكبر المواقع.
+    الأرقام تُضاف لسجل PerfMiddleware (request.perf_memory) فتظهر في manage.py perf_report بجانب الزمن.
+    tracemalloc عام للعملية: تنفيذ واحد يُتبع في كل مرة، وتخصيصات الخيوط الأخرى خلاله تُحسب معه.
+    """
+
+    TOP_SITES = 10
+    _trace_lock = threading.Lock()
+
+    # --- أولاً: القراءات ---
+
+    @staticmethod
+    def current_rss_kb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+        except (OSError, ValueError, AttributeError):  # غير Linux
+            return None
+
+    @staticmethod
+    def peak_rss_kb():
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS بالبايت، Linux بالكيلوبايت
+        return peak // 1024 if sys.platform == 'darwin' else peak
+
+    # --- ثانياً: القياس ---
+
+    @staticmethod
+    def _start_trace():
+        rate = settings.MEMORY_TRACE_SAMPLE_RATE
+        # لا نلمس tracemalloc إن كان مفعلاً من خارجنا (PYTHONTRACEMALLOC)
+        if rate <= 0 or random.random() >= rate or tracemalloc.is_tracing():
+            return False
+        if not MemoryService._trace_lock.acquire(blocking=False):
+            return False
+        tracemalloc.start()
+        return True
+
+    @staticmethod
+    @contextmanager
+    def track(name, params=None, request=None):
+        """
+        with MemoryService.track('MainReportView', request.GET.dict(), request): ...
+        بدون request (مهام الخلفية) يُكتب سجل مستقل في سجل الأداء باسم name.
+        """
+        if not settings.MEMORY_INSTRUMENTATION:
+            yield
+            return
+
+        probe = MemoryProbe(MemoryService._start_trace())
+        token = _probe.set(probe)
+        rss_before, peak_before = MemoryService.current_rss_kb(), MemoryService.peak_rss_kb()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = {}
+            try:
+                if probe.traced:
+                    MemoryService.checkpoint()
+                    stats['py_peak_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+                    stats['top_allocations'] = MemoryService.top_sites(probe.snapshot)
+            finally:
+                _probe.reset(token)
+                if probe.traced:
+                    tracemalloc.stop()
+                    MemoryService._trace_lock.release()
+
+            rss_after, peak_after = MemoryService.current_rss_kb(), MemoryService.peak_rss_kb()
+            if rss_after is not None:
+                stats['rss_kb'] = rss_after
+                stats['rss_delta_kb'] = rss_after - rss_before
+            if peak_after is not None:
+                stats['peak_rss_kb'] = peak_after
+                stats['peak_rss_growth_kb'] = peak_after - peak_before
+            MemoryService._report(name, params, stats)
+
+            if request is not None:
+                request.perf_memory = stats
+            else:
+                MemoryService._log_run(name, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def checkpoint():
+        """لقطة للتخصيصات الحية الآن إن كانت أكبر من السابقة (رخيصة جداً خارج العينة المتتبعة)"""
+        probe = _probe.get()
+        if probe is None or not probe.traced:
+            return
+        current = tracemalloc.get_traced_memory()[0]
+        if current > probe.snapshot_size:
+            probe.snapshot = tracemalloc.take_snapshot()
+            probe.snapshot_size = current
+
+    @staticmethod
+    def top_sites(snapshot):
+        """[{'site': 'ملف:سطر', 'kb', 'count'}] لأكبر المواقع التي ما زالت تخصيصاتها حية في اللقطة"""
+        if snapshot is None:
+            return []
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+        base = str(settings.BASE_DIR)
+        sites = []
+        for stat in snapshot.statistics('lineno')[:MemoryService.TOP_SITES]:
+            frame = stat.traceback[0]
+            filename = os.path.relpath(frame.filename, base) if frame.filename.startswith(base) else frame.filename
+            sites.append({'site': f"{filename}:{frame.lineno}", 'kb': stat.size // 1024, 'count': stat.count})
+        return sites
+
+    # --- ثالثاً: التسجيل ---
+
+    @staticmethod
+    def _report(name, params, stats):
+        growth_kb = max(stats.get('py_peak_kb', 0), stats.get('rss_delta_kb', 0), stats.get('peak_rss_growth_kb', 0))
+        if growth_kb < settings.MEMORY_LARGE_ALLOCATION_MB * 1024:
+            return
+        logger.warning(
+            "%s استهلك %.1f MB (ذروة Python %s KB، تغير RSS %s KB، رفع أعلى RSS %s KB) بالمعايير %s؛ أكبر مواقع التخصيص: %s",
+            name, growth_kb / 1024, stats.get('py_peak_kb', '-'), stats.get('rss_delta_kb', '-'),
+            stats.get('peak_rss_growth_kb', '-'), params or {},
+            ', '.join(f"{s['site']} ({s['kb']} KB)" for s in stats.get('top_allocations', ())[:5]) or 'غير متتبع في هذه العينة',
+        )
+
+    @staticmethod
+    def _log_run(name, stats, wall):
+        # نفس سجل PerfMiddleware حتى يظهر التنفيذ في perf_report بجانب الـ Views
+        if not settings.PERF_INSTRUMENTATION:
+            return
+        PerfLog.write({
+            'ts': round(time.time(), 3),
+            'view': name,
+            'method': 'JOB',
+            'path': '',
+            'status': 0,
+            'wall_ms': round(wall * 1000, 2),
+            **stats,
+        })
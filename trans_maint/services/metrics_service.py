@@ -0,0 +1,207 @@
+import functools
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from inspect import isasyncgenfunction, iscoroutinefunction, isgeneratorfunction
+
+from django.conf import settings
+
+
+class MetricsService:
+    """
+    عدد الاستدعاءات والأخطاء ومدرج الزمن (histogram) لكل دالة خدمة مزخرفة بـ instrumented،
+    تُعرض بصيغة Prometheus النصية في /metrics.
+
+    التخزين: ملف مربوط بالذاكرة (mmap) لكل عملية في METRICS_DIR باسم <pid>.bin، فلا قفل بين العمال:
+    كل عامل gunicorn يزيد خاناته فقط، و/metrics (في أي عامل) يجمع كل الملفات.
+    ملفات العمال المنتهية تبقى وتُجمع (العدادات لا تنقص)، ويُمسح المجلد عند بدء التشغيل.
+    خانة لكل دالة: الاسم، الاستدعاءات، الأخطاء، مجموع الثواني، وعدد كل فئة زمنية (غير تراكمي؛ التراكم عند العرض).
+    """
+
+    # حدود الفئات بالثواني (افتراضيات Prometheus)، والأخيرة +Inf ضمنياً
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    MAX_METHODS = 512
+    NAME_SIZE = 120
+
+    HEADER = struct.Struct('<Q')  # عدد الخانات المستخدمة
+    COUNTER = struct.Struct('<Q')
+    SECONDS = struct.Struct('<d')
+    # الاسم، ثم: الاستدعاءات، الأخطاء، مجموع الثواني، ثم فئة لكل حد + فئة +Inf
+    SLOT = struct.Struct(f'<{NAME_SIZE}sQQd{len(BUCKETS) + 1}Q')
+    CALLS_OFFSET = NAME_SIZE
+    ERRORS_OFFSET = CALLS_OFFSET + 8
+    SUM_OFFSET = ERRORS_OFFSET + 8
+    BUCKETS_OFFSET = SUM_OFFSET + 8
+    FILE_SIZE = HEADER.size + SLOT.size * MAX_METHODS
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    PREFIX = 'trans_maint_service'
+
+    _lock = threading.Lock()
+    _owner = None  # (pid، المجلد) لملف هذه العملية: يتغير بعد fork أو مع override_settings في الاختبارات
+    _map = None
+    _offsets = {}
+
+    # --- أولاً: ملف العملية (Per-Process Shared Memory File) ---
+
+    @staticmethod
+    def _get_map():
+        owner = (os.getpid(), settings.METRICS_DIR)
+        if MetricsService._owner != owner:
+            with MetricsService._lock:
+                if MetricsService._owner != owner:
+                    MetricsService._open_map(*owner)
+        return MetricsService._map
+
+    @staticmethod
+    def _open_map(pid, directory):
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, f"{pid}.bin"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < MetricsService.FILE_SIZE:
+                os.ftruncate(fd, MetricsService.FILE_SIZE)
+            data = mmap.mmap(fd, MetricsService.FILE_SIZE)
+        finally:
+            os.close(fd)
+        # ملف قديم لنفس الـ pid (إعادة استخدام الرقم): نكمل على خاناته بدلاً من الكتابة فوقها
+        MetricsService._offsets = {name: offset for name, offset, _ in MetricsService._slots(data)}
+        MetricsService._map = data
+        MetricsService._owner = (pid, directory)
+
+    @staticmethod
+    def _slots(data):
+        """(الاسم، الموضع، القيم) لكل خانة مستخدمة في ملف عملية"""
+        used = min(MetricsService.HEADER.unpack_from(data, 0)[0], MetricsService.MAX_METHODS)
+        for index in range(used):
+            offset = MetricsService.HEADER.size + index * MetricsService.SLOT.size
+            name, *values = MetricsService.SLOT.unpack_from(data, offset)
+            yield name.rstrip(b'\0').decode('utf-8'), offset, values
+
+    @staticmethod
+    def _slot_offset(data, name):
+        """موضع خانة الدالة، تُحجز عند أول استدعاء (None إذا امتلأ الملف)"""
+        used = MetricsService.HEADER.unpack_from(data, 0)[0]
+        if used >= MetricsService.MAX_METHODS:
+            return None
+        offset = MetricsService.HEADER.size + used * MetricsService.SLOT.size
+        data[offset:offset + MetricsService.NAME_SIZE] = name.encode('utf-8')[:MetricsService.NAME_SIZE].ljust(MetricsService.NAME_SIZE, b'\0')
+        MetricsService.HEADER.pack_into(data, 0, used + 1)
+        MetricsService._offsets[name] = offset
+        return offset
+
+    # --- ثانياً: التسجيل ---
+
+    @staticmethod
+    def observe(name, seconds, failed=False):
+        data = MetricsService._get_map()
+        counter, bucket = MetricsService.COUNTER, bisect_left(MetricsService.BUCKETS, seconds)
+        with MetricsService._lock:
+            offset = MetricsService._offsets.get(name)
+            if offset is None:
+                offset = MetricsService._slot_offset(data, name)
+                if offset is None:
+                    return
+            counter.pack_into(data, offset + MetricsService.CALLS_OFFSET, counter.unpack_from(data, offset + MetricsService.CALLS_OFFSET)[0] + 1)
+            if failed:
+                counter.pack_into(data, offset + MetricsService.ERRORS_OFFSET, counter.unpack_from(data, offset + MetricsService.ERRORS_OFFSET)[0] + 1)
+            total = MetricsService.SECONDS.unpack_from(data, offset + MetricsService.SUM_OFFSET)[0]
+            MetricsService.SECONDS.pack_into(data, offset + MetricsService.SUM_OFFSET, total + seconds)
+            bucket_offset = offset + MetricsService.BUCKETS_OFFSET + bucket * counter.size
+            counter.pack_into(data, bucket_offset, counter.unpack_from(data, bucket_offset)[0] + 1)
+
+    # --- ثالثاً: التجميع والعرض ---
+
+    @staticmethod
+    def collect():
+        """{'FuelService.issue_fuel': {'calls', 'errors', 'sum', 'buckets': [...]}} مجموعة من ملفات كل العمال"""
+        metrics = {}
+        for path in sorted(glob.glob(os.path.join(settings.METRICS_DIR, '*.bin'))):
+            with open(path, 'rb') as f:
+                data = f.read(MetricsService.FILE_SIZE)
+            if len(data) < MetricsService.FILE_SIZE:
+                continue
+            for name, _, (calls, errors, seconds, *buckets) in MetricsService._slots(data):
+                row = metrics.setdefault(name, {'calls': 0, 'errors': 0, 'sum': 0.0, 'buckets': [0] * len(buckets)})
+                row['calls'] += calls
+                row['errors'] += errors
+                row['sum'] += seconds
+                row['buckets'] = [a + b for a, b in zip(row['buckets'], buckets)]
+        return metrics
+
+    @staticmethod
+    def render():
+        """نص /metrics بصيغة Prometheus (text exposition format 0.0.4)"""
+        metrics = sorted(MetricsService.collect().items())
+        prefix = MetricsService.PREFIX
+        lines = [
+            f"# HELP {prefix}_calls_total Service method calls.",
+            f"# TYPE {prefix}_calls_total counter",
+        ]
+        lines += [f"{prefix}_calls_total{{{MetricsService._labels(name)}}} {row['calls']}" for name, row in metrics]
+        lines += [
+            f"# HELP {prefix}_errors_total Service method calls that raised an exception.",
+            f"# TYPE {prefix}_errors_total counter",
+        ]
+        lines += [f"{prefix}_errors_total{{{MetricsService._labels(name)}}} {row['errors']}" for name, row in metrics]
+        lines += [
+            f"# HELP {prefix}_latency_seconds Service method latency.",
+            f"# TYPE {prefix}_latency_seconds histogram",
+        ]
+        for name, row in metrics:
+            labels = MetricsService._labels(name)
+            cumulative = 0
+            for bound, count in zip(MetricsService.BUCKETS + ('+Inf',), row['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_latency_seconds_sum{{{labels}}} {row['sum']!r}")
+            lines.append(f"{prefix}_latency_seconds_count{{{labels}}} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _labels(name):
+        # 'ReportService.FuelReports.get_detailed_consumption_report' -> service="ReportService.FuelReports"
+        service, _, method = name.rpartition('.')
+        return f'service="{MetricsService._escape(service)}",method="{MetricsService._escape(method)}"'
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def instrumented(obj):
+    """
+    مزخرف قياس دوال الخدمات (MetricsService): الزمن، والاستدعاء، والخطأ إن رُفع استثناء.
+    على صنف: يُطبق على كل دواله الثابتة العامة وأصنافه الداخلية (ReportService.FuelReports ...)،
+    ويوضع فوق باقي مزخرفات الصنف (reads_from_replica) ليشمل زمنها.
+    الدوال غير المتزامنة والمولدات تُترك كما هي: الأولى تستدعي النسخ المتزامنة المقاسة، والثانية زمنها زمن المستهلك.
+    """
+    if isinstance(obj, type):
+        for name, member in list(vars(obj).items()):
+            if isinstance(member, staticmethod) and not name.startswith('_'):
+                func = member.__func__
+                if not (iscoroutinefunction(func) or isgeneratorfunction(func) or isasyncgenfunction(func)):
+                    setattr(obj, name, staticmethod(instrumented(func)))
+            elif isinstance(member, type) and member.__qualname__.startswith(obj.__qualname__ + '.'):
+                instrumented(member)
+        return obj
+
+    name = obj.__qualname__
+
+    @functools.wraps(obj)
+    def wrapper(*args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            return obj(*args, **kwargs)
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = obj(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            MetricsService.observe(name, time.perf_counter() - started, failed)
+
+    return wrapper
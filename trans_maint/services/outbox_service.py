@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from ..models import OutboxEvent, OutboxConsumer
+from .metrics_service import instrumented
+
+
+@instrumented
+class OutboxService:
+    """
+    صندوق الصادر: الخدمات تضيف حدثاً في نفس الـ transaction مع كل تغيير حالة (رحلة، وقود، تكلفة حادث، صيانة)،
+    والأنظمة الخارجية تقرأ "التغييرات بعد المؤشر" بدلاً من مسح الجداول كاملة؛ التكلفة بقدر التغييرات فقط.
+
+    لماذا التأخير OUTBOX_SETTLE_SECONDS: الـ id يُحجز عند الإدخال لكن يظهر عند الـ commit،
+    فقد يظهر حدث 101 بعد أن قرأ المستهلك 102 وتجاوزه. نعرض فقط الأحداث الأقدم من هذه المهلة
+    (يجب أن تكون أطول من أي transaction يكتب أحداثاً).
+    """
+
+    # --- أولاً: الكتابة (داخل transaction التغيير) ---
+
+    @staticmethod
+    def append(event_type, object_id, payload):
+        if not connection.in_atomic_block:
+            raise RuntimeError("OutboxService.append يجب أن يُستدعى داخل transaction.atomic() مع التغيير نفسه")
+        return OutboxEvent.objects.create(event_type=event_type, object_id=object_id, payload=payload)
+
+    @staticmethod
+    def append_many(events):
+        """events: [(event_type, object_id, payload)] - إدخال مجمع للدفعات (مزامنة المحطات)"""
+        if not connection.in_atomic_block:
+            raise RuntimeError("OutboxService.append_many يجب أن يُستدعى داخل transaction.atomic() مع التغيير نفسه")
+        return OutboxEvent.objects.bulk_create([
+            OutboxEvent(event_type=event_type, object_id=object_id, payload=payload)
+            for event_type, object_id, payload in events
+        ])
+
+    # --- ثانياً: القراءة (التغييرات بعد المؤشر) ---
+
+    @staticmethod
+    def changes_since(after=0, limit=None, types=None):
+        """
+        (الأحداث، هل توجد بعدها) بترتيب المؤشر. types: بادئات مثل ['fuel', 'trip'].
+        استعلام واحد على نطاق المفتاح الأساسي مهما كبر الجدول.
+        """
+        limit = settings.OUTBOX_BATCH_SIZE if limit is None else limit
+        # حد سالب يجعل الشريحة [:limit + 1] سالبة (QuerySet يرفضها)
+        limit = max(1, min(limit, settings.OUTBOX_MAX_BATCH_SIZE))
+        settled_before = timezone.now() - timedelta(seconds=settings.OUTBOX_SETTLE_SECONDS)
+        queryset = OutboxEvent.objects.filter(id__gt=after, created_at__lte=settled_before)
+        if types:
+            condition = Q()
+            for prefix in types:
+                condition |= Q(event_type__startswith=f"{prefix}.")
+            queryset = queryset.filter(condition)
+
+        events = list(queryset.order_by('id')[:limit + 1])
+        return events[:limit], len(events) > limit
+
+    @staticmethod
+    def serialize(event):
+        return {
+            'id': event.id,
+            'type': event.event_type,
+            'object_id': event.object_id,
+            'created_at': event.created_at,
+            'payload': event.payload,
+        }
+
+    # --- ثالثاً: التأكيد والضغط (Acknowledge & Compact) ---
+
+    @staticmethod
+    def acknowledge(consumer_name, through):
+        """تسجيل أن المستهلك عالج كل الأحداث حتى through (لا يرجع المؤشر للخلف أبداً)"""
+        # لا تأكيد لأحداث لم تُكتب بعد: وإلا يحذفها الضغط قبل أن يراها أحد
+        through = min(through, OutboxEvent.objects.aggregate(last=Max('id'))['last'] or 0)
+        consumer, _ = OutboxConsumer.objects.get_or_create(name=consumer_name)
+        OutboxConsumer.objects.filter(id=consumer.id).update(acked_through=Greatest(F('acked_through'), Value(through)))
+        consumer.refresh_from_db(fields=['acked_through'])
+        return consumer.acked_through
+
+    @staticmethod
+    def compactable_through():
+        """
+        أعلى مؤشر أكده كل المستهلكين (0 إذا لا يوجد مستهلكون: لا نحذف شيئاً).
+        مستهلك مُعرَّف في OUTBOX_CONSUMER_TOKENS لم يؤكد شيئاً بعد (بلا صف) يُحسب 0: لم يقرأ أي حدث.
+        """
+        acked = dict(OutboxConsumer.objects.values_list('name', 'acked_through'))
+        if any(name not in acked for name in settings.OUTBOX_CONSUMER_TOKENS):
+            return 0
+        return min(acked.values(), default=0)
+
+    @staticmethod
+    def compact(batch_size=5000):
+        """
+        حذف الأحداث المؤكدة من الجميع على دفعات (نطاق مفتاح أساسي لكل دفعة)،
+        حتى لا يقفل حذف ملايين الصفوف الجدول في transaction واحد طويل.
+        """
+        through = OutboxService.compactable_through()
+        deleted = 0
+        while True:
+            ids = list(OutboxEvent.objects.filter(id__lte=through).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            with transaction.atomic():
+                count, _ = OutboxEvent.objects.filter(id__gte=ids[0], id__lte=ids[-1]).delete()
+            deleted += count
@@ -0,0 +1,145 @@
+import os
+import pstats
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import RequestProfile
+
+
+class ProfilerService:
+    """
+    تعريف أداء طلب واحد عند الطلب على بيانات الإنتاج الحقيقية (ProfilerMiddleware):
+    موظف (is_staff) يضيف ?_profile=1 للرابط أو ترويسة X-Profile: 1، فيُشغَّل الـ View تحت cProfile ويُحفظ:
+    - <اسم>.prof: ملف pstats كامل (python -m pstats أو snakeviz).
+    - <اسم>.collapsed: مكدسات مطوية لمخطط اللهب (flamegraph.pl أو speedscope.app).
+    - سجل RequestProfile بالزمن الكلي وزمن المعالج وأثقل استعلامات SQL، يُعرض في لوحة الإدارة.
+    يُحتفظ بآخر PROFILE_KEEP ملفاً فقط.
+    """
+
+    QUERY_PARAM = '_profile'
+    HEADER = 'X-Profile'
+    KINDS = ('prof', 'collapsed')
+    TOP_SQL = 20
+    # الفروع الأقل من هذه النسبة من الزمن الكلي لا تُفرد في المكدسات المطوية (حتى لا يتضخم الملف)
+    MIN_STACK_FRACTION = 0.0005
+    MAX_STACK_DEPTH = 150
+
+    @staticmethod
+    def is_requested(request):
+        if not settings.PROFILING_ENABLED:
+            return False
+        flagged = request.GET.get(ProfilerService.QUERY_PARAM) == '1' or request.headers.get(ProfilerService.HEADER) == '1'
+        # المستخدم يُقرأ فقط عند وجود العلامة: باقي الطلبات لا تلمس الجلسة
+        return flagged and hasattr(request, 'user') and request.user.is_staff
+
+    @staticmethod
+    def path(profile, kind):
+        if kind not in ProfilerService.KINDS:
+            raise ValueError(f"نوع ملف غير معروف: {kind}")
+        return os.path.join(settings.PROFILE_DIR, f"{profile.file_name}.{kind}")
+
+    # --- أولاً: الحفظ ---
+
+    @staticmethod
+    def save(request, response, view_name, profiler, recorder, wall, cpu):
+        profile = RequestProfile(
+            view=view_name[:200],
+            method=request.method,
+            path=request.path[:500],
+            query_string=request.META.get('QUERY_STRING', ''),
+            status_code=response.status_code,
+            wall_ms=round(wall * 1000, 2),
+            cpu_ms=round(cpu * 1000, 2),
+            queries=recorder.count,
+            db_ms=round(recorder.duration * 1000, 2),
+            sql=[
+                {'fingerprint': fingerprint, 'count': count, 'ms': round(duration * 1000, 2), 'sql': sql}
+                for fingerprint, count, duration, sql in recorder.slowest()[:ProfilerService.TOP_SQL]
+            ],
+            username=request.user.get_username(),
+            file_name=f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}",
+        )
+
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        stats = pstats.Stats(profiler)
+        stats.dump_stats(ProfilerService.path(profile, 'prof'))
+        with open(ProfilerService.path(profile, 'collapsed'), 'w', encoding='utf-8') as f:
+            for stack, seconds in sorted(ProfilerService.collapsed_stacks(stats).items()):
+                micros = round(seconds * 1_000_000)
+                if micros:
+                    f.write(f"{stack} {micros}\n")
+
+        profile.save()
+        ProfilerService.prune()
+        return profile
+
+    @staticmethod
+    def collapsed_stacks(stats):
+        """
+        {"frame;frame;frame": ثوانٍ} من رسم الاستدعاءات في cProfile.
+        cProfile يحفظ الزمن لكل حافة (مستدعي -> مستدعى) وليس لكل مكدس كامل، فزمن الدالة يُوزع على
+        مساراتها بنسبة زمن كل حافة: دقيق عندما تُستدعى الدالة من مسار واحد، وتقريب جيد لمخطط اللهب غير ذلك.
+        """
+        rows = stats.stats
+        callees = defaultdict(dict)
+        for func, (_, _, _, _, callers) in rows.items():
+            for caller, edge in callers.items():
+                callees[caller][func] = edge
+
+        roots = [func for func, row in rows.items() if not any(caller in rows for caller in row[4])]
+        threshold = sum(rows[func][3] for func in roots) * ProfilerService.MIN_STACK_FRACTION
+        stacks = Counter()
+
+        def walk(func, budget, path, active):
+            _, _, own_time, cumulative, _ = rows[func]
+            scale = budget / cumulative if cumulative else 0.0
+            path = path + (ProfilerService._label(func),)
+            stacks[';'.join(path)] += own_time * scale
+            if len(path) >= ProfilerService.MAX_STACK_DEPTH:
+                return
+            active = active | {func}
+            for callee, (_, _, _, edge_cumulative) in callees[func].items():
+                share = edge_cumulative * scale
+                # الاستدعاء الذاتي (recursion) يبقى في نفس الإطار بدلاً من تكرار المسار بلا نهاية
+                if callee not in active and share >= threshold:
+                    walk(callee, share, path, active)
+
+        for root in roots:
+            walk(root, rows[root][3], (), frozenset())
+        return stacks
+
+    @staticmethod
+    def _label(func):
+        filename, lineno, name = func
+        if filename == '~':  # دالة مدمجة: "<built-in method time.sleep>"
+            return name.replace(';', ',')
+        base = str(settings.BASE_DIR)
+        if filename.startswith(base):
+            filename = os.path.relpath(filename, base)
+        else:
+            filename = os.path.join(*filename.split(os.sep)[-2:])
+        return f"{name} ({filename}:{lineno})".replace(';', ',')
+
+    # --- ثانياً: الحذف ---
+
+    @staticmethod
+    def prune(keep=None):
+        """حذف الأقدم بعد آخر PROFILE_KEEP ملفاً (السجل والملفات)"""
+        keep = settings.PROFILE_KEEP if keep is None else keep
+        stale = RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)[keep:]
+        ProfilerService.delete(RequestProfile.objects.filter(id__in=list(stale)))
+
+    @staticmethod
+    def delete(profiles):
+        profiles = list(profiles)
+        for profile in profiles:
+            for kind in ProfilerService.KINDS:
+                try:
+                    os.remove(ProfilerService.path(profile, kind))
+                except FileNotFoundError:
+                    pass
+        RequestProfile.objects.filter(id__in=[profile.id for profile in profiles]).delete()
+        return len(profiles)
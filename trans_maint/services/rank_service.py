@@ -1,15 +1,26 @@
 from django.shortcuts import get_object_or_404
 from ..models import MilitaryRank, Employee
 from django.db import transaction
+from django.db.models import Count
+from .metrics_service import instrumented
+from .request_cache import request_memoized
+from .reference_data_service import ReferenceDataService
 
+@instrumented
 class RankService:
     
     @staticmethod
     def list_ranks():
-        """عرض كافة الرتب المتاحة"""
-        return MilitaryRank.objects.all()
+        """عرض كافة الرتب المتاحة (tuple من RankRef مرتبة بالاسم، من ذاكرة البيانات المرجعية)"""
+        return ReferenceDataService.ranks()
 
     @staticmethod
+    def list_ranks_with_employee_counts():
+        """الرتب مع عدد موظفي كل رتبة في استعلام واحد (صفحة الرتب؛ العدد يتغير مع الموظفين فلا يُحفظ في الذاكرة المرجعية)"""
+        return MilitaryRank.objects.annotate(employee_count=Count('employees')).order_by('name')
+
+    @staticmethod
+    @request_memoized(MilitaryRank)
     def get_rank(rank_id):
         """جلب بيانات رتبة معينة"""
         return get_object_or_404(MilitaryRank, id=rank_id)
@@ -0,0 +1,117 @@
+import bisect
+import threading
+from collections import namedtuple
+from operator import attrgetter
+
+from ..models import MilitaryRank, Workshop, Vehicle
+from .data_version_service import DataVersionService
+from .metrics_service import instrumented
+
+# صفوف مضغوطة (namedtuple) بدلاً من كائنات الموديل: ذاكرة أقل، وتُقرأ في القوالب بنفس الأسماء
+RankRef = namedtuple('RankRef', ('id', 'name', 'default_weekly_quota', 'default_monthly_quota'))
+WorkshopRef = namedtuple('WorkshopRef', ('id', 'name', 'address', 'phone'))
+VehicleRef = namedtuple('VehicleRef', ('id', 'plate_number', 'model', 'status'))
+
+
+class ReferenceDataset:
+    """الصفوف مرتبة حسب مفتاح البحث + نسخة من المفاتيح للبحث الثنائي بالبادئة + فهرس بالـ id"""
+
+    def __init__(self, rows, key):
+        self.rows = tuple(sorted(rows, key=attrgetter(key)))
+        self.keys = tuple(getattr(row, key) for row in self.rows)
+        self.by_id = {row.id: row for row in self.rows}
+
+    def prefix(self, term):
+        """كل الصفوف التي يبدأ مفتاحها بـ term، بالترتيب (بحث ثنائي بدلاً من المرور على الكل)"""
+        start = bisect.bisect_left(self.keys, term)
+        for index in range(start, len(self.rows)):
+            if not self.keys[index].startswith(term):
+                break
+            yield self.rows[index]
+
+
+@instrumented
+class ReferenceDataService:
+    """
+    ذاكرة داخل العملية للبيانات المرجعية التي تُقرأ في أغلب الصفحات وتتغير نادراً (الرتب، الورش، المركبات).
+    كل مجموعة موسومة بإصدار جدولها في DataVersionService (ملف mmap مشترك بين كل عمال gunicorn على الخادم):
+    أي إنشاء/تعديل/حذف عبر الخدمات أو لوحة الإدارة يزيد الإصدار (signals) فيعيد كل عامل التحميل عند أول قراءة.
+    القراءة أثناء ثبات البيانات = مقارنة عداد واحد، بدون أي استعلام.
+    """
+
+    _lock = threading.Lock()
+    _entries = {}
+
+    @staticmethod
+    def _get(name, model, row_type, key, queryset):
+        # الإصدار يُقرأ قبل التحميل: كتابة أثناء التحميل تجعل النسخة قديمة فوراً فتُعاد في القراءة التالية
+        versions = DataVersionService.get_versions(model)
+        entry = ReferenceDataService._entries.get(name)
+        if entry is not None and entry[0] == versions:
+            return entry[1]
+
+        dataset = ReferenceDataset((row_type._make(values) for values in queryset.values_list(*row_type._fields)), key)
+        with ReferenceDataService._lock:
+            ReferenceDataService._entries[name] = (versions, dataset)
+        return dataset
+
+    @staticmethod
+    def clear():
+        with ReferenceDataService._lock:
+            ReferenceDataService._entries.clear()
+
+    # --- أولاً: المجموعات ---
+
+    @staticmethod
+    def ranks():
+        return ReferenceDataService._get('ranks', MilitaryRank, RankRef, 'name', MilitaryRank.objects.all()).rows
+
+    @staticmethod
+    def workshops():
+        return ReferenceDataService._workshops().rows
+
+    @staticmethod
+    def vehicles():
+        return ReferenceDataService._vehicles().rows
+
+    @staticmethod
+    def active_vehicles():
+        return tuple(vehicle for vehicle in ReferenceDataService.vehicles() if vehicle.status == 'active')
+
+    @staticmethod
+    def _workshops():
+        return ReferenceDataService._get('workshops', Workshop, WorkshopRef, 'name', Workshop.objects.all())
+
+    @staticmethod
+    def _vehicles():
+        return ReferenceDataService._get('vehicles', Vehicle, VehicleRef, 'plate_number', Vehicle.objects.all())
+
+    # --- ثانياً: البحث (للإكمال التلقائي) ---
+
+    @staticmethod
+    def search_workshops(term='', limit=None):
+        return ReferenceDataService._take(ReferenceDataService._workshops().prefix(term), limit)
+
+    @staticmethod
+    def search_vehicles(term='', predicate=None, limit=None):
+        rows = ReferenceDataService._vehicles().prefix(term)
+        if predicate is not None:
+            rows = (row for row in rows if predicate(row))
+        return ReferenceDataService._take(rows, limit)
+
+    @staticmethod
+    def get_workshop(workshop_id):
+        return ReferenceDataService._workshops().by_id.get(workshop_id)
+
+    @staticmethod
+    def get_vehicle(vehicle_id):
+        return ReferenceDataService._vehicles().by_id.get(vehicle_id)
+
+    @staticmethod
+    def _take(rows, limit):
+        result = []
+        for row in rows:
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(row)
+        return result
@@ -0,0 +1,110 @@
+import datetime
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from ..db_router import REPLICA_ALIAS, current_read_alias
+from .async_utils import materialize
+from .data_version_service import DataVersionService
+
+
+class ReportCache:
+    """
+    ذاكرة مؤقتة داخل العملية لنتائج التقارير التجميعية.
+    المفتاح = (اسم التقرير + المعايير الموحدة)، والقيمة موسومة بإصدارات الجداول التي يقرأها التقرير؛
+    عند أي كتابة على أحد هذه الجداول يتغير الإصدار فتُرفض النتيجة ويُعاد الحساب.
+    """
+
+    _lock = threading.Lock()
+    _entries = OrderedDict()
+    # أول مرة رأت فيها هذه العملية كل مجموعة إصدارات (لمعرفة هل الكتابة حديثة)
+    _versions_seen = OrderedDict()
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def normalize(value):
+        """توحيد المعايير: '' و None متساويان، والتواريخ والأرقام تُقارن كنصوص"""
+        if value in (None, ''):
+            return None
+        if isinstance(value, dict):
+            return tuple(sorted((k, ReportCache.normalize(v)) for k, v in value.items()))
+        if isinstance(value, (list, tuple)):
+            return tuple(ReportCache.normalize(v) for v in value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        return str(value).strip()
+
+    @staticmethod
+    def get(key, versions):
+        with ReportCache._lock:
+            entry = ReportCache._entries.get(key)
+            if entry is not None and entry[0] == versions and (entry[2] is None or entry[2] > time.monotonic()):
+                ReportCache._entries.move_to_end(key)
+                ReportCache.hits += 1
+                return True, entry[1]
+            ReportCache.misses += 1
+            return False, None
+
+    @staticmethod
+    def set(key, versions, value, ttl=None):
+        with ReportCache._lock:
+            ReportCache._entries[key] = (versions, value, time.monotonic() + ttl if ttl else None)
+            ReportCache._entries.move_to_end(key)
+            while len(ReportCache._entries) > settings.REPORT_CACHE_MAX_ENTRIES:
+                ReportCache._entries.popitem(last=False)
+
+    @staticmethod
+    def versions_age(versions):
+        """الثواني منذ أن رأت هذه العملية مجموعة الإصدارات أول مرة (0 إذا كانت جديدة الآن)"""
+        now = time.monotonic()
+        with ReportCache._lock:
+            first_seen = ReportCache._versions_seen.setdefault(versions, now)
+            ReportCache._versions_seen.move_to_end(versions)
+            while len(ReportCache._versions_seen) > settings.REPORT_CACHE_MAX_ENTRIES:
+                ReportCache._versions_seen.popitem(last=False)
+        return now - first_seen
+
+    @staticmethod
+    def clear():
+        with ReportCache._lock:
+            ReportCache._entries.clear()
+
+
+def cached_report(*models):
+    """
+    مزخرف (decorator) لدوال ReportService التي تعيد نتائج تجميعية (dict/list).
+    models: الجداول التي يقرأها التقرير، ويُعاد الحساب عند تغير إصدار أيٍّ منها.
+    النتيجة المُعادة مشتركة بين الطلبات: تُعامل للقراءة فقط.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__qualname__, ReportCache.normalize(bound.arguments))
+
+            # نقرأ الإصدارات قبل الحساب: أي كتابة أثناء الحساب تجعل النتيجة قديمة فوراً
+            versions = DataVersionService.get_versions(*models)
+            found, value = ReportCache.get(key, versions)
+            if found:
+                return value
+
+            value = materialize(func(*args, **kwargs))
+            # النسخة المقروءة قد لا تكون وصلتها الكتابة التي غيّرت الإصدار بعد؛
+            # النتيجة المحسوبة منها بعد كتابة حديثة تُحفظ لمدة قصيرة فقط بدلاً من حتى الكتابة التالية
+            ttl = None
+            if current_read_alias() == REPLICA_ALIAS and ReportCache.versions_age(versions) < settings.REPLICA_PIN_SECONDS:
+                ttl = settings.REPLICA_PIN_SECONDS
+            ReportCache.set(key, versions, value, ttl)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+import csv
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from ..models import ReportJob
+from .memory_service import MemoryService
+from .metrics_service import instrumented
+from .report_service import ReportService
+
+
+@instrumented
+class ReportJobService:
+    """
+    تشغيل التقارير الثقيلة خارج طلب الويب:
+    الطلب يُسجّل كمهمة في القاعدة، وعامل منفصل (manage.py run_report_worker) ينفذها
+    ويكتب النتيجة كملف CSV على القرص لتحميلها لاحقاً من مركز التقارير.
+    """
+
+    # المعايير المعتمدة لكل نوع تقرير (أي معيار آخر يُهمل قبل حساب البصمة)
+    REPORT_PARAMS = {
+        'fuel': ('start_date', 'end_date', 'employee', 'vehicle'),
+        'trips': ('start_date', 'end_date'),
+        'accidents': ('start_date', 'end_date'),
+        'maintenance': ('start_date', 'end_date'),
+        'over_consumption': (),
+        'unused_quota': ('inactive_days',),
+    }
+    PROGRESS_EVERY_ROWS = 1000
+
+    # --- أولاً: تسجيل المهام وإعادة الاستخدام (Submit & Reuse) ---
+
+    @staticmethod
+    def normalize_params(report_type, params):
+        """الاحتفاظ بالمعايير المؤثرة فقط وبصيغة ثابتة، حتى تتطابق البصمة للطلبات المتماثلة"""
+        if report_type not in ReportJobService.REPORT_PARAMS:
+            raise ValueError(f"نوع تقرير غير معروف: {report_type}")
+        normalized = {}
+        for key in ReportJobService.REPORT_PARAMS[report_type]:
+            value = params.get(key)
+            if value not in (None, ''):
+                normalized[key] = str(value).strip()
+        if 'inactive_days' in normalized:
+            low, high = ReportService.QuotaReports.INACTIVE_DAYS_RANGE
+            if not normalized['inactive_days'].isdigit() or not low <= int(normalized['inactive_days']) <= high:
+                raise ValueError(f"فترة عدم النشاط يجب أن تكون عدداً صحيحاً من الأيام بين {low} و {high}.")
+        try:
+            # نفس التحويل الذي يستخدمه العامل: التاريخ الخاطئ يُرفض الآن بدلاً من فشل المهمة لاحقاً
+            ReportService._parse_dates(normalized.get('start_date'), normalized.get('end_date'))
+        except ValueError:
+            raise ValueError("التاريخ يجب أن يكون بصيغة YYYY-MM-DD.") from None
+        return normalized
+
+    @staticmethod
+    def compute_params_hash(report_type, params):
+        payload = json.dumps([report_type, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def submit_job(report_type, params):
+        """
+        إرجاع مهمة قائمة بنفس المعايير إن وُجدت (قيد الانتظار/التنفيذ، أو مكتملة داخل مدة الصلاحية)،
+        وإلا إنشاء مهمة جديدة. يعيد (المهمة، هل أُعيد استخدامها).
+        """
+        params = ReportJobService.normalize_params(report_type, params)
+        params_hash = ReportJobService.compute_params_hash(report_type, params)
+
+        in_flight = ReportJob.objects.filter(
+            params_hash=params_hash, status__in=['queued', 'running']
+        ).order_by('-created_at').first()
+        if in_flight:
+            return in_flight, True
+
+        ttl_start = timezone.now() - timezone.timedelta(minutes=settings.REPORT_JOB_TTL_MINUTES)
+        finished = ReportJob.objects.filter(
+            params_hash=params_hash, status='done', finished_at__gte=ttl_start
+        ).order_by('-created_at').first()
+        if finished and os.path.exists(ReportJobService.get_result_path(finished)):
+            return finished, True
+
+        job = ReportJob.objects.create(report_type=report_type, params=params, params_hash=params_hash)
+        return job, False
+
+    @staticmethod
+    def get_job(job_id):
+        return get_object_or_404(ReportJob, id=job_id)
+
+    @staticmethod
+    def list_recent_jobs(limit=10):
+        return ReportJob.objects.order_by('-created_at')[:limit]
+
+    @staticmethod
+    def get_result_path(job):
+        return os.path.join(settings.REPORT_JOBS_DIR, job.result_file or f"report_{job.id}.csv")
+
+    # --- ثانياً: التنفيذ (Worker Side) ---
+
+    @staticmethod
+    def claim_next_job():
+        """
+        حجز أقدم مهمة منتظرة بتحديث شرطي (status='queued')؛
+        إذا سبقنا عامل آخر تعود 0 صفوف فننتقل للمرشح التالي. يعمل على كل قواعد البيانات.
+        """
+        candidates = ReportJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True)[:5]
+        for job_id in candidates:
+            claimed = ReportJob.objects.filter(id=job_id, status='queued').update(
+                status='running', started_at=timezone.now(), progress=0
+            )
+            if claimed:
+                return job_id
+        return None
+
+    @staticmethod
+    def requeue_stale_jobs(minutes):
+        """إعادة المهام العالقة (عامل توقف أثناء التنفيذ) إلى الانتظار"""
+        stale_before = timezone.now() - timezone.timedelta(minutes=minutes)
+        return ReportJob.objects.filter(status='running', started_at__lt=stale_before).update(status='queued')
+
+    @staticmethod
+    def run_job(job_id):
+        job = ReportJob.objects.get(id=job_id)
+        job.result_file = f"report_{job.id}.csv"
+        path = ReportJobService.get_result_path(job)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            with MemoryService.track(f"trans_maint.ReportJobService.run_job[{job.report_type}]", job.params):
+                columns, rows, total = ReportJobService.build_rows(job.report_type, job.params)
+                written = 0
+                # utf-8-sig ليفتح Excel الملف العربي بشكل صحيح
+                with open(path + '.part', 'w', newline='', encoding='utf-8-sig') as fh:
+                    writer = csv.writer(fh)
+                    writer.writerow(columns)
+                    for row in rows:
+                        writer.writerow(row)
+                        written += 1
+                        if written % ReportJobService.PROGRESS_EVERY_ROWS == 0:
+                            MemoryService.checkpoint()
+                            if total:
+                                ReportJob.objects.filter(id=job.id).update(progress=min(99, written * 100 // total))
+                os.replace(path + '.part', path)
+
+            ReportJob.objects.filter(id=job.id).update(
+                status='done', progress=100, row_count=written,
+                result_file=job.result_file, finished_at=timezone.now(),
+            )
+        except Exception as e:
+            ReportJob.objects.filter(id=job.id).update(
+                status='failed', error=str(e), finished_at=timezone.now()
+            )
+            raise
+
+    @staticmethod
+    def build_rows(report_type, params):
+        """تحويل نتيجة ReportService إلى (أعمدة، صفوف، العدد الكلي) للكتابة المتدفقة"""
+        start_date, end_date = params.get('start_date'), params.get('end_date')
+
+        if report_type == 'fuel':
+            queryset = ReportService.FuelReports.get_detailed_consumption_report(
+                start_date, end_date, params.get('employee'), params.get('vehicle')
+            ).order_by('-date').values_list('date', 'employee__name', 'vehicle__plate_number', 'quantity', 'notes')
+            return ['التاريخ', 'الموظف', 'المركبة', 'الكمية', 'السبب'], queryset.iterator(chunk_size=2000), queryset.count()
+
+        if report_type == 'maintenance':
+            queryset = ReportService.AssetReports.get_open_maintenance_report(start_date, end_date).values_list(
+                'vehicle__plate_number', 'workshop__name', 'date_reported', 'date_completed', 'status'
+            )
+            return ['المركبة', 'الورشة', 'تاريخ الإبلاغ', 'تاريخ الإكمال', 'الحالة'], queryset.iterator(chunk_size=2000), queryset.count()
+
+        if report_type == 'unused_quota':
+            queryset = ReportService.QuotaReports.get_unused_quota_report(int(params.get('inactive_days') or 90)).order_by('last_issue_at', 'id')
+            rows = (
+                (r['name'], r['rank__name'], r['last_issue_at'], r['last_addition_at'], round(r['unused_liters'], 2))
+                for r in queryset.iterator(chunk_size=2000)
+            )
+            return ['الموظف', 'الرتبة', 'آخر صرف', 'آخر إضافة', 'الرصيد غير المستخدم'], rows, queryset.count()
+
+        if report_type == 'over_consumption':
+            queryset = ReportService.QuotaReports.get_over_consumption_report(threshold_percent=90)
+            rows = (
+                (r['name'], r['rank__name'], round(r['consumption_pct'], 2), round(r['remaining'], 2))
+                for r in queryset.iterator(chunk_size=2000)
+            )
+            return ['الموظف', 'الرتبة', 'نسبة الاستهلاك', 'الرصيد المتبقي'], rows, queryset.count()
+
+        if report_type == 'trips':
+            stats = ReportService.TripReports.get_trip_statistics(start_date, end_date)
+            rows = [('إجمالي الماموريات', stats['total_trips']), ('متوسط الماموريات/مركبة', stats['avg_trips_per_vehicle'])]
+            rows += [(f"وجهة: {d['area'] or 'غير محدد'}", d['count']) for d in stats['top_destinations']]
+            return ['المؤشر', 'القيمة'], rows, len(rows)
+
+        if report_type == 'accidents':
+            summary = ReportService.AssetReports.get_accident_cost_summary(start_date, end_date)
+            rows = [('عدد الحوادث', summary['accident_count']), ('إجمالي الخسائر', summary['total_cost'] or 0)]
+            return ['المؤشر', 'القيمة'], rows, len(rows)
+
+        raise ValueError(f"نوع تقرير غير معروف: {report_type}")
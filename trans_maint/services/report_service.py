@@ -1,9 +1,37 @@
-from django.db.models import Sum, Count, Avg, Q
+from django.db import connections
+from django.db.models import Sum, Count, Avg, Q, F, Case, When, Value, FloatField, OuterRef, Subquery, Aggregate, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.timezone import make_aware
 from datetime import datetime
-from ..models import Employee, Vehicle, Trip, Accident, MaintenanceRequest, FuelTransaction
+from ..models import MilitaryRank, Employee, Vehicle, Trip, Accident, MaintenanceRequest, FuelTransaction
+from ..db_router import reads_from_replica
+from .async_utils import run_db_call
+from .metrics_service import instrumented
+from .report_cache import cached_report
 
+class PercentileCont(Aggregate):
+    """percentile_cont(fraction) WITHIN GROUP (ORDER BY ...) - متاحة على PostgreSQL فقط"""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def percentile_cont(sorted_values, fraction):
+    """نفس حساب percentile_cont (استيفاء خطي) على قائمة مرتبة تصاعدياً"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+@instrumented
+@reads_from_replica
 class ReportService:
 
     @staticmethod
@@ -20,6 +48,7 @@ class ReportService:
     # 1️⃣ Fuel Report Service: تحليل الطاقة والموارد
     class FuelReports:
         @staticmethod
+        @cached_report(FuelTransaction, Employee, Vehicle)
         def get_consumption_summary(filters=None):
             """تحليل استهلاك الوقود العام حسب الموظف أو المركبة"""
             queryset = FuelTransaction.objects.filter(transaction_type='issue')
@@ -32,6 +61,7 @@ class ReportService:
             return {"by_employee": by_employee, "by_vehicle": by_vehicle}
 
         @staticmethod
+        @cached_report(FuelTransaction)
         def get_monthly_summary(year, month):
             """تقرير المطابقة الشهري"""
             return FuelTransaction.objects.filter(
@@ -60,6 +90,7 @@ class ReportService:
     # 2️⃣ Trip Report Service: تحليل النشاط الميداني
     class TripReports:
         @staticmethod
+        @cached_report(Trip, Vehicle)
         def get_trip_statistics(start_date, end_date):
             start, end = ReportService._parse_dates(start_date, end_date)
             
@@ -79,6 +110,7 @@ class ReportService:
     # 3️⃣ Accident & Maintenance Reports: تحليل جودة الأصول والخسائر
     class AssetReports:
         @staticmethod
+        @cached_report(Accident)
         def get_accident_cost_summary(start_date, end_date):
             start, end = ReportService._parse_dates(start_date, end_date)
             
@@ -91,6 +123,10 @@ class ReportService:
                 accident_count=Count('id')
             )
 
+        @staticmethod
+        async def aget_accident_cost_summary(start_date, end_date):
+            return await run_db_call(ReportService.AssetReports.get_accident_cost_summary, start_date, end_date)
+
         @staticmethod
         def get_open_maintenance_report(start_date=None, end_date=None):
             """تقرير المتابعة والضغط على الورش مع دعم الفلترة الزمنية"""
@@ -109,38 +145,92 @@ class ReportService:
         
     # 4️⃣ Quota Report Service: الرقابة والامتثال
     class QuotaReports:
+        # النسب المئوية المعروضة في توزيع الاستهلاك لكل رتبة
+        DISTRIBUTION_PERCENTILES = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+        # حدود فترة عدم النشاط بالأيام (قيمة ضخمة تُسقط timedelta بـ OverflowError)
+        INACTIVE_DAYS_RANGE = (1, 3650)
+
         @staticmethod
-        def get_over_consumption_report(threshold_percent=90):
-            """نسخة محسنة جداً للأداء (بدون حلقات تكرارية بطيئة)"""
-            # نجلب استهلاك كل موظف وإجمالي الإضافات في طلب واحد (Query)
-            employees = Employee.objects.filter(is_active=True).annotate(
-                total_added=Sum('fueltransaction__quantity', filter=Q(fueltransaction__transaction_type='addition')),
-                total_issued=Sum('fueltransaction__quantity', filter=Q(fueltransaction__transaction_type='issue'))
+        def _consumption_queryset():
+            """
+            الموظفون النشطون مع إجمالي الإضافات والصرف ونسبة الاستهلاك محسوبة في SQL.
+            الإجماليات عبر Subquery (وليس JOIN + GROUP BY) حتى يمكن الفلترة والترتيب والتجميع فوقها.
+            """
+            def ledger_total(transaction_type):
+                return Coalesce(Subquery(
+                    FuelTransaction.objects.filter(employee_id=OuterRef('pk'), transaction_type=transaction_type)
+                    .order_by().values('employee_id').annotate(total=Sum('quantity')).values('total'),
+                    output_field=FloatField(),
+                ), Value(0.0))
+
+            return Employee.objects.filter(is_active=True).annotate(
+                total_added=ledger_total('addition'),
+                total_issued=ledger_total('issue'),
+            ).filter(total_added__gt=0).annotate(
+                consumption_pct=ExpressionWrapper(F('total_issued') * 100.0 / F('total_added'), output_field=FloatField()),
+                remaining=ExpressionWrapper(F('total_added') - F('total_issued'), output_field=FloatField()),
             )
-            
-            over_list = []
-            for emp in employees:
-                added = emp.total_added or 0
-                issued = emp.total_issued or 0
-                
-                if added > 0:
-                    consumption_pct = (issued / added) * 100
-                    if consumption_pct >= threshold_percent:
-                        over_list.append({
-                            "employee": emp.name,
-                            "consumption_pct": round(consumption_pct, 2),
-                            "remaining": round(added - issued, 2)
-                        })
-            return over_list
 
         @staticmethod
-        def get_unused_quota_report():
-            """تقرير توفير الموارد: الموظفون الذين لا يستهلكون حصصهم"""
-            # الموظفون الذين لديهم رصيد عالي ولم يجروا عمليات صرف (issue) مؤخراً
-            three_months_ago = timezone.now() - timezone.timedelta(days=90)
-            active_spenders = FuelTransaction.objects.filter(
-                transaction_type='issue', 
-                date__gte=three_months_ago
-            ).values_list('employee_id', flat=True)
-            
-            return Employee.objects.exclude(id__in=active_spenders).values('name', 'rank__name')
\ No newline at end of file
+        def get_over_consumption_report(threshold_percent=90):
+            """
+            الموظفون الذين استهلكوا threshold_percent% أو أكثر من رصيدهم المضاف، الأعلى استهلاكاً أولاً.
+            يعيد QuerySet (الحساب والفلترة والترتيب في القاعدة) ليُقسم لصفحات مثل باقي التقارير.
+            """
+            return ReportService.QuotaReports._consumption_queryset().filter(
+                consumption_pct__gte=threshold_percent
+            ).values(
+                'id', 'name', 'rank__name', 'total_added', 'total_issued', 'consumption_pct', 'remaining'
+            ).order_by('-consumption_pct', 'id')
+
+        @staticmethod
+        @cached_report(Employee, FuelTransaction, MilitaryRank)
+        def get_consumption_distribution():
+            """
+            توزيع نسبة الاستهلاك داخل كل رتبة (p50 / p90 / p99) في استعلام واحد:
+            على PostgreSQL بـ percentile_cont، وعلى غيرها نجلب النسب مرتبة ونحسب نفس الاستيفاء في Python.
+            استعلام منفصل عن get_over_consumption_report (يمر على كل الموظفين لا على المتجاوزين فقط)،
+            لذلك يُخزن مؤقتاً حتى تتغير الجداول، ويُعرض أسفل تقرير تجاوز الحصة فقط.
+            """
+            percentiles = ReportService.QuotaReports.DISTRIBUTION_PERCENTILES
+            queryset = ReportService.QuotaReports._consumption_queryset()
+
+            if connections[queryset.db].vendor == 'postgresql':
+                return list(queryset.values('rank__name').annotate(
+                    employees=Count('id'),
+                    **{name: PercentileCont('consumption_pct', fraction) for name, fraction in percentiles}
+                ).order_by('rank__name'))
+
+            by_rank = {}
+            for rank_name, pct in queryset.order_by('rank__name', 'consumption_pct').values_list('rank__name', 'consumption_pct'):
+                by_rank.setdefault(rank_name, []).append(pct)
+            return [
+                dict(
+                    {'rank__name': rank_name, 'employees': len(values)},
+                    **{name: percentile_cont(values, fraction) for name, fraction in percentiles}
+                )
+                for rank_name, values in by_rank.items()
+            ]
+
+        @staticmethod
+        def get_unused_quota_report(inactive_days=90):
+            """
+            تقرير توفير الموارد: الموظفون الذين لم يجروا عمليات صرف (issue) خلال آخر inactive_days يوماً.
+            يعتمد على حقل last_issue_at المفهرس (فلتر نطاق) بدلاً من NOT IN على كامل سجل الحركات،
+            والرصيد غير المستخدم يُحسب بـ Subquery للموظفين الظاهرين في الصفحة فقط.
+            """
+            cutoff = timezone.now() - timezone.timedelta(days=int(inactive_days))
+            unused_liters = FuelTransaction.objects.filter(employee_id=OuterRef('pk')).order_by().values('employee_id').annotate(
+                balance=Sum(Case(
+                    When(transaction_type='addition', then=F('quantity')),
+                    When(transaction_type='issue', then=-F('quantity')),
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                ))
+            ).values('balance')
+
+            return Employee.objects.filter(
+                Q(last_issue_at__isnull=True) | Q(last_issue_at__lt=cutoff)
+            ).annotate(
+                unused_liters=Coalesce(Subquery(unused_liters, output_field=FloatField()), Value(0.0))
+            ).values('id', 'name', 'rank__name', 'last_issue_at', 'last_addition_at', 'unused_liters')
\ No newline at end of file
@@ -0,0 +1,84 @@
+import contextvars
+import functools
+import inspect
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+from .report_cache import ReportCache
+
+
+class RequestScope:
+    def __init__(self):
+        # المفتاح -> (الجداول التي تعتمد عليها النتيجة، النتيجة)
+        self.entries = {}
+        self.suspended = False
+        self.hits = 0
+
+
+_scope = contextvars.ContextVar('request_cache_scope', default=None)
+
+
+class RequestCache:
+    """
+    خريطة هوية (Identity Map) وذاكرة نتائج لطلب واحد فقط:
+    نفس get_employee(5) أو نفس تجميع الرصيد داخل الطلب يُنفذ مرة واحدة ويعيد نفس الكائن.
+    - النطاق يُفتح لكل طلب في RequestCacheMiddleware ويُمسح بنهايته؛ خارج أي نطاق الدوال تعمل كما هي.
+    - أي كتابة على جدول (signals أو التحديثات المباشرة في الخدمات) تحذف النتائج المعتمدة عليه.
+    - كتابة داخل transaction لم يُثبت بعد توقف الذاكرة حتى الـ commit:
+      لو أُلغي الـ transaction قد تكون النتائج المقروءة بعده مبنية على بيانات لم تعد موجودة.
+    """
+
+    @staticmethod
+    @contextmanager
+    def scope():
+        token = _scope.set(RequestScope())
+        try:
+            yield _scope.get()
+        finally:
+            _scope.reset(token)
+
+    @staticmethod
+    def invalidate(*models):
+        scope = _scope.get()
+        if scope is None:
+            return
+        tables = {model._meta.db_table for model in models}
+        for key in [key for key, (depends_on, _) in scope.entries.items() if depends_on & tables]:
+            scope.entries.pop(key, None)
+
+        if connection.in_atomic_block and not scope.suspended:
+            scope.suspended = True
+            transaction.on_commit(lambda: setattr(scope, 'suspended', False))
+
+
+def request_memoized(*models):
+    """
+    مزخرف لدوال get_* والتجميعات في الخدمات. models: الجداول التي تقرأها الدالة.
+    النتيجة مشتركة داخل الطلب (نفس الكائن)، فتعديلها ثم save() يعدّل ما يراه باقي الطلب أيضاً.
+    """
+    tables = frozenset(model._meta.db_table for model in models)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            scope = _scope.get()
+            if scope is None or scope.suspended:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__qualname__, ReportCache.normalize(bound.arguments))
+            entry = scope.entries.get(key)
+            if entry is not None:
+                scope.hits += 1
+                return entry[1]
+
+            value = func(*args, **kwargs)
+            scope.entries[key] = (tables, value)
+            return value
+
+        return wrapper
+    return decorator
@@ -2,13 +2,31 @@ from django.db import transaction
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
-from ..models import Trip
+from ..models import Trip, Employee, Vehicle, FuelTransaction
 from .fuel_service import FuelService
+from .metrics_service import instrumented
 from .vehicle_service import VehicleService
+from .outbox_service import OutboxService
+from .request_cache import request_memoized
 
+@instrumented
 class TripService:
 
     @staticmethod
+    def outbox_payload(trip):
+        """بيانات الرحلة كما تراها الأنظمة الخارجية (صندوق الصادر)"""
+        return {
+            'employee_id': trip.employee_id,
+            'vehicle_id': trip.vehicle_id,
+            'trip_type': trip.trip_type,
+            'area': trip.area,
+            'start_date': trip.start_date,
+            'end_date': trip.end_date,
+            'fuel_quota_granted': trip.fuel_quota_granted,
+        }
+
+    @staticmethod
+    @request_memoized(Trip, Employee, Vehicle)
     def get_trip(trip_id):
         """جلب بيانات الرحلة مع تفاصيل الموظف والمركبة"""
         return get_object_or_404(Trip.objects.select_related('employee', 'vehicle'), id=trip_id)
@@ -46,6 +64,7 @@ class TripService:
         with transaction.atomic():
             # إنشاء سجل الرحلة
             trip = Trip.objects.create(**data)
+            OutboxService.append('trip.started', trip.id, TripService.outbox_payload(trip))
             
             # إذا كانت هناك حصة وقود ممنوحة للرحلة، يتم إضافتها كمحفظة وقود فوراً
             if trip.fuel_quota_granted > 0:
@@ -56,7 +75,6 @@ class TripService:
                     trip=trip, # ربط المعاملة بالرحلة مباشرة
                     notes=f"دعم وقود تلقائي لرحلة {trip.area}"
                 )
-            
             return trip
 
     @staticmethod
@@ -65,14 +83,24 @@ class TripService:
         trip = TripService.get_trip(trip_id)
         for key, value in data.items():
             setattr(trip, key, value)
-        trip.save()
+        with transaction.atomic(savepoint=False):
+            trip.save()
+            OutboxService.append('trip.updated', trip.id, TripService.outbox_payload(trip))
         return trip
 
     @staticmethod
     def delete_trip(trip_id):
-        """حذف الرحلة (سيتم حذف معاملة الوقود المرتبطة بها تلقائياً بفضل OneToOneField)"""
+        """
+        حذف الرحلة. معاملة الوقود المرتبطة تبقى في السجل ويُفصل ربطها (SET_NULL في الموديل)،
+        وهذا تحديث مباشر لا يمر بـ save()، فنضيف حدث fuel.updated لها حتى لا تبقى نسخ الأنظمة الخارجية مرتبطة برحلة محذوفة.
+        """
         trip = TripService.get_trip(trip_id)
-        trip.delete()
+        with transaction.atomic(savepoint=False):
+            fuel_ids = list(FuelTransaction.objects.filter(trip_id=trip.id).values_list('id', flat=True))
+            OutboxService.append('trip.deleted', trip.id, dict(TripService.outbox_payload(trip), fuel_transaction_ids=fuel_ids))
+            trip.delete()
+            for fuel_tx in FuelTransaction.objects.filter(id__in=fuel_ids):
+                OutboxService.append('fuel.updated', fuel_tx.id, FuelService.outbox_payload(fuel_tx))
         return True
 
     @staticmethod
@@ -92,13 +120,15 @@ class TripService:
 
     @staticmethod
     def get_vehicle_trip_history(vehicle_id):
-        """سجل كامل لتحركات المركبة للأرشفة"""
-        return Trip.objects.filter(vehicle_id=vehicle_id).order_by('-start_date')
+        """سجل كامل لتحركات المركبة للأرشفة (مع السائق لتبويب الرحلات)"""
+        return Trip.objects.filter(vehicle_id=vehicle_id).select_related('employee').order_by('-start_date')
 
     @staticmethod
     def end_trip(trip_id):
         """إغلاق الرحلة عند العودة"""
         trip = TripService.get_trip(trip_id)
         trip.end_date = timezone.now()
-        trip.save()
+        with transaction.atomic(savepoint=False):
+            trip.save()
+            OutboxService.append('trip.ended', trip.id, TripService.outbox_payload(trip))
         return trip
\ No newline at end of file
@@ -1,8 +1,13 @@
 from django.shortcuts import get_object_or_404
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from ..models import Vehicle, FuelTransaction, MaintenanceRequest, Accident, Trip
+from ..models import Vehicle, Employee, FuelTransaction, MaintenanceRequest, Accident, Trip
+from .async_utils import run_db_call
+from .metrics_service import instrumented
+from .request_cache import request_memoized
+from .reference_data_service import ReferenceDataService
 
+@instrumented
 class VehicleService:
 
     # --- أولاً: العمليات الأساسية (CRUD) ---
@@ -32,6 +37,7 @@ class VehicleService:
         return True
 
     @staticmethod
+    @request_memoized(Vehicle, Employee)
     def get_vehicle(vehicle_id):
         """جلب بيانات مركبة معينة مع بيانات المالك"""
         return get_object_or_404(Vehicle.objects.select_related('owner'), id=vehicle_id)
@@ -44,9 +50,36 @@ class VehicleService:
             queryset = queryset.filter(**filters)
         return queryset
 
+    @staticmethod
+    def list_active_vehicles():
+        """المركبات النشطة (tuple من VehicleRef مرتبة باللوحة، من ذاكرة البيانات المرجعية)"""
+        return ReferenceDataService.active_vehicles()
+
+    @staticmethod
+    def get_busy_vehicle_ids():
+        """المركبات في رحلة مفتوحة أو صيانة معلقة (نفس شروط check_vehicle_availability) - استعلام واحد"""
+        open_trips = Trip.objects.filter(end_date__isnull=True).values_list('vehicle_id', flat=True)
+        pending = MaintenanceRequest.objects.filter(status='pending').values_list('vehicle_id', flat=True)
+        return frozenset(open_trips.union(pending))
+
+    @staticmethod
+    def search_vehicles(term='', statuses=None, available_only=False, limit=None):
+        """
+        بحث الإكمال التلقائي ببداية رقم اللوحة، في ذاكرة البيانات المرجعية (بدون استعلام).
+        available_only: استبعاد المركبات المشغولة - الرحلات والصيانة تتغير باستمرار فتُقرأ من القاعدة.
+        """
+        statuses = {'active'} if available_only else set(statuses or ())
+        busy = VehicleService.get_busy_vehicle_ids() if available_only else frozenset()
+        return ReferenceDataService.search_vehicles(
+            term,
+            predicate=lambda vehicle: (not statuses or vehicle.status in statuses) and vehicle.id not in busy,
+            limit=limit,
+        )
+
     # --- ثانياً: التحليل التشغيلي والمالي ---
 
     @staticmethod
+    @request_memoized(FuelTransaction)
     def get_vehicle_total_fuel(vehicle_id):
         """إجمالي كمية الوقود التي استهلكتها هذه المركبة تاريخياً"""
         result = FuelTransaction.objects.filter(
@@ -56,6 +89,7 @@ class VehicleService:
         return result['total'] or 0.0
 
     @staticmethod
+    @request_memoized(MaintenanceRequest)
     def get_vehicle_total_maintenance_cost(vehicle_id):
         """إجمالي مبالغ الصيانة المصروفة على المركبة"""
         result = MaintenanceRequest.objects.filter(
@@ -65,16 +99,31 @@ class VehicleService:
         return result['total'] or 0.0
 
     @staticmethod
+    @request_memoized(Accident)
     def get_vehicle_total_accident_cost(vehicle_id):
         """إجمالي تكاليف إصلاح الحوادث المسجلة"""
         result = Accident.objects.filter(vehicle_id=vehicle_id).aggregate(total=Sum('damage_cost'))
         return result['total'] or 0.0
 
     @staticmethod
+    @request_memoized(Trip)
     def get_vehicle_trip_count(vehicle_id):
         """عدد الرحلات التي قامت بها المركبة"""
         return Trip.objects.filter(vehicle_id=vehicle_id).count()
 
+    @staticmethod
+    def get_vehicle_recent_trips(vehicle_id, limit=5):
+        """آخر الرحلات مع بيانات السائق (لتبويب السجل في صفحة التفاصيل)"""
+        return Trip.objects.filter(vehicle_id=vehicle_id).select_related('employee').order_by('-start_date')[:limit]
+
+    @staticmethod
+    def get_vehicle_recent_maintenance(vehicle_id, limit=5):
+        return MaintenanceRequest.objects.filter(vehicle_id=vehicle_id).select_related('workshop').order_by('-date_reported')[:limit]
+
+    @staticmethod
+    def get_vehicle_recent_accidents(vehicle_id, limit=5):
+        return Accident.objects.filter(vehicle_id=vehicle_id).order_by('-date_occurred')[:limit]
+
     # --- ثالثاً: خدمات التحقق (Availability) ---
 
     @staticmethod
@@ -108,4 +157,38 @@ class VehicleService:
         if is_in_trip:
             return False, "المركبة في رحلة عمل حالياً."
 
-        return True, "المركبة جاهزة للاستخدام."
\ No newline at end of file
+        return True, "المركبة جاهزة للاستخدام."
+
+    # --- رابعاً: النسخ غير المتزامنة (Async Variants) للعرض المتوازي ---
+
+    @staticmethod
+    async def aget_vehicle(vehicle_id):
+        return await run_db_call(VehicleService.get_vehicle, vehicle_id)
+
+    @staticmethod
+    async def aget_vehicle_total_fuel(vehicle_id):
+        return await run_db_call(VehicleService.get_vehicle_total_fuel, vehicle_id)
+
+    @staticmethod
+    async def aget_vehicle_total_maintenance_cost(vehicle_id):
+        return await run_db_call(VehicleService.get_vehicle_total_maintenance_cost, vehicle_id)
+
+    @staticmethod
+    async def aget_vehicle_total_accident_cost(vehicle_id):
+        return await run_db_call(VehicleService.get_vehicle_total_accident_cost, vehicle_id)
+
+    @staticmethod
+    async def aget_vehicle_trip_count(vehicle_id):
+        return await run_db_call(VehicleService.get_vehicle_trip_count, vehicle_id)
+
+    @staticmethod
+    async def aget_vehicle_recent_trips(vehicle_id, limit=5):
+        return await run_db_call(VehicleService.get_vehicle_recent_trips, vehicle_id, limit)
+
+    @staticmethod
+    async def aget_vehicle_recent_maintenance(vehicle_id, limit=5):
+        return await run_db_call(VehicleService.get_vehicle_recent_maintenance, vehicle_id, limit)
+
+    @staticmethod
+    async def aget_vehicle_recent_accidents(vehicle_id, limit=5):
+        return await run_db_call(VehicleService.get_vehicle_recent_accidents, vehicle_id, limit)
@@ -1,7 +1,11 @@
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Sum
 from ..models import Workshop, MaintenanceRequest
+from .metrics_service import instrumented
+from .request_cache import request_memoized
+from .reference_data_service import ReferenceDataService
 
+@instrumented
 class WorkshopService:
 
     # --- أولاً: إدارة الموردين (Vendor Management) ---
@@ -31,14 +35,20 @@ class WorkshopService:
         return True
 
     @staticmethod
+    @request_memoized(Workshop)
     def get_workshop(workshop_id):
         """جلب بيانات ورشة محددة"""
         return get_object_or_404(Workshop, id=workshop_id)
 
     @staticmethod
     def list_workshops():
-        """عرض كافة مراكز الخدمة المتعاقد معها"""
-        return Workshop.objects.all()
+        """عرض كافة مراكز الخدمة المتعاقد معها (tuple من WorkshopRef، من ذاكرة البيانات المرجعية)"""
+        return ReferenceDataService.workshops()
+
+    @staticmethod
+    def search_workshops(term='', limit=None):
+        """بحث الإكمال التلقائي ببداية اسم الورشة (في الذاكرة، بدون استعلام)"""
+        return ReferenceDataService.search_workshops(term, limit)
 
     # --- ثانياً: تقييم الأداء (Performance Evaluation) ---
 
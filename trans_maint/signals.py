@@ -0,0 +1,74 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Trip, FuelTransaction, Accident, MaintenanceRequest
+from .services.data_version_service import DataVersionService
+from .services.fleet_analytics_service import FleetAnalyticsService
+from .services.fuel_service import FuelService
+from .services.request_cache import RequestCache
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_data_version(sender, **kwargs):
+    """أي كتابة على جدول متتبَّع (من الخدمات أو لوحة الإدارة) تُبطل النتائج المحفوظة المعتمدة عليه"""
+    if DataVersionService.is_tracked(sender):
+        DataVersionService.bump(sender)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_request_cache(sender, **kwargs):
+    """حذف نتائج الطلب الحالي المعتمدة على الجدول المكتوب (get_* والأرصدة)"""
+    RequestCache.invalidate(sender)
+
+
+# الحقل الزمني الذي يُنسب إليه كل سجل في جدول الحقائق اليومي
+FACT_DATE_FIELDS = {
+    Trip: 'start_date',
+    FuelTransaction: 'date',
+    Accident: 'date_occurred',
+    MaintenanceRequest: 'date_completed',
+}
+
+
+def remember_fact_date(sender, instance, **kwargs):
+    """التاريخ كما قُرئ/أُنشئ: إذا عُدّل لاحقاً (لوحة الإدارة) يبقى اليوم القديم معروفاً لإعادة بنائه"""
+    # __dict__ وليس getattr: الحقل المؤجل (only/defer) لا يُجلب باستعلام إضافي
+    instance._fact_date = instance.__dict__.get(FACT_DATE_FIELDS[sender])
+
+
+# post_init يُطلق لكل كائن يُبنى، لذا يُربط بجداول الحقائق الأربعة فقط
+for _model in FACT_DATE_FIELDS:
+    post_init.connect(remember_fact_date, sender=_model)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def mark_fact_day_dirty(sender, instance, **kwargs):
+    """
+    تعليم يوم السجل ليعاد بناؤه في التحديث التزايدي القادم لجدول الحقائق.
+    عند تغيير التاريخ يُعلّم اليومان: القديم (ليخرج منه السجل) والجديد.
+    """
+    field = FACT_DATE_FIELDS.get(sender)
+    if field:
+        value = getattr(instance, field)
+        previous = getattr(instance, '_fact_date', None)
+        FleetAnalyticsService.mark_dirty(*(
+            FleetAnalyticsService.local_date(d) for d in (value, previous) if d
+        ))
+        instance._fact_date = value
+
+
+@receiver(post_save, sender=FuelTransaction)
+def update_last_fuel_activity(sender, instance, created, **kwargs):
+    """الحفاظ على آخر صرف/إضافة في جدول الموظفين متزامناً مع السجل (من الخدمات أو لوحة الإدارة)"""
+    if created:
+        FuelService.record_last_activity(instance)
+    else:
+        FuelService.recompute_last_activity(instance.employee_id)
+
+
+@receiver(post_delete, sender=FuelTransaction)
+def reset_last_fuel_activity(sender, instance, **kwargs):
+    FuelService.recompute_last_activity(instance.employee_id)
@@ -1,3 +1,1224 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.paginator import EmptyPage
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from .models import (
+    Employee, FuelTransaction, MilitaryRank, Vehicle, Trip, Accident, ReportJob, OutboxEvent, RequestProfile,
+    FactDirtyDay, FleetDailyFact, MaintenanceRequest, Workshop,
+)
+from .services.rank_service import RankService
+from .services.reference_data_service import ReferenceDataService
+from .services.vehicle_service import VehicleService
+from .services.fuel_service import FuelService
+from .services.fuel_sync_service import FuelSyncService
+from .services.data_version_service import DataVersionService
+from .services.report_cache import ReportCache
+from .services.fleet_analytics_service import FleetAnalyticsService
+from .services.report_service import ReportService
+from .services.outbox_service import OutboxService
+from .services.live_feed_service import LiveFeedService
+from .services.maintenance_service import MaintenanceService
+from .services.trip_service import TripService
+from .services.profiler_service import ProfilerService
+from .services.memory_service import MemoryService
+from .services.metrics_service import MetricsService
+from .middleware import PerfLog
+from .paginator import EstimatedCountPaginator
+from . import db_router
+from .db_router import ReplicaPinMiddleware, ReplicaRouter, current_read_alias, routing_scope
+
+# عدد الاستعلامات المعتمد لكل صفحة (يُحدَّث بـ UPDATE_QUERY_BUDGETS=1 python manage.py test trans_maint)
+QUERY_BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+# حجما البيانات: الكبير = 10 أضعاف الصغير، وعدد الاستعلامات يجب أن يبقى نفسه
+SMALL_SCALE, LARGE_SCALE = 1, 10
+DATASET_DAYS = 30
+DATASET_END_DATE = '2026-06-30'
+
+# الصفحات التي لا تُعرض بـ GET عادي، مع السبب
+SKIPPED_URLS = {
+    'live_feed': "بث SSE مستمر لا ينتهي",
+    # استعلاماتها في خيوط منفصلة باتصالات أخرى (لا تُلتقط ولا ترى بيانات الاختبار)؛ تغطيها نسختها المتزامنة
+    'vehicle_detail_async': "View غير متزامنة",
+    'admin_dashboard_async': "View غير متزامنة",
+    'fuel_add': "POST فقط",
+    'fuel_adjustment': "POST فقط",
+    'accident_close': "POST فقط",
+    'maintenance_create': "POST فقط",
+    'maintenance_close': "POST فقط",
+    'workshop_add': "POST فقط",
+    'workshop_edit_delete': "POST فقط",
+    'api_fuel_sync': "POST فقط",
+    'api_changes': "يتطلب رمز نظام مستهلك (OUTBOX_CONSUMER_TOKENS)",
+}
+
+
+def _busiest(queryset, related):
+    """الكيان صاحب أكبر عدد من السجلات المرتبطة، حتى تظهر أي استعلامات لكل صف في صفحة التفاصيل"""
+    return queryset.annotate(n=Count(related)).order_by('-n', 'id').values_list('id', flat=True).first()
+
+
+def _url_kwargs():
+    """معايير الروابط لكل صفحة تفاصيل، من البيانات المولدة الحالية"""
+    job = ReportJob.objects.get_or_create(
+        report_type='trips', params={}, params_hash='query-count-harness',
+        defaults={'status': 'done', 'result_file': 'query_count_harness.csv'},
+    )[0]
+    employee_id = _busiest(Employee.objects, 'trips')
+    vehicle_id = _busiest(Vehicle.objects, 'trips')
+    return {
+        'employee_detail': {'pk': employee_id},
+        'employee_trips_tab': {'pk': employee_id},
+        'employee_fuel_tab': {'pk': employee_id},
+        'vehicle_detail': {'pk': vehicle_id},
+        'vehicle_trips_tab': {'pk': vehicle_id},
+        'vehicle_fuel_tab': {'pk': vehicle_id},
+        'vehicle_maintenance_tab': {'pk': vehicle_id},
+        'vehicle_accidents_tab': {'pk': vehicle_id},
+        'trip_detail': {'pk': _busiest(Trip.objects, 'accident')},
+        'accident_detail': {'pk': _busiest(Accident.objects, 'maintenance_repairs')},
+        'quota_history': {'employee_id': employee_id},
+        'report_job_status': {'pk': job.id},
+        'report_job_download': {'pk': job.id},
+    }
+
+
+def _admin_urls():
+    """(الاسم، الرابط) لقائمة كل موديل في trans_maint مسجل في لوحة الإدارة ولنموذج تعديل أول سجل فيه"""
+    for model in admin.site._registry:
+        if model._meta.app_label != 'trans_maint':
+            continue
+        prefix = f"admin:{model._meta.app_label}_{model._meta.model_name}"
+        yield f"{prefix}_changelist", reverse(f"{prefix}_changelist")
+        # سجل كل علاقاته الاختيارية معبأة، حتى تظهر كل عناصر النموذج (عناوين الـ FK) بنفس العدد في الحجمين
+        filled = {f"{f.name}__isnull": False for f in model._meta.fields if f.is_relation and f.null}
+        rows = model._default_manager.order_by('pk').values_list('pk', flat=True)
+        pk = rows.filter(**filled).first() or rows.first()
+        if pk is not None:
+            yield f"{prefix}_change", reverse(f"{prefix}_change", args=[pk])
+
+
+# قوالب بديلة للصفحات التي لم يُكتب قالبها بعد، تعرض ما يعرضه القالب الحقيقي عادة (الحقول المرتبطة لكل صف)
+# حتى تدخل تحت الميزانيات. القالب الحقيقي عند إضافته يأخذ الأولوية (filesystem قبل locmem).
+STUB_TEMPLATES = {
+    'quota/quota_overview.html': (
+        "{% extends 'base.html' %}{% block content %}{% for row in quota_data %}"
+        "{{ row.employee.name }} {{ row.employee.rank.name }} {{ row.monthly_quota }} {{ row.balance }} {{ row.usage_pct }}"
+        "{% endfor %}{% endblock %}"
+    ),
+    'quota/adjustment_form.html': (
+        "{% extends 'base.html' %}{% block content %}{% for rank in ranks %}{{ rank.name }}{% endfor %}{% endblock %}"
+    ),
+    'quota/quota_history.html': (
+        "{% extends 'base.html' %}{% block content %}{{ employee.name }} {{ employee.rank.name }}"
+        "{% for tx in history %}{{ tx.date }} {{ tx.vehicle.plate_number }} {{ tx.quantity }}{% endfor %}{% endblock %}"
+    ),
+    'modules/accidents/accident_form.html': (
+        "{% extends 'base.html' %}{% block content %}{% for trip in active_trips %}"
+        "{{ trip.vehicle.plate_number }} {{ trip.employee.name }}{% endfor %}{% endblock %}"
+    ),
+}
+HARNESS_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+            ('django.template.loaders.locmem.Loader', STUB_TEMPLATES),
+        ],
+    },
+}]
+
+
+def _named_patterns():
+    return [p.name for p in get_resolver('trans_maint.urls').url_patterns if isinstance(p, URLPattern) and p.name]
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, REPORT_JOBS_DIR=tempfile.gettempdir(),
+    TEMPLATES=HARNESS_TEMPLATES,
+    # generate_fleet يزيد كل الإصدارات: ملف مؤقت بدلاً من var/data_versions.bin الحقيقي
+    DATA_VERSION_FILE=os.path.join(tempfile.gettempdir(), 'query_count_harness_versions.bin'),
+)
+class ViewQueryCountTests(TestCase):
+    """
+    اختبار انحدار لعدد الاستعلامات: كل صفحة في trans_maint/urls.py وكل قائمة/نموذج تعديل في لوحة الإدارة
+    تُعرض على بيانات صغيرة ثم أكبر بعشر مرات.
+    - زيادة الاستعلامات مع حجم البيانات = N+1.
+    - أي تغير عن العدد المحفوظ في query_budgets.json يفشل (استعلام جديد يجب أن يكون مقصوداً ويُحدَّث في الملف).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # ملف نتيجة لمهمة التقرير المكتملة حتى تُقاس صفحة التنزيل أيضاً
+        cls.result_path = os.path.join(tempfile.gettempdir(), 'query_count_harness.csv')
+        with open(cls.result_path, 'w', encoding='utf-8') as f:
+            f.write('id\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.result_path)
+        super().tearDownClass()
+
+    def measure_all(self, scale):
+        call_command(
+            'generate_fleet', scale=scale, days=DATASET_DAYS, end_date=DATASET_END_DATE, reset=True,
+            stdout=open(os.devnull, 'w'),
+        )
+        url_kwargs = _url_kwargs()
+        counts = {}
+        for name in _named_patterns():
+            if name in SKIPPED_URLS:
+                continue
+            url = reverse(name, kwargs=url_kwargs.get(name))
+            # كل صفحة تُقاس بذاكرة بيانات مرجعية فارغة (أسوأ حالة) حتى لا يعتمد العدد على ترتيب الصفحات
+            ReferenceDataService.clear()
+            # لا تجاوز صامت: قالب مفقود يفشل هنا (أضف قالباً بديلاً في STUB_TEMPLATES أو استثنِ الرابط في SKIPPED_URLS)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertLess(response.status_code, 400, f"{name} ({url}) أعاد {response.status_code}")
+            counts[name] = len(captured.captured_queries)
+
+        # صفحات الإدارة: القائمة ونموذج التعديل لكل موديل مسجل (ضمن نفس الميزانيات)
+        user = get_user_model().objects.get_or_create(username='query-count-admin', defaults={'is_staff': True, 'is_superuser': True})[0]
+        self.client.force_login(user)
+        for name, url in _admin_urls():
+            # ذاكرة ContentType تبقى بين القياسات: نفرغها حتى لا يعتمد العدد على ترتيب الصفحات
+            ContentType.objects.clear_cache()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, f"{name} ({url}) أعاد {response.status_code}")
+            counts[name] = len(captured.captured_queries)
+        self.client.logout()
+        return counts
+
+    def test_every_url_is_classified(self):
+        """أي رابط جديد يجب أن يُقاس (له معايير أو بدونها) أو يُستثنى صراحة مع السبب"""
+        for name in _named_patterns():
+            pattern = next(p for p in get_resolver('trans_maint.urls').url_patterns if getattr(p, 'name', None) == name)
+            if name in SKIPPED_URLS or not pattern.pattern.converters:
+                continue
+            self.assertIn(name, _url_kwargs(), f"أضف معايير الرابط {name} في _url_kwargs أو استثنه في SKIPPED_URLS")
+
+    def test_query_counts_are_constant_and_match_budgets(self):
+        small = self.measure_all(SMALL_SCALE)
+        large = self.measure_all(LARGE_SCALE)
+
+        for name, count in small.items():
+            with self.subTest(view=name, check='N+1'):
+                self.assertEqual(
+                    large[name], count,
+                    f"{name}: {count} استعلام على البيانات الصغيرة و {large[name]} على الأكبر (استعلامات لكل صف؟)",
+                )
+
+        if os.environ.get('UPDATE_QUERY_BUDGETS') == '1':
+            with open(QUERY_BUDGETS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(small, f, indent=2, sort_keys=True)
+                f.write('\n')
+            return
+
+        with open(QUERY_BUDGETS_FILE, encoding='utf-8') as f:
+            budgets = json.load(f)
+        for name, count in small.items():
+            with self.subTest(view=name, check='budget'):
+                self.assertIn(name, budgets, f"{name}: لا يوجد عدد معتمد؛ شغّل الاختبار مع UPDATE_QUERY_BUDGETS=1")
+                self.assertEqual(
+                    count, budgets[name],
+                    f"{name}: {count} استعلام بدلاً من {budgets[name]} المعتمد في query_budgets.json",
+                )
+
+
+class ReferenceDataServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.rank = MilitaryRank.objects.create(name='رائد', default_weekly_quota=40, default_monthly_quota=160)
+        Vehicle.objects.create(plate_number='AB-100', model='Hilux', status='active')
+        Vehicle.objects.create(plate_number='AB-200', model='Patrol', status='inactive')
+        Vehicle.objects.create(plate_number='CD-300', model='Hilux', status='active')
+
+    def setUp(self):
+        ReferenceDataService.clear()
+
+    def test_unchanged_data_is_served_without_queries(self):
+        RankService.list_ranks()
+        with self.assertNumQueries(0):
+            ranks = RankService.list_ranks()
+        self.assertEqual([r.name for r in ranks], ['رائد'])
+
+    def test_service_update_reloads_on_next_read(self):
+        RankService.list_ranks()
+        with self.captureOnCommitCallbacks(execute=True):
+            RankService.update_rank(self.rank.id, {'name': 'عقيد'})
+        with self.assertNumQueries(1):
+            self.assertEqual([r.name for r in RankService.list_ranks()], ['عقيد'])
+
+    @override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False)
+    def test_rank_list_page_shows_employee_counts(self):
+        MilitaryRank.objects.create(name='نقيب')
+        Employee.objects.create(name='خالد', military_number='RL-1', rank=self.rank)
+        Employee.objects.create(name='سعد', military_number='RL-2', rank=self.rank)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('rank_list'))
+        counts = {rank.name: rank.employee_count for rank in response.context['ranks']}
+        self.assertEqual(counts, {'رائد': 2, 'نقيب': 0})
+        self.assertContains(response, '2 موظف')
+        self.assertContains(response, '0 موظف')
+
+    def test_vehicle_prefix_search(self):
+        self.assertEqual([v.plate_number for v in VehicleService.search_vehicles('AB')], ['AB-100', 'AB-200'])
+        self.assertEqual([v.plate_number for v in VehicleService.search_vehicles('AB', statuses=['active'])], ['AB-100'])
+        self.assertEqual([v.plate_number for v in VehicleService.search_vehicles(limit=2)], ['AB-100', 'AB-200'])
+        self.assertEqual([v.plate_number for v in VehicleService.list_active_vehicles()], ['AB-100', 'CD-300'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False)
+class FieldApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            Vehicle.objects.create(plate_number=f'FA-{i}', model='Hilux', status='active' if i % 2 else 'inactive')
+
+    def test_unchanged_poll_returns_304_without_queries(self):
+        response = self.client.get(reverse('api_vehicles'))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(0):
+            again = self.client.get(reverse('api_vehicles'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            VehicleService.update_vehicle(Vehicle.objects.first().id, {'status': 'under_repair'})
+        changed = self.client.get(reverse('api_vehicles'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        ids, cursor = [], ''
+        while cursor is not None:
+            data = self.client.get(reverse('api_vehicles'), {'limit': 2, 'fields': 'id', 'cursor': cursor}).json()
+            ids += [row['id'] for row in data['results']]
+            cursor = data['next']
+        self.assertEqual(ids, list(Vehicle.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_field_selection_and_filters(self):
+        data = self.client.get(reverse('api_vehicles'), {'fields': 'plate_number', 'status': 'active'}).json()
+        self.assertEqual(data['results'], [{'plate_number': 'FA-1'}, {'plate_number': 'FA-3'}])
+        self.assertEqual(self.client.get(reverse('api_vehicles'), {'fields': 'owner__name'}).status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False)
+class HistoryTabTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='عريف')
+        cls.employee = Employee.objects.create(name='ماجد', military_number='H-1', rank=rank)
+        vehicle = Vehicle.objects.create(plate_number='HT-1', model='Hilux')
+        # نصف الرحلات بنفس وقت البدء: حدود الصفحات تعتمد على id لكسر التعادل
+        start = timezone.now()
+        Trip.objects.bulk_create([
+            Trip(vehicle=vehicle, employee=cls.employee, trip_type='دورية', area=f'منطقة {i}',
+                 start_date=start - timedelta(hours=i // 2))
+            for i in range(45)
+        ])
+
+    def test_load_more_walks_whole_history_without_repeats(self):
+        url, areas, pages = reverse('employee_trips_tab', kwargs={'pk': self.employee.id}), [], 0
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            html = response.content.decode()
+            areas += re.findall(r'<td>(منطقة \d+)</td>', html)
+            more = re.search(r'data-history-more="([^"]+)"', html)
+            url = more.group(1) if more else None
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(areas), 45)
+        self.assertEqual(len(set(areas)), 45)
+
+    def test_detail_page_does_not_render_history(self):
+        response = self.client.get(reverse('employee_detail', kwargs={'pk': self.employee.id}))
+        self.assertContains(response, '45 رحلة')
+        self.assertNotContains(response, 'منطقة 0')
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('employee_trips_tab', kwargs={'pk': self.employee.id}), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_with_wrongly_typed_values_is_rejected(self):
+        # WyJ4IiwieCJd = ["x","x"]: صيغة مؤشر صحيحة، لكن القيم ليست تاريخاً و id
+        vehicle = Vehicle.objects.get(plate_number='HT-1')
+        for url in (
+            reverse('employee_trips_tab', kwargs={'pk': self.employee.id}),
+            reverse('vehicle_maintenance_tab', kwargs={'pk': vehicle.id}),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, {'cursor': 'WyJ4IiwieCJd'}).status_code, 400)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, FUEL_SYNC_TOKENS=['pump-1'])
+class FuelSyncApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='نقيب')
+        cls.employee = Employee.objects.create(name='سالم', military_number='S-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='FS-1', model='Hilux')
+        FuelTransaction.objects.create(employee=cls.employee, vehicle=cls.vehicle, quantity=50, transaction_type='addition')
+
+    def sync(self, transactions, token='pump-1'):
+        return self.client.post(
+            reverse('api_fuel_sync'), json.dumps({'transactions': transactions}),
+            content_type='application/json', HTTP_AUTHORIZATION=f'Token {token}',
+        )
+
+    def issue(self, key, quantity):
+        return {'key': key, 'employee_id': self.employee.id, 'vehicle_id': self.vehicle.id, 'quantity': quantity}
+
+    def test_batch_validates_running_balance_and_replay_is_idempotent(self):
+        batch = [self.issue('a', 30), self.issue('b', 30), self.issue('c', 20), self.issue('a', 30), {'key': 'd'}]
+        results = self.sync(batch).json()['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'rejected', 'created', 'duplicate', 'invalid'])
+        self.assertEqual(results[3]['transaction_id'], results[0]['transaction_id'])
+
+        replay = self.sync(batch).json()['results']
+        self.assertEqual([r['status'] for r in replay], ['duplicate', 'rejected', 'duplicate', 'duplicate', 'invalid'])
+        self.assertEqual(FuelTransaction.objects.filter(transaction_type='issue').count(), 2)
+        self.employee.refresh_from_db()
+        self.assertIsNotNone(self.employee.last_issue_at)
+
+    def test_conflicting_insert_is_retried_without_reparsing(self):
+        apply = FuelSyncService._apply
+        conflicts = iter([True])
+
+        def flaky_apply(rows, results):
+            # أول محاولة: مزامنة أخرى أدخلت نفس المفتاح قبلنا
+            if next(conflicts, False):
+                FuelTransaction.objects.create(
+                    employee=self.employee, vehicle=self.vehicle, quantity=5, transaction_type='issue', idempotency_key='a',
+                )
+                raise IntegrityError
+            return apply(rows, results)
+
+        with mock.patch.object(FuelSyncService, '_apply', side_effect=flaky_apply), \
+                mock.patch.object(FuelSyncService, '_parse', wraps=FuelSyncService._parse) as parse:
+            results = self.sync([self.issue('a', 5), self.issue('b', 5)]).json()['results']
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual([r['status'] for r in results], ['duplicate', 'created'])
+
+        with mock.patch.object(FuelSyncService, '_apply', side_effect=IntegrityError) as always:
+            response = self.sync([self.issue('c', 5)])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(always.call_count, FuelSyncService.CONFLICT_ATTEMPTS)
+
+    def test_requires_device_token(self):
+        self.assertEqual(self.sync([self.issue('x', 1)], token='wrong').status_code, 401)
+        self.assertFalse(FuelTransaction.objects.filter(idempotency_key='x').exists())
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, OUTBOX_SETTLE_SECONDS=0,
+    OUTBOX_CONSUMER_TOKENS={'finance': 'fin-token', 'hr': 'hr-token'},
+)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='ملازم')
+        cls.employee = Employee.objects.create(name='خالد', military_number='O-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='OB-1', model='Hilux')
+
+    def changes(self, token='fin-token', **params):
+        return self.client.get(reverse('api_changes'), params, HTTP_AUTHORIZATION=f'Token {token}')
+
+    def test_service_writes_are_paged_by_cursor(self):
+        for _ in range(3):
+            FuelService.add_fuel(self.employee.id, self.vehicle.id, 10)
+        first = self.changes(limit=2).json()
+        self.assertEqual([e['type'] for e in first['events']], ['fuel.added', 'fuel.added'])
+        self.assertTrue(first['has_more'])
+        rest = self.changes(after=first['next_after']).json()
+        self.assertEqual(len(rest['events']), 1)
+        self.assertFalse(rest['has_more'])
+        self.assertEqual(self.changes(token='wrong').status_code, 401)
+
+    def test_non_positive_limit_is_rejected(self):
+        FuelService.add_fuel(self.employee.id, self.vehicle.id, 10)
+        self.assertEqual(self.changes(limit=-5).status_code, 400)
+        self.assertEqual(self.changes(limit=0).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('outbox_changes', limit=-1)
+        # استدعاء الخدمة مباشرة: الحد يُقيد بدلاً من خطأ QuerySet
+        events, has_more = OutboxService.changes_since(0, -5)
+        self.assertEqual((len(events), has_more), (1, False))
+
+    def test_compaction_keeps_events_not_acknowledged_by_every_consumer(self):
+        for _ in range(4):
+            FuelService.add_fuel(self.employee.id, self.vehicle.id, 10)
+        ids = list(OutboxEvent.objects.order_by('id').values_list('id', flat=True))
+        OutboxService.acknowledge('finance', ids[2])
+        OutboxService.acknowledge('hr', ids[1])
+        self.assertEqual(OutboxService.compact(batch_size=1), 2)
+        self.assertEqual(list(OutboxEvent.objects.values_list('id', flat=True)), ids[2:])
+        # التأكيد لا يرجع للخلف ولا يتجاوز آخر حدث مكتوب
+        self.assertEqual(OutboxService.acknowledge('finance', ids[0]), ids[2])
+        self.assertEqual(OutboxService.acknowledge('hr', ids[-1] + 100), ids[-1])
+
+    def test_configured_consumer_without_acknowledgement_blocks_compaction(self):
+        for _ in range(3):
+            FuelService.add_fuel(self.employee.id, self.vehicle.id, 10)
+        last = OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first()
+        # hr مُعرَّف في الإعدادات لكنه لم يقرأ شيئاً بعد
+        OutboxService.acknowledge('finance', last)
+        self.assertEqual(OutboxService.compact(), 0)
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+        OutboxService.acknowledge('hr', last)
+        self.assertEqual(OutboxService.compact(), 3)
+
+    def test_deleting_trip_emits_event_for_detached_fuel_transaction(self):
+        trip = TripService.create_trip_with_quota({
+            'employee': self.employee, 'vehicle': self.vehicle, 'area': 'الشمال',
+            'start_date': timezone.now(), 'fuel_quota_granted': 40,
+        })
+        fuel_id = FuelTransaction.objects.get(trip=trip).id
+        TripService.delete_trip(trip.id)
+        deleted = OutboxEvent.objects.get(event_type='trip.deleted')
+        self.assertEqual(deleted.payload['fuel_transaction_ids'], [fuel_id])
+        # المعاملة باقية لكنها فُصلت عن الرحلة، والحدث يحمل الحالة الجديدة
+        detached = OutboxEvent.objects.get(event_type='fuel.updated')
+        self.assertEqual(detached.object_id, fuel_id)
+        self.assertIsNone(detached.payload['trip_id'])
+        self.assertLess(deleted.id, detached.id)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, PROFILING_ENABLED=True)
+class ProfilerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        MilitaryRank.objects.create(name='رقيب')
+        cls.staff = get_user_model().objects.create_user('profiler-staff', password='x', is_staff=True, is_superuser=True)
+        cls.clerk = get_user_model().objects.create_user('profiler-clerk', password='x')
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        override = override_settings(PROFILE_DIR=self.profile_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_staff_flag_saves_profile_collapsed_stacks_and_sql(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('rank_list'), {ProfilerService.QUERY_PARAM: '1'})
+        profile = RequestProfile.objects.get(id=response['X-Profile-Id'])
+
+        self.assertEqual(profile.view, 'trans_maint.views.RankListView')
+        self.assertGreaterEqual(profile.queries, 1)
+        self.assertEqual(sum(row['count'] for row in profile.sql), profile.queries)
+        self.assertTrue(os.path.exists(ProfilerService.path(profile, 'prof')))
+        with open(ProfilerService.path(profile, 'collapsed'), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines))
+        self.assertTrue(any('trans_maint/views.py' in line for line in lines))
+
+        download = self.client.get(reverse('admin:trans_maint_requestprofile_download', args=[profile.id, 'collapsed']))
+        self.assertEqual(download.status_code, 200)
+
+    def test_flag_is_ignored_for_non_staff_and_without_flag(self):
+        self.client.force_login(self.clerk)
+        response = self.client.get(reverse('rank_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.force_login(self.staff)
+        self.client.get(reverse('rank_list'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_old_profiles_and_files_are_pruned(self):
+        self.client.force_login(self.staff)
+        ids = [self.client.get(reverse('rank_list'), HTTP_X_PROFILE='1')['X-Profile-Id'] for _ in range(3)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list('id', flat=True)), [int(i) for i in ids[1:]])
+        self.assertEqual(len(os.listdir(self.profile_dir.name)), 4)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, MEMORY_TRACE_SAMPLE_RATE=1, MEMORY_LARGE_ALLOCATION_MB=0)
+class MemoryServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='رقيب')
+        employee = Employee.objects.create(name='موظف الذاكرة', military_number='M-1', rank=rank)
+        vehicle = Vehicle.objects.create(plate_number='M-100')
+        FuelTransaction.objects.create(employee=employee, vehicle=vehicle, quantity=50, transaction_type='addition')
+
+    def test_sampled_report_records_python_peak_and_logs_large_allocation(self):
+        with self.assertLogs('trans_maint.memory', 'WARNING') as logs:
+            response = self.client.get(reverse('report_center'), {'report_type': 'fuel'})
+        self.assertEqual(response.status_code, 200)
+
+        stats = response.wsgi_request.perf_memory
+        self.assertIn('rss_kb', stats)
+        self.assertGreater(stats['py_peak_kb'], 0)
+        self.assertTrue(stats['top_allocations'])
+        self.assertIn("'report_type': 'fuel'", logs.output[0])
+        self.assertFalse(MemoryService._trace_lock.locked())
+
+    @override_settings(MEMORY_TRACE_SAMPLE_RATE=0, MEMORY_LARGE_ALLOCATION_MB=200)
+    def test_unsampled_request_measures_rss_only(self):
+        response = self.client.get(reverse('fuel_log_list'))
+        stats = response.wsgi_request.perf_memory
+        self.assertIn('rss_kb', stats)
+        self.assertNotIn('py_peak_kb', stats)
+
+    @override_settings(MEMORY_INSTRUMENTATION=False)
+    def test_disabled_instrumentation_records_nothing(self):
+        response = self.client.get(reverse('fuel_log_list'))
+        self.assertFalse(hasattr(response.wsgi_request, 'perf_memory'))
+
+    def test_background_run_is_written_to_perf_log_with_allocation_sites(self):
+        with tempfile.TemporaryDirectory() as log_dir, override_settings(
+            PERF_INSTRUMENTATION=True, PERF_LOG_FILE=os.path.join(log_dir, 'perf.jsonl'),
+        ), self.assertLogs('trans_maint.memory', 'WARNING'):
+            with MemoryService.track('export[test]', {'report_type': 'test'}):
+                rows = [str(i) * 20 for i in range(20000)]
+                MemoryService.checkpoint()
+                del rows
+            record, = PerfLog.read()
+
+        self.assertEqual((record['view'], record['method']), ('export[test]', 'JOB'))
+        self.assertGreaterEqual(record['py_peak_kb'], 400)
+        self.assertIn('trans_maint/tests.py', record['top_allocations'][0]['site'])
+
+    def test_perf_log_is_rotated_once_when_workers_race(self):
+        with tempfile.TemporaryDirectory() as log_dir, override_settings(PERF_LOG_FILE=os.path.join(log_dir, 'perf.jsonl')):
+            path = settings.PERF_LOG_FILE
+            for i in range(5):
+                PerfLog.write({'n': i, 'pad': 'x' * 40})
+            # عامل آخر فتح الملف الكبير ورأى حجمه قبل أن نُدوّره نحن
+            stale_fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+            try:
+                with override_settings(PERF_LOG_MAX_BYTES=100):
+                    PerfLog.write({'n': 5})
+                PerfLog._rotate(stale_fd, path)
+            finally:
+                os.close(stale_fd)
+            # النسخة السابقة لم تُستبدل بالملف الجديد شبه الفارغ
+            self.assertEqual([r['n'] for r in PerfLog.read()], [0, 1, 2, 3, 4, 5])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, METRICS_ENABLED=True, METRICS_TOKENS=[])
+class MetricsTests(TestCase):
+    SAMPLE = re.compile(r'^[a-z_]+\{(?:[a-z]+="[^"]*",?)+\} [0-9.e+-]+$')
+
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='رقيب')
+        cls.employee = Employee.objects.create(name='موظف المقاييس', military_number='MT-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='MT-100')
+
+    def setUp(self):
+        self.metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.metrics_dir.cleanup)
+        override = override_settings(METRICS_DIR=self.metrics_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def sample(self, text, metric, **labels):
+        wanted = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        match = re.search(rf'^{metric}\{{{re.escape(wanted)}\}} (\S+)$', text, re.M)
+        self.assertIsNotNone(match, f"{metric}{{{wanted}}} غير موجود")
+        return float(match.group(1))
+
+    def test_service_calls_errors_and_latency_are_exported(self):
+        RankService.list_ranks()
+        RankService.list_ranks()
+        with self.assertRaises(ValidationError):
+            FuelService.issue_fuel(self.employee.id, self.vehicle.id, 10)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], MetricsService.CONTENT_TYPE)
+        text = response.content.decode()
+
+        ranks = {'service': 'RankService', 'method': 'list_ranks'}
+        self.assertEqual(self.sample(text, 'trans_maint_service_calls_total', **ranks), 2)
+        self.assertEqual(self.sample(text, 'trans_maint_service_errors_total', **ranks), 0)
+        self.assertEqual(self.sample(text, 'trans_maint_service_latency_seconds_count', **ranks), 2)
+        self.assertEqual(self.sample(text, 'trans_maint_service_latency_seconds_bucket', **ranks, le='+Inf'), 2)
+        # الاستدعاءات الداخلية بين الخدمات تُقاس أيضاً
+        self.assertEqual(self.sample(text, 'trans_maint_service_errors_total', service='FuelService', method='issue_fuel'), 1)
+        self.assertEqual(self.sample(text, 'trans_maint_service_calls_total', service='FuelService', method='validate_sufficient_balance'), 1)
+        for line in text.splitlines():
+            self.assertTrue(line.startswith('# ') or self.SAMPLE.match(line), line)
+
+    def test_nested_report_classes_are_labelled_with_their_service(self):
+        ReportService.TripReports.get_trip_statistics(None, None)
+        text = MetricsService.render()
+        self.assertEqual(self.sample(
+            text, 'trans_maint_service_calls_total', service='ReportService.TripReports', method='get_trip_statistics',
+        ), 1)
+
+    def test_counts_from_other_worker_processes_are_summed(self):
+        MetricsService.observe('FuelService.issue_fuel', 0.003)
+        pid = os.fork()
+        if pid == 0:  # عامل آخر: ملفه الخاص
+            try:
+                MetricsService.observe('FuelService.issue_fuel', 0.003)
+                MetricsService.observe('FuelService.issue_fuel', 2.0, failed=True)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        self.assertEqual(len(os.listdir(self.metrics_dir.name)), 2)
+        row = MetricsService.collect()['FuelService.issue_fuel']
+        self.assertEqual((row['calls'], row['errors']), (3, 1))
+        self.assertAlmostEqual(row['sum'], 2.006)
+        text = MetricsService.render()
+        labels = {'service': 'FuelService', 'method': 'issue_fuel'}
+        self.assertEqual(self.sample(text, 'trans_maint_service_latency_seconds_bucket', **labels, le='0.005'), 2)
+        self.assertEqual(self.sample(text, 'trans_maint_service_latency_seconds_bucket', **labels, le='2.5'), 3)
+
+    @override_settings(METRICS_TOKENS=['prometheus'])
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Token prometheus')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_metrics_record_nothing(self):
+        RankService.list_ranks()
+        self.assertEqual(MetricsService.collect(), {})
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False)
+class FleetAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='نقيب')
+        cls.employee = Employee.objects.create(name='فيصل', military_number='FA-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='FA-100', model='Hilux')
+        cls.old_day = timezone.make_aware(timezone.datetime(2026, 6, 10, 9))
+        cls.trip = Trip.objects.create(
+            vehicle=cls.vehicle, employee=cls.employee, trip_type='دورية', area='الشمال', start_date=cls.old_day,
+        )
+
+    def test_moving_a_row_to_another_day_rebuilds_both_days(self):
+        FleetAnalyticsService.refresh(full=True)
+        self.assertEqual(FleetDailyFact.objects.get(date=self.old_day.date()).trips, 1)
+
+        # تعديل التاريخ كما في لوحة الإدارة: كائن مقروء من القاعدة ثم save()
+        trip = Trip.objects.get(id=self.trip.id)
+        trip.start_date = self.old_day + timedelta(days=10)
+        trip.save()
+        self.assertEqual(
+            set(FactDirtyDay.objects.values_list('date', flat=True)),
+            {self.old_day.date(), self.old_day.date() + timedelta(days=10)},
+        )
+
+        FleetAnalyticsService.refresh()
+        self.assertFalse(FleetDailyFact.objects.filter(date=self.old_day.date(), trips__gt=0).exists())
+        self.assertEqual(FleetDailyFact.objects.get(date=self.old_day.date() + timedelta(days=10)).trips, 1)
+
+    def test_failed_rebuild_keeps_remaining_days_dirty(self):
+        days = [self.old_day.date() + timedelta(days=i) for i in range(3)]
+        FleetAnalyticsService.mark_dirty(*days)
+        rebuild_day = FleetAnalyticsService.rebuild_day
+
+        def fail_on_second_day(day):
+            if day == days[1]:
+                raise RuntimeError("انقطاع الاتصال")
+            return rebuild_day(day)
+
+        with mock.patch.object(FleetAnalyticsService, 'rebuild_day', side_effect=fail_on_second_day):
+            with self.assertRaises(RuntimeError):
+                FleetAnalyticsService.refresh()
+        self.assertEqual(sorted(FactDirtyDay.objects.values_list('date', flat=True)), days[1:])
+        self.assertEqual(FleetDailyFact.objects.get(date=days[0]).trips, 1)
+
+        self.assertEqual(FleetAnalyticsService.refresh(), 2)
+        self.assertFalse(FactDirtyDay.objects.exists())
+
+    def test_write_during_rebuild_keeps_the_day_dirty(self):
+        day = self.old_day.date()
+        FleetAnalyticsService.mark_dirty(day)
+        rebuild_day = FleetAnalyticsService.rebuild_day
+
+        def rebuild_with_concurrent_write(rebuilt_day):
+            result = rebuild_day(rebuilt_day)
+            FleetAnalyticsService.mark_dirty(rebuilt_day)  # كتابة وصلت بعد قراءة البناء لبياناته
+            return result
+
+        with mock.patch.object(FleetAnalyticsService, 'rebuild_day', side_effect=rebuild_with_concurrent_write):
+            FleetAnalyticsService.refresh()
+        self.assertEqual(list(FactDirtyDay.objects.values_list('date', flat=True)), [day])
+
+    def test_deferred_date_is_not_fetched_on_load(self):
+        with self.assertNumQueries(1):
+            trip = Trip.objects.only('id').get(id=self.trip.id)
+        self.assertIsNone(trip._fact_date)
+
+    def test_invalid_pivot_dates_are_rejected(self):
+        for value in ('abc', '2026-13-01'):
+            with self.subTest(date_from=value):
+                response = self.client.get(reverse('fleet_pivot'), {'dimensions': 'rank', 'date_from': value})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('fleet_pivot'), {'dimensions': 'rank', 'date_from': '2026-06-01', 'date_to': '2026-06-30'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False)
+class UnusedQuotaReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='رقيب')
+        cls.employee = Employee.objects.create(name='سالم', military_number='UQ-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='UQ-100', model='Hilux')
+
+    def reported_ids(self, inactive_days):
+        return set(ReportService.QuotaReports.get_unused_quota_report(inactive_days).values_list('id', flat=True))
+
+    def test_new_transactions_update_last_activity(self):
+        self.assertIsNone(Employee.objects.get(id=self.employee.id).last_issue_at)
+        addition = FuelService.add_fuel(self.employee.id, self.vehicle.id, 100)
+        issue = FuelService.issue_fuel(self.employee.id, self.vehicle.id, 10)
+        employee = Employee.objects.get(id=self.employee.id)
+        self.assertEqual(employee.last_addition_at, addition.date)
+        self.assertEqual(employee.last_issue_at, issue.date)
+        self.assertNotIn(self.employee.id, self.reported_ids(90))
+
+    def test_delete_recomputes_last_issue_from_remaining_transactions(self):
+        FuelService.add_fuel(self.employee.id, self.vehicle.id, 100)
+        older = FuelService.issue_fuel(self.employee.id, self.vehicle.id, 10)
+        newer = FuelService.issue_fuel(self.employee.id, self.vehicle.id, 5)
+        # update() لا يطلق signals: نقل الحركة الأقدم للخلف دون المرور بتحديث آخر نشاط
+        old_date = timezone.now() - timedelta(days=200)
+        FuelTransaction.objects.filter(id=older.id).update(date=old_date)
+
+        newer.delete()
+        self.assertEqual(Employee.objects.get(id=self.employee.id).last_issue_at, old_date)
+        self.assertIn(self.employee.id, self.reported_ids(90))
+        self.assertNotIn(self.employee.id, self.reported_ids(365))
+
+        FuelTransaction.objects.get(id=older.id).delete()
+        self.assertIsNone(Employee.objects.get(id=self.employee.id).last_issue_at)
+        self.assertIn(self.employee.id, self.reported_ids(365))
+
+    def test_editing_a_transaction_recomputes_last_issue(self):
+        FuelService.add_fuel(self.employee.id, self.vehicle.id, 100)
+        issue = FuelService.issue_fuel(self.employee.id, self.vehicle.id, 10)
+        # تعديل من لوحة الإدارة: save() على حركة قائمة يُعيد الحساب حتى لو رجع التاريخ للخلف
+        old_date = timezone.now() - timedelta(days=200)
+        issue.date = old_date
+        issue.save()
+        self.assertEqual(Employee.objects.get(id=self.employee.id).last_issue_at, old_date)
+
+    def test_last_activity_writes_bump_employee_version(self):
+        # update() لا يطلق signals: بدون زيادة الإصدار يبقى تقرير الحصص غير المستخدمة المحفوظ قديماً
+        for write in (
+            lambda: FuelService.add_fuel(self.employee.id, self.vehicle.id, 100),
+            lambda: FuelService.issue_fuel(self.employee.id, self.vehicle.id, 10),
+            lambda: FuelTransaction.objects.filter(employee=self.employee, transaction_type='issue').get().delete(),
+        ):
+            before = DataVersionService.get_versions(Employee)
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            self.assertNotEqual(DataVersionService.get_versions(Employee), before)
+
+    def test_out_of_range_inactive_days_fall_back_to_default(self):
+        for value in ('0', '3651', '9' * 30):
+            with self.subTest(inactive_days=value):
+                response = self.client.get(reverse('report_center'), {'report_type': 'unused_quota', 'inactive_days': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('90', response.context['report_title'])
+                self.assertEqual(len(response.context['messages']), 1)
+
+    def test_out_of_range_inactive_days_are_rejected_for_background_jobs(self):
+        response = self.client.post(reverse('report_center'), {'report_type': 'unused_quota', 'inactive_days': '9' * 30})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_malformed_dates_are_rejected_at_submit(self):
+        for dates in ({'start_date': '2026-13-01'}, {'end_date': '01/06/2026'}, {'start_date': 'yesterday'}):
+            with self.subTest(**dates):
+                response = self.client.post(reverse('report_center'), dict(dates, report_type='fuel'))
+                self.assertEqual(response.status_code, 400)
+                self.assertContains(response, 'YYYY-MM-DD', status_code=400)
+        self.assertFalse(ReportJob.objects.exists())
+
+        response = self.client.post(reverse('report_center'), {'report_type': 'trips', 'start_date': '2026-06-01', 'end_date': '2026-06-30'})
+        self.assertRedirects(response, reverse('report_center'), fetch_redirect_response=False)
+        self.assertEqual(ReportJob.objects.get().params, {'start_date': '2026-06-01', 'end_date': '2026-06-30'})
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False,
+    DATA_VERSION_FILE=os.path.join(tempfile.gettempdir(), 'report_cache_tests_versions.bin'),
+)
+class ReportCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(plate_number='RC-100', model='Hilux')
+        cls.day = timezone.make_aware(timezone.datetime(2026, 6, 10, 9))
+
+    def setUp(self):
+        ReportCache.clear()
+
+    def report_accident(self, cost):
+        return Accident.objects.create(vehicle=self.vehicle, date_occurred=self.day, description='اصطدام', damage_cost=cost)
+
+    def summary(self):
+        return ReportService.AssetReports.get_accident_cost_summary('2026-06-01', '2026-06-30')
+
+    def test_version_is_bumped_only_after_commit(self):
+        before = DataVersionService.get_versions(Accident)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.report_accident(100)
+            self.assertEqual(DataVersionService.get_versions(Accident), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(DataVersionService.get_versions(Accident), before)
+
+    def test_rolled_back_write_does_not_bump(self):
+        before = DataVersionService.get_versions(Accident)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.report_accident(100)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(DataVersionService.get_versions(Accident), before)
+
+    def test_result_is_cached_until_a_tracked_table_changes(self):
+        self.assertEqual(self.summary()['accident_count'], 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary()['accident_count'], 0)
+        # معايير مختلفة بنفس المعنى ('' و None) تُشارك نفس النتيجة
+        with self.assertNumQueries(1):
+            ReportService.AssetReports.get_accident_cost_summary('', None)
+        with self.assertNumQueries(0):
+            ReportService.AssetReports.get_accident_cost_summary(None, '')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report_accident(250)
+        with self.assertNumQueries(1):
+            result = self.summary()
+        self.assertEqual(result['accident_count'], 1)
+        self.assertEqual(result['total_cost'], 250)
+
+    def test_unrelated_write_keeps_cached_result(self):
+        self.summary()
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.create(plate_number='RC-200', model='Land Cruiser')
+        with self.assertNumQueries(0):
+            self.summary()
+
+
+@override_settings(REPLICA_PIN_SECONDS=5)
+@mock.patch.object(db_router, 'replica_configured', return_value=True)
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    التوجيه فقط دون اتصال فعلي بالنسخة: replica_configured مُستبدلة، والـ QuerySets لا تُقيَّم.
+    SimpleTestCase لأن TestCase يلف كل اختبار في transaction، والقراءة داخلها تبقى على الأساسية دائماً.
+    """
+
+    def analytics_alias(self):
+        return ReportService.AssetReports.get_open_maintenance_report()._db
+
+    def test_only_analytics_services_read_from_replica(self, _):
+        self.assertIsNone(ReplicaRouter().db_for_read(Vehicle))
+        self.assertEqual(current_read_alias(), 'default')
+        with routing_scope():
+            self.assertEqual(self.analytics_alias(), 'replica')
+
+    def test_replica_is_skipped_when_not_configured(self, replica_configured):
+        replica_configured.return_value = False
+        with routing_scope():
+            self.assertEqual(self.analytics_alias(), 'default')
+
+    def test_write_pins_rest_of_scope_to_primary(self, _):
+        with routing_scope() as state:
+            ReplicaRouter().db_for_write(Vehicle)
+            self.assertTrue(state.wrote)
+            self.assertEqual(self.analytics_alias(), 'default')
+        with routing_scope():
+            self.assertEqual(self.analytics_alias(), 'replica')
+
+    def test_pinned_scope_reads_primary(self, _):
+        with routing_scope(pinned=True):
+            self.assertEqual(self.analytics_alias(), 'default')
+
+    def run_middleware(self, request, write=False):
+        seen = {}
+
+        def get_response(request):
+            if write:
+                ReplicaRouter().db_for_write(Vehicle)
+            seen['alias'] = self.analytics_alias()
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(get_response)(request)
+        return seen['alias'], response
+
+    def test_middleware_pins_unsafe_methods_and_cookie_holders(self, _):
+        factory = RequestFactory()
+        self.assertEqual(self.run_middleware(factory.get('/'))[0], 'replica')
+        self.assertEqual(self.run_middleware(factory.post('/'))[0], 'default')
+        request = factory.get('/')
+        request.COOKIES[ReplicaPinMiddleware.COOKIE_NAME] = '1'
+        self.assertEqual(self.run_middleware(request)[0], 'default')
+
+    def test_write_sets_pin_cookie_for_following_requests(self, _):
+        _, response = self.run_middleware(RequestFactory().get('/'))
+        self.assertNotIn(ReplicaPinMiddleware.COOKIE_NAME, response.cookies)
+        alias, response = self.run_middleware(RequestFactory().post('/'), write=True)
+        self.assertEqual(alias, 'default')
+        self.assertEqual(response.cookies[ReplicaPinMiddleware.COOKIE_NAME]['max-age'], 5)
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        MilitaryRank.objects.bulk_create(MilitaryRank(name=f'رتبة {i:02d}') for i in range(12))
+
+    def paginator(self, **kwargs):
+        return EstimatedCountPaginator(MilitaryRank.objects.order_by('name'), 2, cap=5, **kwargs)
+
+    def test_count_is_capped_above_cap(self):
+        paginator = self.paginator()
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 5)
+        self.assertTrue(paginator.is_estimated)
+        self.assertEqual(paginator.count_display, '5+')
+
+    def test_small_result_is_counted_exactly(self):
+        paginator = EstimatedCountPaginator(MilitaryRank.objects.filter(name__lt='رتبة 03').order_by('name'), 2, cap=5)
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.is_estimated)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_exact_count_on_request(self):
+        paginator = self.paginator(exact=True)
+        self.assertEqual(paginator.count, 12)
+        self.assertFalse(paginator.is_estimated)
+        self.assertEqual(paginator.count_display, '12')
+
+    def test_pages_past_the_estimate_are_reachable_until_rows_run_out(self):
+        paginator = self.paginator()
+        page = paginator.page(6)
+        self.assertEqual([r.name for r in page.object_list], ['رتبة 10', 'رتبة 11'])
+        self.assertEqual((page.start_index(), page.end_index()), (11, 12))
+        self.assertTrue(page.has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(7)
+        self.assertEqual(paginator.get_page(7).number, 1)
+
+
+@override_settings(DATA_VERSION_FILE=os.path.join(tempfile.gettempdir(), 'generate_fleet_tests_versions.bin'))
+class GenerateFleetTests(TestCase):
+    def generate(self, seed=42, **options):
+        call_command(
+            'generate_fleet', scale=1, days=10, end_date='2026-06-30', seed=seed, reset=True,
+            stdout=open(os.devnull, 'w'), **options,
+        )
+
+    def fingerprint(self):
+        return (
+            list(Employee.objects.order_by('id').values_list('name', 'military_number', 'rank_id', 'last_issue_at', 'last_addition_at')),
+            list(Vehicle.objects.order_by('id').values_list('plate_number', 'model', 'vehicle_type', 'owner_id', 'status')),
+            list(Trip.objects.order_by('id').values_list('vehicle_id', 'employee_id', 'area', 'start_date', 'end_date')),
+            list(FuelTransaction.objects.order_by('id').values_list('employee_id', 'vehicle_id', 'trip_id', 'quantity', 'transaction_type', 'date')),
+            list(Accident.objects.order_by('id').values_list('vehicle_id', 'trip_id', 'date_occurred', 'damage_cost', 'status')),
+            list(MaintenanceRequest.objects.order_by('id').values_list('vehicle_id', 'workshop_id', 'accident_ref_id', 'cost', 'status')),
+        )
+
+    def test_same_seed_generates_identical_data(self):
+        self.generate()
+        first = self.fingerprint()
+        self.assertTrue(first[3])
+        # دفعات أصغر تغير طريقة الكتابة فقط وليس البيانات
+        self.generate(batch_size=100)
+        self.assertEqual(self.fingerprint(), first)
+        self.generate(seed=7)
+        self.assertNotEqual(self.fingerprint(), first)
+
+    def test_refuses_to_write_over_existing_data_without_reset(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            call_command('generate_fleet', scale=1, days=10, stdout=open(os.devnull, 'w'))
+
+    def test_generated_ledger_is_consistent(self):
+        self.generate()
+        # آخر نشاط المحسوب أثناء التوليد = ما تعيد حسابه الخدمة من السجل
+        for employee in Employee.objects.order_by('id')[:20]:
+            generated = (employee.last_issue_at, employee.last_addition_at)
+            FuelService.recompute_last_activity(employee.id)
+            employee.refresh_from_db()
+            self.assertEqual((employee.last_issue_at, employee.last_addition_at), generated)
+        # لا يوجد رصيد سالب: كل صرف يسبقه رصيد كافٍ
+        for employee_id in Employee.objects.values_list('id', flat=True)[:20]:
+            self.assertGreaterEqual(FuelService.calculate_employee_balance(employee_id), 0)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PERF_INSTRUMENTATION=False, LIVE_FEED_ALLOWED_ORIGINS=['http://dashboard.test'])
+class LiveFeedTests(TestCase):
+    """الناقل يُختبر بقراءة واحدة (poll) في خيط الاختبار، دون تشغيل خيط الناقل الفعلي"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rank = MilitaryRank.objects.create(name='ملازم')
+        cls.employee = Employee.objects.create(name='ماجد', military_number='LF-1', rank=rank)
+        cls.vehicle = Vehicle.objects.create(plate_number='LF-100', model='Hilux')
+
+    def setUp(self):
+        LiveFeedService._history.clear()
+        LiveFeedService._gaps = {}
+        LiveFeedService._position = OutboxEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self.addCleanup(LiveFeedService._subscribers.clear)
+        # لا خيط ناقل حقيقي في الاختبارات: poll() يُستدعى يدوياً
+        self.relay_patch = mock.patch.object(LiveFeedService, '_ensure_relay')
+        self.relay_patch.start()
+        self.addCleanup(self.relay_patch.stop)
+
+    def published(self):
+        return [(e['type'], e['data']) for e in LiveFeedService._history]
+
+    def append(self, event_type, **payload):
+        with transaction.atomic():
+            return OutboxService.append(event_type, 1, dict({'vehicle_id': self.vehicle.id}, **payload))
+
+    def test_feed_is_refused_under_wsgi(self):
+        response = self.client.get(reverse('live_feed'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_outbox_events_are_relayed_with_plate_number(self):
+        trip = TripService.create_trip_with_quota({
+            'vehicle': self.vehicle, 'employee': self.employee, 'trip_type': 'دورية', 'area': 'الشمال',
+            'start_date': timezone.now(), 'fuel_quota_granted': 0,
+        })
+        TripService.update_trip(trip.id, {'area': 'الجنوب'})
+        workshop = Workshop.objects.create(name='ورشة المركز')
+        MaintenanceService.create_maintenance_request({'vehicle': self.vehicle, 'workshop': workshop, 'reason': 'فحص دوري'})
+
+        LiveFeedService.poll()
+        types = [t for t, _ in self.published()]
+        # trip.updated للأنظمة الخارجية فقط
+        self.assertEqual(types, ['trip.started', 'maintenance.opened'])
+        self.assertTrue(all(data['plate_number'] == 'LF-100' for _, data in self.published()))
+        self.assertEqual(self.published()[0][1]['object_id'], trip.id)
+
+        # لا شيء جديد: لا يُعاد نشر شيء
+        self.assertEqual(LiveFeedService.poll(), 0)
+        self.assertEqual(len(self.published()), 2)
+
+    def test_late_commit_of_a_lower_id_is_still_relayed(self):
+        self.append('fuel.issued', quantity=10)
+        late = self.append('fuel.issued', quantity=20)
+        last = self.append('fuel.issued', quantity=30)
+        # المحاكاة: الحدث الأوسط لم يُثبت بعد عند القراءة الأولى
+        late_fields = {'id': late.id, 'event_type': late.event_type, 'object_id': late.object_id, 'payload': late.payload}
+        late.delete()
+
+        LiveFeedService.poll()
+        self.assertEqual([d['quantity'] for _, d in self.published()], [10, 30])
+        self.assertEqual(set(LiveFeedService._gaps), {late_fields['id']})
+
+        OutboxEvent.objects.create(**late_fields)
+        LiveFeedService.poll()
+        self.assertEqual([d['quantity'] for _, d in self.published()], [10, 30, 20])
+        self.assertEqual(LiveFeedService._gaps, {})
+        self.assertEqual(LiveFeedService._position, last.id)
+
+    @override_settings(OUTBOX_SETTLE_SECONDS=0)
+    def test_gap_is_dropped_after_settle_time(self):
+        self.append('fuel.issued', quantity=10)
+        missing = self.append('fuel.issued', quantity=20)
+        self.append('fuel.issued', quantity=30)
+        missing.delete()
+        LiveFeedService.poll()
+        LiveFeedService.poll()
+        self.assertEqual(LiveFeedService._gaps, {})
+
+    def test_fuel_bursts_are_coalesced(self):
+        for _ in range(LiveFeedService.COALESCE_FUEL_EVENTS + 5):
+            self.append('fuel.issued', quantity=2, employee_id=self.employee.id)
+        self.append('accident.reported')
+        LiveFeedService.poll()
+        self.assertEqual([t for t, _ in self.published()], ['accident.reported', 'fuel.synced'])
+        synced = self.published()[1][1]
+        self.assertEqual(synced['count'], LiveFeedService.COALESCE_FUEL_EVENTS + 5)
+        self.assertEqual(synced['issued'], 2 * (LiveFeedService.COALESCE_FUEL_EVENTS + 5))
+        self.assertEqual(synced['employee_ids'], [self.employee.id])
+
+    def test_subscriber_receives_relayed_events_and_replays_from_cursor(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            subscriber, backlog, reset = LiveFeedService.subscribe(loop, topics=['trip'])
+            try:
+                LiveFeedService.publish('fuel.issued', {})
+                started = LiveFeedService.publish('trip.started', {})
+                LiveFeedService.publish('trip.ended', {})
+                received = await asyncio.wait_for(subscriber.queue.get(), 1)
+            finally:
+                LiveFeedService.unsubscribe(subscriber)
+            replay = LiveFeedService.subscribe(loop, cursor=started['id'])
+            LiveFeedService.unsubscribe(replay[0])
+            stale = LiveFeedService.subscribe(loop, cursor='oldboot:5')
+            LiveFeedService.unsubscribe(stale[0])
+            return received, replay, stale
+
+        received, (_, backlog, reset), (_, _, stale_reset) = asyncio.run(scenario())
+        self.assertEqual(received['type'], 'trip.started')
+        self.assertEqual([e['type'] for e in backlog], ['trip.ended'])
+        self.assertFalse(reset)
+        self.assertTrue(stale_reset)
+
+    def test_subscribe_starts_relay_under_the_same_lock(self):
+        self.relay_patch.stop()
+        self.addCleanup(self.relay_patch.start)
+        self.addCleanup(setattr, LiveFeedService, '_relay_thread', None)
+        LiveFeedService._relay_thread = None
+        registered_when_started = []
+
+        def relay_loop():
+            # الناقل يقرر التوقف بناءً على المشتركين تحت القفل؛ عندها يجب أن يكون المشترك مسجلاً
+            with LiveFeedService._lock:
+                registered_when_started.append(LiveFeedService.subscriber_count())
+
+        old_boot = LiveFeedService.BOOT_ID
+        with mock.patch.object(LiveFeedService, '_relay_loop', relay_loop):
+            subscriber, _, reset = LiveFeedService.subscribe(None, cursor=f'{old_boot}:1')
+            LiveFeedService._relay_thread.join(1)
+        self.assertEqual(registered_when_started, [1])
+        self.assertIn(subscriber, LiveFeedService._subscribers)
+        # تشغيل جديد للناقل = BOOT_ID جديد، فالمؤشر القديم يطلب إعادة تحميل
+        self.assertNotEqual(LiveFeedService.BOOT_ID, old_boot)
+        self.assertTrue(reset)
+
+    async def test_asgi_stream_allows_configured_origin(self):
+        response = await self.async_client.get(reverse('live_feed'), headers={'Origin': 'http://dashboard.test'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'http://dashboard.test')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        await stream.aclose()
+
+        response = await self.async_client.get(reverse('live_feed'), headers={'Origin': 'http://elsewhere.test'})
+        self.assertNotIn('Access-Control-Allow-Origin', response)
+        await aiter(response.streaming_content).aclose()
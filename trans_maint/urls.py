@@ -3,8 +3,9 @@ from django.views.generic import RedirectView
 
 from .views import (
      RankListView, 
-    EmployeeListView, EmployeeDetailView, 
-    VehicleListView, VehicleDetailView,
+    EmployeeListView, EmployeeDetailView, EmployeeTripsTabView, EmployeeFuelTabView,
+    VehicleListView, VehicleDetailView, VehicleDetailAsyncView,
+    VehicleTripsTabView, VehicleFuelTabView, VehicleMaintenanceTabView, VehicleAccidentsTabView,
 
     TripListView,  TripDetailView, 
     FuelLogListView, FuelAddView, FuelAdjustmentView,
@@ -13,7 +14,11 @@ from .views import (
     MaintenanceDashboardView, MaintenanceCreateView, MaintenanceCloseView,
     WorkshopActionView,
     QuotaOverviewView, QuotaAdjustmentView, QuotaHistoryView,
-    MainReportView,       DashboardView,
+    MainReportView,       DashboardView, DashboardAsyncView,
+    LiveFeedView, ReportJobDownloadView, ReportJobStatusView, FleetPivotView,
+    EmployeeAutocompleteView, VehicleAutocompleteView, WorkshopAutocompleteView,
+    VehicleApiView, ActiveTripApiView, EmployeeBalanceApiView, FuelLogApiView, FuelSyncApiView, ChangesApiView,
+    MetricsView,
  
 
 )
@@ -30,6 +35,8 @@ urlpatterns = [
     #  urls for Employee Management - عرض، إضافة، تعطيل الموظفين
     path('employees/', EmployeeListView.as_view(), name='employee_list'),
     path('employees/<int:pk>/', EmployeeDetailView.as_view(), name='employee_detail'),
+    path('employees/<int:pk>/tabs/trips/', EmployeeTripsTabView.as_view(), name='employee_trips_tab'),
+    path('employees/<int:pk>/tabs/fuel/', EmployeeFuelTabView.as_view(), name='employee_fuel_tab'),
     # path('employees/add/', EmployeeCreateView.as_view(), name='employee_create'),
     # path('employees/<int:pk>/deactivate/', EmployeeDeactivateView.as_view(), name='employee_deactivate'),
 
@@ -38,6 +45,11 @@ urlpatterns = [
 
     path('vehicles/', VehicleListView.as_view(), name='vehicle_list'),
     path('vehicles/<int:pk>/', VehicleDetailView.as_view(), name='vehicle_detail'),
+    path('vehicles/<int:pk>/async/', VehicleDetailAsyncView.as_view(), name='vehicle_detail_async'),
+    path('vehicles/<int:pk>/tabs/trips/', VehicleTripsTabView.as_view(), name='vehicle_trips_tab'),
+    path('vehicles/<int:pk>/tabs/fuel/', VehicleFuelTabView.as_view(), name='vehicle_fuel_tab'),
+    path('vehicles/<int:pk>/tabs/maintenance/', VehicleMaintenanceTabView.as_view(), name='vehicle_maintenance_tab'),
+    path('vehicles/<int:pk>/tabs/accidents/', VehicleAccidentsTabView.as_view(), name='vehicle_accidents_tab'),
 
     #===============================================================
     #  urls for Trip Management - عرض، إضافة، إنهاء الرحلات
@@ -74,11 +86,38 @@ urlpatterns = [
     #============================================================
     #  urls for Dashboard View - لوحة القيادة والإحصائيات العامة
     path('dashboard/', DashboardView.as_view(), name='admin_dashboard'),
+    path('dashboard/async/', DashboardAsyncView.as_view(), name='admin_dashboard_async'),
+
+    #============================================================
+    #  urls for Live Feed - بث أحداث التشغيل الحية (SSE عبر ASGI)
+    path('live/events/', LiveFeedView.as_view(), name='live_feed'),
 
     #============================================================
     #  urls for Main Report View - مركز التقارير والتحليلات المتقدمة
 
     path('reports/center/', MainReportView.as_view(), name='report_center'),
+    path('reports/jobs/<int:pk>/download/', ReportJobDownloadView.as_view(), name='report_job_download'),
+    path('reports/jobs/<int:pk>/status/', ReportJobStatusView.as_view(), name='report_job_status'),
+    path('analytics/pivot/', FleetPivotView.as_view(), name='fleet_pivot'),
+
+    #============================================================
+    #  urls for Autocomplete - خيارات القوائم المنسدلة عند الطلب (JSON)
+    path('autocomplete/employees/', EmployeeAutocompleteView.as_view(), name='autocomplete_employees'),
+    path('autocomplete/vehicles/', VehicleAutocompleteView.as_view(), name='autocomplete_vehicles'),
+    path('autocomplete/workshops/', WorkshopAutocompleteView.as_view(), name='autocomplete_workshops'),
+
+    #============================================================
+    #  urls for Field API - واجهة JSON للأجهزة الميدانية (ETag + cursor)
+    path('api/vehicles/', VehicleApiView.as_view(), name='api_vehicles'),
+    path('api/trips/active/', ActiveTripApiView.as_view(), name='api_active_trips'),
+    path('api/employees/balances/', EmployeeBalanceApiView.as_view(), name='api_employee_balances'),
+    path('api/fuel/', FuelLogApiView.as_view(), name='api_fuel_log'),
+    path('api/fuel/sync/', FuelSyncApiView.as_view(), name='api_fuel_sync'),
+    path('api/changes/', ChangesApiView.as_view(), name='api_changes'),
+
+    #============================================================
+    #  urls for Metrics - مقاييس دوال الخدمات (Prometheus)
+    path('metrics', MetricsView.as_view(), name='metrics'),
 
 
 ]
\ No newline at end of file
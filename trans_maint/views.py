@@ -5,12 +5,26 @@ from django.views import View
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.db.models import Count, Sum ,F, ExpressionWrapper, FloatField ,Q
-from django.db import models
-from django.core.paginator import Paginator
+from django.db import models, IntegrityError
 from django.utils import timezone
 from django.db.models import QuerySet
-
-from .models import Vehicle ,Trip, Workshop 
+from django.http import StreamingHttpResponse, FileResponse, Http404, JsonResponse, HttpResponseBadRequest, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import sync_to_async
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+
+from .models import Vehicle ,Trip, Workshop, Employee, FuelTransaction, MilitaryRank
+from .paginator import EstimatedCountPaginator, CursorPaginator, InvalidCursor
  
 
 
@@ -24,6 +38,16 @@ from .services.maintenance_service import MaintenanceService
 from .services.workshop_service import WorkshopService
 from .services.dashboard_service import DashboardService
 from .services.report_service import ReportService
+from .services.async_utils import gather_widgets, run_db_call
+from .services.live_feed_service import LiveFeedService
+from .services.report_job_service import ReportJobService
+from .services.fleet_analytics_service import FleetAnalyticsService
+from .services.reference_data_service import ReferenceDataService
+from .services.data_version_service import DataVersionService
+from .services.fuel_sync_service import FuelSyncService
+from .services.outbox_service import OutboxService
+from .services.memory_service import MemoryService
+from .services.metrics_service import MetricsService
 
 
 #===============================================================
@@ -33,16 +57,18 @@ from .services.report_service import ReportService
 # 1️⃣ Rank List View - عرض دليل الرتب
 class RankListView(View):
     template_name = 'modules/ranks/rank_list.html'
+    # ميزانية الاستعلامات (PerfMiddleware): الرتب مع عدد موظفيها في استعلام واحد
+    query_budget = 1
 
     def get(self, request):
-        # جلب كل الرتب باستخدام الخدمة
-        ranks = RankService.list_ranks()
+        # جلب كل الرتب باستخدام الخدمة (list لأن len والمتوسط والقالب يمرون عليها)
+        ranks = list(RankService.list_ranks_with_employee_counts())
         
         context = {
             'ranks': ranks,
-            'total_ranks': ranks.count(),
+            'total_ranks': len(ranks),
             # إحصائية سريعة لمتوسط الحصص (اختياري)
-            'avg_weekly': sum(r.default_weekly_quota for r in ranks) / ranks.count() if ranks.exists() else 0
+            'avg_weekly': sum(r.default_weekly_quota for r in ranks) / len(ranks) if ranks else 0
         }
         return render(request, self.template_name, context)
 
@@ -138,6 +164,7 @@ class EmployeeListView(View):
 # 2️⃣ Employee Detail View - العرض الشامل (Aggregator)
 class EmployeeDetailView(View):
     template_name = 'modules/employees/employee_detail.html'
+    query_budget = 4
 
     def get(self, request, pk):
         # 1. طلب البيانات من الخدمات المختلفة (توزيع المسؤوليات)
@@ -147,17 +174,15 @@ class EmployeeDetailView(View):
         balance = FuelService.calculate_employee_balance(employee.id)
         total_consumption = EmployeeService.get_employee_total_consumption(employee.id)
         
-        # 3. بيانات الحركة والمخاطر (Trip & Accident Services)
-        trips = TripService.list_trips({'employee_id': employee.id})
-        # نفترض وجود خدمة للحوادث تم بناؤها سابقاً
-        # accidents = AccidentService.get_vehicle_accident_history(...) 
+        # 3. عدد الرحلات فقط؛ سجل الرحلات والوقود يُجلب عند فتح تبويبه (History Tabs)
+        trip_count = EmployeeService.get_employee_trip_count(employee.id)
 
         # 4. تجهيز حقيبة البيانات (Context) بنظام الـ Tabs
         context = {
             'employee': employee,
             'balance': balance,
             'total_consumption': total_consumption,
-            'trips': trips,
+            'trip_count': trip_count,
             'effective_weekly': EmployeeService.get_effective_weekly_quota(employee.id),
             'effective_monthly': EmployeeService.get_effective_monthly_quota(employee.id),
         }
@@ -214,7 +239,6 @@ class VehicleListView(View):
         context = {
             'vehicles': vehicles,
             'status_options': ['active', 'inactive', 'under_repair'],
-            'employees': EmployeeService.list_employees({'is_active': True}),
         }
         return render(request, self.template_name, context)
     
@@ -262,6 +286,7 @@ class VehicleListView(View):
 # 2️⃣ Vehicle Detail View - العرض التحليلي بنظام الـ Tabs
 class VehicleDetailView(View):
     template_name = 'modules/vehicles/vehicle_detail.html'
+    query_budget = 6
 
     # داخل دالة get في VehicleDetailView
     def get(self, request, pk):
@@ -275,10 +300,8 @@ class VehicleDetailView(View):
             'maintenance_cost': VehicleService.get_vehicle_total_maintenance_cost(pk),
             'accident_cost': VehicleService.get_vehicle_total_accident_cost(pk),
             
-            # التعديل هنا: استخدام prefetch_related (داخلياً) أو الفلترة المباشرة مع التحسين
-            'recent_trips': vehicle.trips.select_related('employee').all().order_by('-start_date')[:5],
-            'recent_maintenance': vehicle.maintenancerequest_set.all().order_by('-date_reported')[:5],
-            'recent_accidents': vehicle.accident_set.all().order_by('-date_occurred')[:5],
+            # آخر رحلة لبطاقة "آخر نشاط"؛ السجلات نفسها تُجلب عند فتح تبويبها (History Tabs)
+            'recent_trips': VehicleService.get_vehicle_recent_trips(pk, limit=1),
         }   
         return render(request, self.template_name, context)
     
@@ -301,6 +324,22 @@ class VehicleDetailView(View):
         return redirect('vehicle_detail', pk=pk)
     
 
+# 3️⃣ Vehicle Detail (Async) - نفس الصفحة مع تنفيذ المؤشرات والقوائم بالتوازي
+class VehicleDetailAsyncView(View):
+    template_name = VehicleDetailView.template_name
+
+    async def get(self, request, pk):
+        context = await gather_widgets(
+            vehicle=VehicleService.aget_vehicle(pk),
+            total_fuel=VehicleService.aget_vehicle_total_fuel(pk),
+            trip_count=VehicleService.aget_vehicle_trip_count(pk),
+            maintenance_cost=VehicleService.aget_vehicle_total_maintenance_cost(pk),
+            accident_cost=VehicleService.aget_vehicle_total_accident_cost(pk),
+            recent_trips=VehicleService.aget_vehicle_recent_trips(pk, limit=1),
+        )
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
 #===============================================================
 # 4️⃣ Views for Trip Management - عرض، إضافة، إنهاء الرحلات
 #===============================================================
@@ -326,11 +365,9 @@ class TripListView(View): # الاسم الجديد المقترح للـ TripLi
         # 2. تنفيذ الاستعلام
         trips = TripService.list_trips(filters)
 
-        # 3. بيانات المودالات (Modals Data)
+        # 3. خيارات الموظفين والمركبات في المودالات تُجلب عند الطلب (autocomplete)
         context = {
             'trips': trips,
-            'employees': EmployeeService.list_employees({'is_active': True}),
-            'available_vehicles': VehicleService.list_vehicles({'status': 'active'}),
             'status_selected': status, # لنعرف أي زر فلتر مفعل في الـ HTML
         }
         return render(request, self.template_name, context)
@@ -346,9 +383,9 @@ class TripListView(View): # الاسم الجديد المقترح للـ TripLi
 
                 # 2. تحويل الـ IDs إلى كائنات (Objects) حقيقية
                 # هذا ما تحتاجه السيرفس لكي لا يظهر خطأ 'NoneType'
-                from .models import Vehicle, Employee
-                vehicle_obj = get_object_or_404(Vehicle, id=vehicle_id)
-                employee_obj = get_object_or_404(Employee, id=employee_id)
+                # عبر الخدمات: فحص الجاهزية يعيد استخدام نفس كائن المركبة بدلاً من جلبه مرة ثانية
+                vehicle_obj = VehicleService.get_vehicle(vehicle_id)
+                employee_obj = EmployeeService.get_employee(employee_id)
 
                 # 3. تجهيز البيانات وتمرير الكائنات بدلاً من الـ IDs
                 data = {
@@ -410,6 +447,13 @@ class FuelLogListView(View):
     template_name = 'modules/fuel/fuel.html'
 
     def get(self, request):
+        # السجل العام بلا تقسيم صفحات: أكبر صفحة ذاكرةً في النظام
+        with MemoryService.track('trans_maint.views.FuelLogListView', request.GET.dict(), request):
+            response = self.render_log(request)
+            MemoryService.checkpoint()
+            return response
+
+    def render_log(self, request):
         # تجهيز الفلاتر المتقدمة
         filters = {}
         
@@ -454,8 +498,6 @@ class FuelLogListView(View):
                 'total_additions': summary['total_added'] or 0,
                 'top_employee': logs.values('employee__name').annotate(total=Sum('quantity')).order_by('-total').first()
             },
-            'vehicles': VehicleService.list_vehicles(),
-            'employees': EmployeeService.list_employees({'is_active': True}),
         }
         return render(request, self.template_name, context)
 
@@ -595,9 +637,9 @@ class AccidentDetailView(View):
 
     def get(self, request, pk):
         accident = AccidentService.get_accident(pk)
+        # السجل التاريخي للمركبة يُجلب بعد تحميل الصفحة على دفعات (VehicleAccidentsTabView)
         context = {
             'accident': accident,
-            'vehicle_history': AccidentService.get_vehicle_accident_history(accident.vehicle.id)
         }
         return render(request, self.template_name, context)
 
@@ -651,8 +693,7 @@ class MaintenanceDashboardView(View):
 
         # --- قسم الورش (Vendors) ---
         w_filters = {}
-        workshops = WorkshopService.list_workshops()
-        
+
         # فلترة الورش حسب "ضغط العمل" (عدد السيارات الحالية)
         # ملاحظة: يتم هذا الجزء عبر annotate في الـ Service لضمان الأداء
         workshops = Workshop.objects.annotate(
@@ -665,7 +706,6 @@ class MaintenanceDashboardView(View):
         context = {
             'requests': maintenance_requests,
             'workshops': workshops,
-            'vehicles': Vehicle.objects.filter(status__in=['active', 'under_repair']),
             'total_maintenance_cost': MaintenanceService.get_total_maintenance_cost(), # استدعاء الخدمة المكتوبة
             'stats': {
                         'inactive_vehicles': Vehicle.objects.filter(status__in=['inactive', 'under_repair']).count(),
@@ -737,6 +777,8 @@ class WorkshopActionView(View):
 #  1️⃣ Quota Overview - لوحة مراقبة الحصص (Analytic View)
 class QuotaOverviewView(View):
     template_name = 'quota/quota_overview.html'
+    # ثابتة مهما زاد عدد الموظفين (أي استعلام لكل موظف = N+1)
+    query_budget = 1
 
     def get(self, request):
         # البحث عن موظف معين
@@ -745,22 +787,22 @@ class QuotaOverviewView(View):
         if search:
             filters['name__icontains'] = search
             
-        employees = EmployeeService.list_employees(filters)
+        # الإجماليات والحصة الفعلية تأتي محسوبة مع القائمة (استعلام واحد مهما زاد عدد الموظفين)
+        employees = EmployeeService.list_employees_with_quota_usage(filters)
         
         # تجهيز البيانات التحليلية لكل موظف
         quota_data = []
         for emp in employees:
-            balance = FuelService.calculate_employee_balance(emp.id)
-            total_added = EmployeeService.get_employee_total_additions(emp.id)
+            balance = emp.total_added - emp.total_issued
             
             # حساب نسبة الاستهلاك لتمثيلها شريط تقدم (Progress Bar)
             usage_pct = 0
-            if total_added > 0:
-                usage_pct = ((total_added - balance) / total_added) * 100
+            if emp.total_added > 0:
+                usage_pct = (emp.total_issued / emp.total_added) * 100
 
             quota_data.append({
                 'employee': emp,
-                'monthly_quota': EmployeeService.get_effective_monthly_quota(emp.id),
+                'monthly_quota': emp.effective_monthly_quota,
                 'balance': balance,
                 'usage_pct': round(usage_pct, 1)
             })
@@ -773,9 +815,8 @@ class QuotaAdjustmentView(View):
     template_name = 'quota/adjustment_form.html'
 
     def get(self, request):
-        # عرض الموظفين النشطين فقط لعمل التعديلات
+        # اختيار الموظف عبر autocomplete_employees بدلاً من إرسال كل الموظفين النشطين
         context = {
-            'employees': EmployeeService.list_employees({'is_active': True}),
             'ranks': RankService.list_ranks() # لتعديل حصص الرتب أيضاً
         }
         return render(request, self.template_name, context)
@@ -831,6 +872,7 @@ class QuotaHistoryView(View):
 # 📊 Dashboard View - مركز العمليات والقرار الاستراتيجي
 class DashboardView(View):
     template_name = 'dashboard.html'
+    query_budget = 16
 
     def get(self, request):
         """
@@ -854,8 +896,8 @@ class DashboardView(View):
 
         # 3️⃣ استدعاء بيانات الرسوم البيانية (Charts Data)
         # نطلب البيانات مهيأة بصيغة تناسب مكتبات الـ Charts مثل (Chart.js)
+        # توزيع الاستهلاك حسب الرتبة لا يُعرض هنا: مكانه تقرير تجاوز الحصة في مركز التقارير
         charts_data = {
-            'fuel_by_rank': ReportService.QuotaReports.get_over_consumption_report(),
             'monthly_spending': ReportService.AssetReports.get_accident_cost_summary(
                 start_date="2026-01-01", end_date="2026-12-31"
             )
@@ -872,7 +914,106 @@ class DashboardView(View):
         }
 
         return render(request, self.template_name, context)
-    
+
+
+# 📊 Dashboard (Async) - نفس الحقيبة لكن الودجات المستقلة تُنفذ بالتوازي
+class DashboardAsyncView(View):
+    template_name = DashboardView.template_name
+
+    async def get(self, request):
+        widgets = await gather_widgets(
+            stats=DashboardService.aget_general_stats(),
+            fuel=DashboardService.aget_fuel_analytics(),
+            finance=DashboardService.aget_financial_metrics(),
+            low_balance_employees=DashboardService.aget_low_balance_employees(threshold=15.0),
+            pending_maintenance=DashboardService.aget_pending_maintenance_count(),
+            open_accidents=DashboardService.aget_open_accidents_count(),
+            long_running_trips=DashboardService.aget_active_trips_count(),
+            monthly_spending=ReportService.AssetReports.aget_accident_cost_summary(
+                start_date="2026-01-01", end_date="2026-12-31"
+            ),
+        )
+
+        context = {
+            'stats': widgets['stats'],
+            'fuel': widgets['fuel'],
+            'finance': widgets['finance'],
+            'alerts': {
+                'low_balance_employees': widgets['low_balance_employees'],
+                'pending_maintenance': widgets['pending_maintenance'],
+                'open_accidents': widgets['open_accidents'],
+                'long_running_trips': widgets['long_running_trips'],
+            },
+            'charts': {
+                'monthly_spending': widgets['monthly_spending'],
+            },
+            'last_updated': DashboardService.get_last_sync_time(),
+        }
+        return await sync_to_async(render)(request, self.template_name, context)
+
+
+#===============================================================
+# 📡 Live Operations Feed - بث أحداث التشغيل الحية (Server-Sent Events)
+#===============================================================
+
+class LiveFeedView(View):
+    """
+    اتصال SSE طويل: الشاشة تستقبل أحداثاً صغيرة (JSON) بدلاً من إعادة تحميل الصفحة كاملة.
+    عند إعادة الاتصال يرسل المتصفح Last-Event-ID تلقائياً فتُعاد الأحداث الفائتة من السجل.
+    يعمل تحت ASGI فقط (الصفحات تتصل به عبر LIVE_FEED_URL)؛ تحت WSGI يحجز البث عاملاً كاملاً للأبد فنرفضه.
+    """
+    keepalive_seconds = 15
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # 503 ينهي EventSource نهائياً بدلاً من إعادة المحاولة كل بضع ثوانٍ
+            return HttpResponse("البث الحي متاح على خدمة ASGI فقط (LIVE_FEED_URL).", status=503, content_type='text/plain; charset=utf-8')
+
+        cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+        topics = [t for t in request.GET.get('topics', '').split(',') if t]
+
+        subscriber, backlog, reset = await run_db_call(
+            LiveFeedService.subscribe, asyncio.get_running_loop(), cursor=cursor, topics=topics
+        )
+
+        response = StreamingHttpResponse(
+            self.stream(subscriber, backlog, reset), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # منع nginx من تجميع البث
+        # الصفحات تُخدم من WSGI والبث من ASGI: أصل مختلف يحتاج إذناً صريحاً
+        origin = request.headers.get('Origin')
+        if origin and origin in settings.LIVE_FEED_ALLOWED_ORIGINS:
+            response['Access-Control-Allow-Origin'] = origin
+            response['Vary'] = 'Origin'
+        return response
+
+    async def stream(self, subscriber, backlog, reset):
+        try:
+            yield "retry: 3000\n\n"
+            if reset:
+                yield self.format_event({'id': '', 'type': 'feed.reset', 'data': {}})
+            for event in backlog:
+                yield self.format_event(event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # الطابور امتلأ (عميل بطيء): نغلق البث ويعيد المتصفح الاتصال بآخر مؤشر
+                    break
+                yield self.format_event(event)
+        finally:
+            LiveFeedService.unsubscribe(subscriber)
+
+    @staticmethod
+    def format_event(event):
+        body = json.dumps({'type': event['type'], 'data': event['data']}, ensure_ascii=False, separators=(',', ':'))
+        id_line = f"id: {event['id']}\n" if event['id'] else ""
+        return f"{id_line}event: {event['type'].split('.')[0]}\ndata: {body}\n\n"
 
 
 #===============================================================
@@ -885,21 +1026,21 @@ class MainReportView(View):
     def get(self, request):
         """1️⃣ عرض نموذج اختيار المعايير (GET)"""
         context = {
-            'employees': EmployeeService.list_employees({'is_active': True}),
-            'vehicles': VehicleService.list_vehicles(),
             'report_types': [
                 ('fuel', 'تقرير استهلاك الوقود'),
                 ('trips', 'تقرير النشاط الميداني (الرحلات)'),
                 ('accidents', 'تقرير خسائر الحوادث'),
                 ('maintenance', 'تقرير تكاليف الصيانة'),
                 ('unused_quota', 'حصص غير مستخدمة'),
-            ]
+            ],
+            'report_jobs': ReportJobService.list_recent_jobs(),
         }
         
         # إذا كان هناك طلب فلترة في الـ GET، نقوم بتنفيذ المرحلة 2
         report_type = request.GET.get('report_type')
         if report_type:
-            return self.process_report(request, context)
+            with MemoryService.track('trans_maint.views.MainReportView', request.GET.dict(), request):
+                return self.process_report(request, context)
             
         return render(request, self.template_name, context)
 
@@ -935,26 +1076,491 @@ class MainReportView(View):
 
         elif report_type == 'over_consumption':
             results = ReportService.QuotaReports.get_over_consumption_report(threshold_percent=90)
+            context['consumption_distribution'] = ReportService.QuotaReports.get_consumption_distribution()
             context['report_title'] = "تحذير: تجاوز حصة الاستهلاك (90% فأكثر)"
 
         elif report_type == 'unused_quota':
-            results = ReportService.QuotaReports.get_unused_quota_report()
-            context['report_title'] = "تقرير الموظفين غير النشطين (توفير الموارد)"
+            inactive_days = request.GET.get('inactive_days') or 90
+            low, high = ReportService.QuotaReports.INACTIVE_DAYS_RANGE
+            if not str(inactive_days).isdigit() or not low <= int(inactive_days) <= high:
+                messages.error(request, f"فترة عدم النشاط يجب أن تكون عدداً صحيحاً من الأيام بين {low} و {high}.")
+                inactive_days = 90
+            results = ReportService.QuotaReports.get_unused_quota_report(int(inactive_days))
+            context['report_title'] = f"تقرير الموظفين غير النشطين خلال {inactive_days} يوماً (توفير الموارد)"
 
 
         # 3️⃣ معالجة العرض والتصفح (Pagination)
         if isinstance(results, QuerySet):
-            # حل مشكلة UnorderedObjectListWarning بإضافة ترتيب افتراضي
-            results = results.order_by('-id') 
+            # حل مشكلة UnorderedObjectListWarning بإضافة ترتيب افتراضي (مع احترام ترتيب التقرير إن وُجد)
+            if not results.ordered:
+                results = results.order_by('-id')
             
-            paginator = Paginator(results, 15)
+            # العدد الدقيق عند الطلب فقط (?exact_count=1)، وإلا عدد تقديري/محدود بدلاً من COUNT(*) كامل
+            paginator = EstimatedCountPaginator(results, 15, exact=request.GET.get('exact_count') == '1')
             page_number = request.GET.get('page')
             context['report_results'] = paginator.get_page(page_number)
             context['is_queryset'] = True # علامة للـ HTML لتشغيل حلقة for
+            context['is_paginated'] = True
+            # معايير الفلترة بدون رقم الصفحة، لبناء روابط التنقل
+            query = request.GET.copy()
+            query.pop('page', None)
+            context['page_query'] = query.urlencode()
         else:
             # إذا كانت النتائج Dict (مثل تقارير trips و accidents) أو List مخصصة
             context['report_results'] = results
             context['is_queryset'] = False # علامة للـ HTML لعرض الإحصائيات مباشرة
 
         context['filtered'] = True
-        return render(request, self.template_name, context)
\ No newline at end of file
+        response = render(request, self.template_name, context)
+        # نتائج التقرير والصفحة المبنية ما زالت حية هنا: لحظة قياس أكبر مواقع التخصيص
+        MemoryService.checkpoint()
+        return response
+
+    def post(self, request):
+        """4️⃣ إرسال التقرير للتنفيذ في الخلفية بدلاً من انتظاره داخل الطلب"""
+        try:
+            job, reused = ReportJobService.submit_job(request.POST.get('report_type'), request.POST)
+            if reused:
+                messages.info(request, f"يوجد تقرير مطابق بالفعل (مهمة #{job.id})، تم استخدامه بدلاً من إعادة التوليد.")
+            else:
+                messages.success(request, f"تم إرسال التقرير للتنفيذ في الخلفية (مهمة #{job.id}).")
+        except ValueError as e:
+            # معايير غير صالحة: لا تُسجل مهمة، ونعيد عرض المركز مع الخطأ بحالة 400
+            messages.error(request, str(e))
+            response = self.get(request)
+            response.status_code = 400
+            return response
+        return redirect('report_center')
+
+
+# 📥 تحميل نتيجة مهمة تقرير خلفية
+class ReportJobDownloadView(View):
+    def get(self, request, pk):
+        job = ReportJobService.get_job(pk)
+        path = ReportJobService.get_result_path(job)
+        if job.status != 'done' or not os.path.exists(path):
+            raise Http404("نتيجة التقرير غير متاحة بعد.")
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"{job.report_type}_{job.id}.csv")
+
+
+# 🧮 Pivot Endpoint - تحليلات متعددة الأبعاد من جدول الحقائق اليومي
+class FleetPivotView(View):
+    """
+    مثال: /analytics/pivot/?dimensions=rank&measures=liters_issued&grain=month&date_from=2026-01-01
+    الفلاتر بالمساواة: ?vehicle_type=company&rank=3
+    """
+
+    def get(self, request):
+        def split(name):
+            return [v for v in request.GET.get(name, '').split(',') if v]
+
+        filters = {
+            name: request.GET[name] for name in FleetAnalyticsService.FILTERS if request.GET.get(name)
+        }
+        try:
+            rows = FleetAnalyticsService.pivot(
+                dimensions=split('dimensions'),
+                measures=split('measures'),
+                filters=filters,
+                grain=request.GET.get('grain') or None,
+                date_from=request.GET.get('date_from') or None,
+                date_to=request.GET.get('date_to') or None,
+            )
+        except (ValueError, ValidationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'rows': rows, 'truncated': len(rows) >= FleetAnalyticsService.MAX_ROWS})
+
+
+# ⏳ حالة مهمة التقرير (لتحديث شريط التقدم في الصفحة)
+class ReportJobStatusView(View):
+    def get(self, request, pk):
+        job = ReportJobService.get_job(pk)
+        return JsonResponse({
+            'id': job.id,
+            'status': job.status,
+            'progress': job.progress,
+            'row_count': job.row_count,
+            'error': job.error,
+        })
+
+#===============================================================
+# 🗂️ History Tabs - محتوى تبويبات السجل في صفحات التفاصيل عند الطلب
+#===============================================================
+# صفحات التفاصيل لا تحمل أي سجل؛ كل تبويب يطلب صفوف <tr> عند أول فتح (core/static/js/history_tabs.js)،
+# و"عرض المزيد" يطلب الصفحة التالية بالمؤشر (CursorPaginator): استعلام واحد ثابت التكلفة مهما طال السجل.
+
+class HistoryTabView(View):
+    template_name = None
+    # حقول الترتيب (آخرها فريد) يغطيها فهرس (الكيان، التاريخ، id) في الموديل
+    ordering = ('-id',)
+    page_size = 20
+    query_budget = 1
+
+    def get_queryset(self, pk):
+        raise NotImplementedError
+
+    def get(self, request, pk):
+        paginator = CursorPaginator(self.get_queryset(pk), self.ordering, self.page_size)
+        cursor = request.GET.get('cursor')
+        try:
+            rows, next_cursor = paginator.page(cursor)
+        except (InvalidCursor, ValidationError, ValueError) as e:
+            # مؤشر سليم الصيغة لكن قيمه من نوع آخر (["x","x"] بدلاً من تاريخ و id) يفشل عند بناء الاستعلام
+            return HttpResponseBadRequest(str(e))
+        return render(request, self.template_name, {
+            'rows': rows,
+            'first_page': not cursor,
+            'next_url': f"{request.path}?cursor={next_cursor}" if next_cursor else None,
+        })
+
+
+class EmployeeTripsTabView(HistoryTabView):
+    template_name = 'modules/employees/tabs/trips.html'
+    ordering = ('-start_date', '-id')
+
+    def get_queryset(self, pk):
+        return TripService.list_trips({'employee_id': pk})
+
+
+class EmployeeFuelTabView(HistoryTabView):
+    template_name = 'modules/employees/tabs/fuel.html'
+    ordering = ('-date', '-id')
+
+    def get_queryset(self, pk):
+        return FuelService.list_transactions({'employee_id': pk})
+
+
+class VehicleTripsTabView(HistoryTabView):
+    template_name = 'modules/vehicles/tabs/trips.html'
+    ordering = ('-start_date', '-id')
+
+    def get_queryset(self, pk):
+        return TripService.get_vehicle_trip_history(pk)
+
+
+class VehicleFuelTabView(HistoryTabView):
+    template_name = 'modules/vehicles/tabs/fuel.html'
+    ordering = ('-date', '-id')
+
+    def get_queryset(self, pk):
+        return FuelService.list_transactions({'vehicle_id': pk})
+
+
+class VehicleMaintenanceTabView(HistoryTabView):
+    template_name = 'modules/vehicles/tabs/maintenance.html'
+    ordering = ('-date_reported', '-id')
+
+    def get_queryset(self, pk):
+        return MaintenanceService.get_vehicle_maintenance_history(pk)
+
+
+# يُستخدم أيضاً في صفحة تفاصيل الحادث (السجل التاريخي للمركبة)
+class VehicleAccidentsTabView(HistoryTabView):
+    template_name = 'modules/vehicles/tabs/accidents.html'
+    ordering = ('-date_occurred', '-id')
+
+    def get_queryset(self, pk):
+        return AccidentService.get_vehicle_accident_history(pk)
+
+#===============================================================
+# 🔎 Autocomplete Endpoints - خيارات القوائم المنسدلة عند الطلب
+#===============================================================
+# المودالات والفلاتر لا تُرسل كل الموظفين والمركبات في الـ HTML؛ تطلب منها صفحة صغيرة أثناء الكتابة
+# (core/static/js/autocomplete.js). ?q= بداية النص، ?id= لجلب عنوان قيمة مختارة مسبقاً.
+
+class AutocompleteView(View):
+    max_results = 20
+    query_budget = 1
+
+    def search(self, request, term, limit):
+        raise NotImplementedError
+
+    def lookup(self, request, pk):
+        raise NotImplementedError
+
+    def serialize(self, row):
+        raise NotImplementedError
+
+    def get(self, request):
+        term = request.GET.get('q', '').strip()
+        if request.GET.get('id', '').isdigit():
+            rows = self.lookup(request, int(request.GET['id']))
+        else:
+            # صف زائد واحد فقط لمعرفة هل توجد نتائج أخرى (بدون COUNT)
+            rows = list(self.search(request, term, self.max_results + 1))
+        return JsonResponse({
+            'results': [self.serialize(row) for row in rows[:self.max_results]],
+            'more': len(rows) > self.max_results,
+        })
+
+
+class EmployeeAutocompleteView(AutocompleteView):
+    def search(self, request, term, limit):
+        return EmployeeService.search_employees(term)[:limit]
+
+    def lookup(self, request, pk):
+        # يعيد الموظف حتى لو كان معطلاً (فلتر محفوظ في الرابط)
+        return list(EmployeeService.search_employees(active_only=False).filter(id=pk))
+
+    def serialize(self, row):
+        return {'id': row['id'], 'text': f"{row['name']} ({row['rank__name']}) - {row['military_number']}"}
+
+
+# المركبات والورش من ذاكرة البيانات المرجعية: لا استعلام إلا لمعرفة المركبات المشغولة (?available=1)
+class VehicleAutocompleteView(AutocompleteView):
+    def search(self, request, term, limit):
+        statuses = [s for s in request.GET.get('status', '').split(',') if s]
+        return VehicleService.search_vehicles(term, statuses=statuses, available_only=request.GET.get('available') == '1', limit=limit)
+
+    def lookup(self, request, pk):
+        vehicle = ReferenceDataService.get_vehicle(pk)
+        return [vehicle] if vehicle else []
+
+    def serialize(self, row):
+        return {'id': row.id, 'text': f"{row.plate_number} ({row.model})"}
+
+
+class WorkshopAutocompleteView(AutocompleteView):
+    def search(self, request, term, limit):
+        return WorkshopService.search_workshops(term, limit)
+
+    def lookup(self, request, pk):
+        workshop = ReferenceDataService.get_workshop(pk)
+        return [workshop] if workshop else []
+
+    def serialize(self, row):
+        return {'id': row.id, 'text': row.name}
+
+#===============================================================
+# 📡 Field API - واجهة JSON للقراءة فقط (الأجهزة اللوحية الميدانية)
+#===============================================================
+# الأجهزة تستعلم كل بضع ثوانٍ؛ الـ ETag مبني على إصدارات الجداول (DataVersionService) وليس على المحتوى،
+# فالطلب المتكرر بـ If-None-Match يعود 304 بدون أي استعلام ما لم تتغير الجداول التي تُبنى منها الاستجابة.
+#   ?fields=id,status   الحقول المطلوبة فقط (الافتراضي: default_fields)
+#   ?cursor=...         الصفحة التالية (قيمة next من الرد السابق)
+#   ?limit=100          حجم الصفحة (حتى max_page_size)
+
+class FieldApiView(View):
+    # الجداول التي تعتمد عليها الاستجابة: أي كتابة عليها تغيّر الـ ETag
+    models = ()
+    # الاسم في الـ API -> الحقل/التعليق في values()
+    fields = {}
+    default_fields = ()
+    # معامل الرابط -> (lookup، التحويل)
+    filters = {}
+    ordering = ('id',)
+    page_size = 100
+    max_page_size = 500
+    query_budget = 1
+
+    def get_queryset(self, request):
+        raise NotImplementedError
+
+    def etag(self, request):
+        versions = DataVersionService.get_versions(*self.models)
+        query = sorted(request.GET.items())
+        return hashlib.sha1(repr((request.path, query, versions)).encode()).hexdigest()
+
+    def get(self, request):
+        etag = quote_etag(self.etag(request))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                response = JsonResponse(self.build(request))
+            except (ValueError, ValidationError) as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        response['ETag'] = etag
+        # يسمح بالتخزين لكن يجبر على التحقق في كل مرة (If-None-Match)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def build(self, request):
+        requested = [f for f in request.GET.get('fields', '').split(',') if f] or list(self.default_fields)
+        unknown = [f for f in requested if f not in self.fields]
+        if unknown:
+            raise ValueError(f"حقول غير معروفة: {', '.join(unknown)} (المتاح: {', '.join(self.fields)})")
+
+        lookups = {}
+        for param, (lookup, convert) in self.filters.items():
+            if param in request.GET:
+                lookups[lookup] = convert(request.GET[param])
+
+        limit = min(int(request.GET.get('limit', self.page_size)), self.max_page_size)
+        if limit < 1:
+            raise ValueError("limit يجب أن يكون 1 أو أكثر")
+
+        # حقول الترتيب تُجلب دائماً لبناء المؤشر، وتُحذف من الرد إن لم تُطلب
+        ordering_fields = {field.lstrip('-') for field in self.ordering}
+        columns = {self.fields[f]: f for f in requested}
+        queryset = self.get_queryset(request).filter(**lookups).values(*(set(columns) | ordering_fields))
+        rows, next_cursor = CursorPaginator(queryset, self.ordering, limit).page(request.GET.get('cursor'))
+        return {
+            'results': [{name: row[column] for column, name in columns.items()} for row in rows],
+            'next': next_cursor,
+        }
+
+
+class VehicleApiView(FieldApiView):
+    models = (Vehicle,)
+    fields = {
+        'id': 'id', 'plate_number': 'plate_number', 'model': 'model',
+        'vehicle_type': 'vehicle_type', 'status': 'status', 'owner_id': 'owner_id',
+    }
+    default_fields = ('id', 'plate_number', 'model', 'status')
+    filters = {'status': ('status', str)}
+
+    def get_queryset(self, request):
+        return VehicleService.list_vehicles()
+
+
+class ActiveTripApiView(FieldApiView):
+    models = (Trip, Vehicle, Employee)
+    fields = {
+        'id': 'id', 'vehicle_id': 'vehicle_id', 'plate_number': 'vehicle__plate_number',
+        'employee_id': 'employee_id', 'employee_name': 'employee__name',
+        'trip_type': 'trip_type', 'area': 'area', 'start_date': 'start_date',
+        'fuel_quota_granted': 'fuel_quota_granted',
+    }
+    default_fields = ('id', 'vehicle_id', 'employee_id', 'start_date')
+    filters = {'vehicle': ('vehicle_id', int), 'employee': ('employee_id', int)}
+    ordering = ('-start_date', '-id')
+
+    def get_queryset(self, request):
+        return TripService.list_trips({'end_date__isnull': True})
+
+
+class EmployeeBalanceApiView(FieldApiView):
+    models = (Employee, FuelTransaction, MilitaryRank)
+    fields = {
+        'id': 'id', 'name': 'name', 'military_number': 'military_number', 'rank_id': 'rank_id',
+        'balance': 'balance', 'total_added': 'total_added', 'total_issued': 'total_issued',
+        'monthly_quota': 'effective_monthly_quota',
+    }
+    default_fields = ('id', 'balance')
+    filters = {'rank': ('rank_id', int)}
+
+    def get_queryset(self, request):
+        return EmployeeService.list_employee_balances({'is_active': True})
+
+
+class FuelLogApiView(FieldApiView):
+    models = (FuelTransaction,)
+    fields = {
+        'id': 'id', 'employee_id': 'employee_id', 'vehicle_id': 'vehicle_id', 'trip_id': 'trip_id',
+        'quantity': 'quantity', 'transaction_type': 'transaction_type', 'date': 'date', 'notes': 'notes',
+    }
+    default_fields = ('id', 'employee_id', 'vehicle_id', 'quantity', 'transaction_type', 'date')
+    filters = {'employee': ('employee_id', int), 'vehicle': ('vehicle_id', int), 'type': ('transaction_type', str)}
+    ordering = ('-date', '-id')
+
+    def get_queryset(self, request):
+        return FuelService.list_transactions()
+
+
+def _request_token(request):
+    """رمز الجهاز/النظام من ترويسة Authorization: Token <رمز>"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token if scheme == 'Token' else ''
+
+
+# مزامنة محطات الوقود: دفعة عمليات سُجلت أثناء الانقطاع في طلب واحد (FuelSyncService)
+#   POST /api/fuel/sync/  {"transactions": [{"key": "...", "transaction_type": "issue", "employee_id": 1, ...}]}
+#   Authorization: Token <أحد FUEL_SYNC_TOKENS>
+@method_decorator(csrf_exempt, name='dispatch')
+class FuelSyncApiView(View):
+    # المفاتيح الموجودة + الموظفين + المركبات + الأرصدة + الإدخال المجمع + آخر نشاط (حتى نوعين) + أيام الحقائق.
+    # الإدخال استعلام واحد على PostgreSQL، ويُقسم على SQLite حسب حد المتغيرات (~8 لألف عملية)
+    query_budget = 20
+
+    def authorized(self, request):
+        token = _request_token(request)
+        return bool(token) and any(hmac.compare_digest(token, allowed) for allowed in settings.FUEL_SYNC_TOKENS)
+
+    def post(self, request):
+        if not self.authorized(request):
+            return JsonResponse({'error': "رمز الجهاز غير صالح"}, status=401)
+        try:
+            payload = json.loads(request.body)
+            items = payload['transactions']
+            if not isinstance(items, list):
+                raise TypeError
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "المتوقع: {\"transactions\": [...]}"}, status=400)
+
+        try:
+            results = FuelSyncService.sync_batch(items)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=413)
+        except IntegrityError:
+            # تعارض متكرر مع مزامنة أخرى لنفس المفاتيح: لم يُحفظ شيء، وإعادة الإرسال آمنة
+            return JsonResponse({'error': "تعارض مع مزامنة أخرى لنفس العمليات، أعد إرسال الدفعة"}, status=409)
+
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return JsonResponse({'results': results, 'summary': summary})
+
+
+# صندوق الصادر للأنظمة الخارجية (OutboxService): التغييرات بعد المؤشر بدلاً من مسح الجداول
+#   GET  /api/changes/?after=<id>&limit=500&types=fuel,trip
+#   POST /api/changes/  {"through": <id>}   تأكيد المعالجة (يسمح بضغط ما أكده الجميع)
+#   Authorization: Token <رمز النظام في OUTBOX_CONSUMER_TOKENS>
+@method_decorator(csrf_exempt, name='dispatch')
+class ChangesApiView(View):
+    query_budget = 3
+
+    def consumer(self, request):
+        token = _request_token(request)
+        if not token:
+            return None
+        return next((name for name, allowed in settings.OUTBOX_CONSUMER_TOKENS.items() if hmac.compare_digest(token, allowed)), None)
+
+    def dispatch(self, request, *args, **kwargs):
+        self.consumer_name = self.consumer(request)
+        if self.consumer_name is None:
+            return JsonResponse({'error': "رمز النظام غير صالح"}, status=401)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request):
+        try:
+            after = int(request.GET.get('after', 0))
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        except ValueError:
+            return JsonResponse({'error': "after و limit يجب أن تكون أرقاماً"}, status=400)
+        if limit is not None and limit < 1:
+            return JsonResponse({'error': "limit يجب أن يكون 1 أو أكثر"}, status=400)
+        types = [t for t in request.GET.get('types', '').split(',') if t]
+
+        events, has_more = OutboxService.changes_since(after, limit, types)
+        return JsonResponse({
+            'events': [OutboxService.serialize(event) for event in events],
+            'next_after': events[-1].id if events else after,
+            'has_more': has_more,
+        })
+
+    def post(self, request):
+        try:
+            through = int(json.loads(request.body)['through'])
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': "المتوقع: {\"through\": <id>}"}, status=400)
+        return JsonResponse({'consumer': self.consumer_name, 'acked_through': OutboxService.acknowledge(self.consumer_name, through)})
+
+
+# مقاييس دوال الخدمات لـ Prometheus (MetricsService): مجموع كل عمال gunicorn، بدون أي استعلام
+#   GET /metrics
+#   Authorization: Token <أحد METRICS_TOKENS> (إن ضُبطت)
+class MetricsView(View):
+    query_budget = 0
+
+    def authorized(self, request):
+        if not settings.METRICS_TOKENS:
+            return True
+        token = _request_token(request)
+        return bool(token) and any(hmac.compare_digest(token, allowed) for allowed in settings.METRICS_TOKENS)
+
+    def get(self, request):
+        if not self.authorized(request):
+            return HttpResponse("رمز غير صالح\n", status=401, content_type='text/plain; charset=utf-8')
+        response = HttpResponse(MetricsService.render(), content_type=MetricsService.CONTENT_TYPE)
+        patch_cache_control(response, no_store=True)
+        return response